@@ -0,0 +1,292 @@
+import asyncio
+
+from ServerWorker import ServerWorker
+from Pacer import FramePacer
+from PathMtu import PROBE_TIMEOUT
+from Sessions import SessionRegistry, REAP_INTERVAL
+from Rtsp import RtspError, RECV_SIZE, LEGACY_GRACE
+
+class FeedbackProtocol(asyncio.DatagramProtocol):
+	"""Pass RTCP datagrams arriving on a session's RTP socket to the session."""
+
+	def __init__(self, session):
+		self.session = session
+
+	def datagram_received(self, data, addr):
+		self.session.handleFeedback(data)
+
+class AsyncSession(ServerWorker):
+	"""ServerWorker driven by a shared asyncio event loop instead of threads.
+
+	RTSP handling is inherited unchanged; only the control connection, the
+	RTP socket and frame pacing are swapped for loop-based equivalents.
+	Frames are sent from call_at() deadlines, so an idle or paused session
+	costs nothing but its state. Anything that may block on the disk runs on
+	the loop's executor: opening and indexing the file at SETUP, loading its
+	hint track, and reading each frame one deadline ahead of its send.
+	"""
+
+	def __init__(self, clientInfo, loop, writer, registry=None):
+		super().__init__(clientInfo, registry)
+		self.loop = loop
+		self.writer = writer
+		self._playing = False
+		self._timer = None
+		self._transportTask = None
+		self._probing = False
+		# Stream opened on the executor for the SETUP being processed (or its error)
+		self._opened = None
+		# Read of the next frame in flight: (zero-based frame, rendition, future)
+		self._ahead = None
+		# Read the tick is waiting on because it was not done at the deadline
+		self._waiting = None
+
+	async def prepareRequest(self, request):
+		"""Do the blocking part of a request on the executor before processing it on the loop."""
+		if request.isRequest and request.method == self.SETUP and self.state == self.INIT:
+			try:
+				self.parseTransport(request)
+			except ValueError:
+				# Answered 400 without opening anything
+				return
+			try:
+				self._opened = await self.loop.run_in_executor(None, self._openAll, request.uri,
+															   self.parseDisplaySize(request))
+			except IOError as e:
+				self._opened = e
+
+	async def finishRequest(self, request):
+		"""Load the hint track a SETUP will send from, off the loop."""
+		vs = self.clientInfo.get('videoStream')
+		if request.isRequest and request.method == self.SETUP and vs is not None and self.HINT_TRACKS:
+			await self.loop.run_in_executor(None, vs.hintTrack, self.MTU, self.FRAG_VERSION)
+
+	def _openAll(self, filename, displaySize):
+		stream = super().openStream(filename, displaySize)
+		if hasattr(stream, 'openAll'):
+			# Rendition switches must not open files on the loop either
+			stream.openAll()
+		return stream
+
+	def openStream(self, filename, displaySize=None):
+		"""Hand over the stream prepareRequest() opened on the executor."""
+		opened, self._opened = self._opened, None
+		if opened is None:
+			return super().openStream(filename, displaySize)
+		if isinstance(opened, Exception):
+			raise opened
+		return opened
+
+	def openRtpSocket(self):
+		"""Create the RTP socket and wrap it in a datagram transport."""
+		sock = super().openRtpSocket()
+		sock.setblocking(False)
+		self._transportTask = self.loop.create_task(self._openTransport(sock))
+		return sock
+
+	def _startFeedback(self, rtpSocket):
+		"""Feedback arrives through the transport's protocol instead of a thread."""
+		pass
+
+	async def _openTransport(self, sock):
+		try:
+			transport, _ = await self.loop.create_datagram_endpoint(lambda: FeedbackProtocol(self), sock=sock)
+		except OSError as e:
+			print(f"[ASYNC] RTP transport error: {e}")
+			return
+		# DatagramTransport.sendto()/close() match the socket calls ServerWorker makes
+		self.clientInfo['rtpSocket'] = transport
+
+	def _startStreaming(self):
+		"""Schedule frame deadlines on the loop from the current stream position."""
+		self._cancelTimer()
+		self._playing = True
+		if self.startMtuProbe():
+			# First frame once the largest probe is echoed, or at the timeout
+			self._probing = True
+			self._timer = self.loop.call_later(PROBE_TIMEOUT, self._endMtuProbe)
+			return
+		self._startPacing()
+
+	def onMtuEcho(self, size):
+		super().onMtuEcho(size)
+		if self._probing and self._mtuProbe.done.is_set():
+			self._cancelTimer()
+			self._endMtuProbe()
+
+	def _endMtuProbe(self):
+		self._timer = None
+		self._probing = False
+		if self._playing:
+			self._startPacing()
+
+	def _startPacing(self):
+		"""Start the deadline chain with fragments sized for the path."""
+		self.finishMtuProbe()
+		self.pacer = FramePacer(self.frameInterval(), clock=self.loop.time)
+		self._pacingReported = False
+		if self._transportTask is not None and not self._transportTask.done():
+			self._transportTask.add_done_callback(lambda task: self._kick())
+		else:
+			self._kick()
+
+	def _kick(self):
+		"""Start the deadline chain unless it is already running."""
+		if self._playing and self._timer is None:
+			self._tick()
+
+	def _stopStreaming(self):
+		"""Stop scheduling frames; takes effect before the next deadline."""
+		self._playing = False
+		self._probing = False
+		self._cancelTimer()
+		# A read still in flight is dropped when it lands
+		self._ahead = None
+		self._waiting = None
+		self._reportPacing()
+
+	def _cancelTimer(self):
+		if self._timer is not None:
+			self._timer.cancel()
+			self._timer = None
+
+	def _tick(self):
+		"""Send the frame due at this deadline and schedule the next one."""
+		self._timer = None
+		if not self._playing:
+			return
+
+		vs = self.clientInfo['videoStream']
+		# Too far behind to catch up: skip the frames whose time has passed
+		drop = self.pacer.next()
+		if drop:
+			vs.seek(vs.frameNbr() + drop)
+		self.stats['frames_skipped'] += drop
+
+		self.selectRendition()
+		self._sendNext()
+
+	def _sendNext(self):
+		"""Send the frame at the stream position and schedule the next deadline.
+
+		The stream position only moves on the loop; the executor reads frames
+		by number, so a seek or PAUSE never races a read.
+		"""
+		vs = self.clientInfo['videoStream']
+		n = vs.frameNbr()
+		if n >= vs.frameCount():
+			# End of stream: stay idle until a seek restarts playback
+			return
+		read = self._readAhead(n)
+		if not read.done():
+			# Cold read still in flight: send as soon as it lands
+			self._waiting = read
+			read.add_done_callback(self._onFrameRead)
+			return
+		self._ahead = None
+		try:
+			data = read.result()
+		except Exception as e:
+			print(f"[ASYNC] Frame read error: {e}")
+			data = None
+		vs.seek(n + 1)
+		if data:
+			self.sendFrame(data, n + 1)
+		# Read the next frame while waiting for its deadline
+		if n + 1 < vs.frameCount():
+			self._readAhead(n + 1)
+		self._timer = self.loop.call_at(self.pacer.deadline, self._tick)
+
+	def _readAhead(self, n):
+		"""Future of zero-based frame n from the selected rendition, read on the executor."""
+		vs = self.clientInfo['videoStream']
+		rendition = getattr(vs, 'rendition', None)
+		if self._ahead is not None and self._ahead[:2] == (n, rendition):
+			return self._ahead[2]
+		future = self.loop.run_in_executor(None, vs.readFrame, n)
+		self._ahead = (n, rendition, future)
+		return future
+
+	def _onFrameRead(self, read):
+		if read is self._waiting and self._playing:
+			self._waiting = None
+			self._sendNext()
+
+	def sendPaced(self, packets, address, frameBytes):
+		"""Send the whole frame at once: sleeping between bursts would stall the loop."""
+		return self.rtpSender().sendPackets(packets, address)
+
+	def sendRtspReply(self, data):
+		self.writer.write(data)
+
+	def closeControl(self):
+		"""Close the control connection; its reader then sees EOF."""
+		self.writer.close()
+		return True
+
+class AsyncServer:
+	"""Single event loop serving every RTSP session of the process."""
+
+	def __init__(self, port=None, sock=None, registry=None):
+		self.port = port
+		self.sock = sock
+		self.registry = registry if registry is not None else SessionRegistry()
+
+	def run(self):
+		asyncio.run(self.serve())
+
+	async def serve(self):
+		if self.sock is not None:
+			server = await asyncio.start_server(self.handleClient, sock=self.sock)
+		else:
+			server = await asyncio.start_server(self.handleClient, '', self.port)
+		print(f"[ASYNC] RTSP server listening on {server.sockets[0].getsockname()}")
+		self._reap(asyncio.get_running_loop())
+		async with server:
+			await server.serve_forever()
+
+	def _reap(self, loop):
+		"""Close timed-out sessions on the loop, every REAP_INTERVAL seconds."""
+		if self.registry.reap():
+			print(self.registry.summary())
+		loop.call_later(REAP_INTERVAL, self._reap, loop)
+
+	async def handleClient(self, reader, writer):
+		"""Run one RTSP control connection until the client disconnects."""
+		clientInfo = {'rtspSocket': (None, writer.get_extra_info('peername'))}
+		session = AsyncSession(clientInfo, asyncio.get_running_loop(), writer, self.registry)
+		self.registry.add(session)
+		reason = 'eof'
+		try:
+			while not session.closed:
+				if session.rtspParser.unterminated:
+					# A legacy client ends a request with its write: wait a moment for more before taking it as whole
+					try:
+						data = await asyncio.wait_for(reader.read(RECV_SIZE), LEGACY_GRACE)
+					except asyncio.TimeoutError:
+						data = None
+				else:
+					data = await reader.read(RECV_SIZE)
+				if data == b'':
+					break
+				try:
+					requests = session.readRtspRequests(data) if data is not None else session.rtspParser.flush()
+				except RtspError as e:
+					session.rejectRtspStream(e)
+					reason = 'error'
+					break
+				for request in requests:
+					await session.prepareRequest(request)
+					session.answerRtspRequest(request)
+					await session.finishRequest(request)
+				if session.rtspParser.error is not None:
+					# Requests before the fault were answered; nothing after it can be
+					session.rejectRtspStream(session.rtspParser.error)
+					await writer.drain()
+					reason = 'error'
+					break
+				await writer.drain()
+		except ConnectionError:
+			reason = 'error'
+		finally:
+			session.close(reason)
@@ -0,0 +1,222 @@
+import socket, select, threading, time
+from random import randint
+
+from VideoStream import VideoStream, DEFAULT_FPS
+from RtpSender import RtpSender
+from Pacer import FramePacer
+from Retransmission import RetransmitRing
+from Fragmentation import FLAG_RETRANSMIT
+from Rtcp import iterPackets, parseNack, PT_RTPFB, FMT_NACK
+from ServerWorker import ServerWorker
+from Packetizer import RTP_CLOCK_RATE, buildFragments, makeRtpHeader, openRtpSocket
+from PathMtu import ETHERNET_MTU, payloadSize
+
+MULTICAST_TTL = 16
+
+class Broadcast:
+	"""One reader and packetizer per file, fanned out to every viewer in lockstep.
+
+	Each frame is read, fragmented and RTP-encoded once; the same packet
+	buffers then go to every subscriber (one GSO/sendmsg batch each), or
+	once to a multicast group when one is configured. Viewers that join
+	are added at the next frame boundary, so their first packet is the
+	first fragment of a frame. The file loops, and RTP sequence numbers
+	and timestamps keep counting across loops so a wrap looks like one
+	continuous stream. The broadcast stops when its last viewer leaves.
+	"""
+
+	# (filename, fps, multicast) -> running broadcast; sessions only share a
+	# stream sent the way they asked for
+	_active = {}
+	_activeLock = threading.Lock()
+
+	def __init__(self, filename, fps=None, multicast=None):
+		self.filename = filename
+		self.key = (filename, fps or DEFAULT_FPS, multicast)
+		self.stream = VideoStream(filename, fps)
+		self.interval = 1.0 / self.stream.fps
+		self.multicast = multicast
+		# Packetizes with the server's MTU and fragmentation settings; the
+		# packets are shared, so with PATH_MTU they are sized for Ethernet
+		self.fragVersion = ServerWorker.FRAG_VERSION
+		if ServerWorker.PATH_MTU:
+			self.mtu = payloadSize(ETHERNET_MTU, self.fragVersion)
+		else:
+			self.mtu = ServerWorker.MTU
+		self.sock = openRtpSocket(ServerWorker.PATH_MTU)
+		if multicast is not None:
+			self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, MULTICAST_TTL)
+		self.sender = RtpSender(self.sock)
+		self.ring = RetransmitRing()
+		self.tsBase = randint(0, 0xFFFFFFFF)
+		self.sequence = randint(0, 0xFFFF)
+		self.loopOffset = 0.0
+		# session -> address; joiners wait in _pending for a frame boundary
+		self.subscribers = {}
+		self._pending = {}
+		self._lock = threading.Lock()
+		self._stop = threading.Event()
+		self.stats = {
+			'frames': 0,
+			'loops': 0,
+			'packets': 0,
+			'sends': 0,
+			'bytes_sent': 0,
+			'peak_viewers': 0,
+			'fragments_retransmitted': 0
+		}
+
+	@classmethod
+	def join(cls, session, filename, address, fps=None, multicast=None):
+		"""Subscribe session (sending to address) to the broadcast of filename, starting it if needed.
+
+		Raises ValueError if the multicast group already carries another
+		file or frame rate.
+		"""
+		key = (filename, fps or DEFAULT_FPS, multicast)
+		with cls._activeLock:
+			broadcast = cls._active.get(key)
+			if broadcast is None:
+				if multicast is not None:
+					for other in cls._active.values():
+						if other.multicast == multicast:
+							raise ValueError(f"multicast group {multicast[0]}:{multicast[1]} already carries "
+											 f"{other.filename} at {other.stream.fps} fps")
+				broadcast = cls._active[key] = cls(filename, fps, multicast)
+				broadcast.start()
+			broadcast._subscribe(session, address)
+		return broadcast
+
+	def leave(self, session):
+		"""Unsubscribe session; the last viewer to leave stops the broadcast."""
+		with Broadcast._activeLock:
+			with self._lock:
+				self._pending.pop(session, None)
+				self.subscribers.pop(session, None)
+				empty = not self.subscribers and not self._pending
+			if empty and Broadcast._active.get(self.key) is self:
+				del Broadcast._active[self.key]
+				self._stop.set()
+
+	def _subscribe(self, session, address):
+		with self._lock:
+			self._pending[session] = address
+
+	def viewers(self):
+		with self._lock:
+			return len(self.subscribers) + len(self._pending)
+
+	def start(self):
+		threading.Thread(target=self.run, daemon=True).start()
+		threading.Thread(target=self.recvFeedback, daemon=True).start()
+		print(f"[BROADCAST] Started {self.filename}"
+			  + (f" to multicast {self.multicast[0]}:{self.multicast[1]}" if self.multicast else ""))
+
+	def run(self):
+		"""Send one frame per pacer deadline to every subscriber until stopped."""
+		pacer = FramePacer(self.interval)
+		try:
+			while True:
+				drop = pacer.wait(self._stop)
+				if self._stop.is_set():
+					break
+				# Behind schedule: stay on the shared clock rather than catching up
+				for _ in range(drop):
+					self._nextFrame()
+				frame = self._nextFrame()
+				if frame is not None:
+					self.sendFrame(*frame)
+		finally:
+			self.sock.close()
+			self.stream.close()
+			print(self.summary())
+
+	def _nextFrame(self):
+		"""Return (data, media time) of the next frame, looping at the end of the file."""
+		data = self.stream.nextFrame()
+		if data is None:
+			self.loopOffset += self.stream.duration()
+			self.stream.seek(0)
+			self.stats['loops'] += 1
+			data = self.stream.nextFrame()
+			if data is None:
+				return None
+		return data, self.loopOffset + self.stream.frameTime(self.stream.frameNbr() - 1)
+
+	def packetize(self, data, seq, timestamp, fragments=None, flags=0):
+		"""(header, payload) pairs of a frame: fragments, or one RTP packet if it fits."""
+		if len(data) > self.mtu:
+			return buildFragments(data, seq, timestamp, self.mtu, self.fragVersion, fragments, flags)
+		return [(makeRtpHeader(seq, 1, timestamp), data)]
+
+	def sendFrame(self, data, mediaTime):
+		"""Packetize a frame once and send it to every viewer."""
+		self.sequence = (self.sequence + 1) & 0xFFFF
+		seq = self.sequence
+		timestamp = (self.tsBase + int(round(mediaTime * RTP_CLOCK_RATE))) & 0xFFFFFFFF
+		packets = self.packetize(data, seq, timestamp)
+		self.ring.add(seq, data, timestamp, time.monotonic())
+
+		# Frame boundary: viewers that joined since the last frame start here
+		with self._lock:
+			if self._pending:
+				self.subscribers.update(self._pending)
+				self._pending.clear()
+				self.stats['peak_viewers'] = max(self.stats['peak_viewers'], len(self.subscribers))
+			subscribers = list(self.subscribers.items())
+
+		if self.multicast is not None:
+			targets = [(None, self.multicast)]
+		else:
+			targets = subscribers
+		for session, address in targets:
+			try:
+				sent = self.sender.sendPackets(packets, address)
+			except OSError as e:
+				print(f"[BROADCAST] Send to {address} failed: {e}")
+				continue
+			self.stats['sends'] += 1
+			self.stats['bytes_sent'] += sent
+			if session is not None:
+				session.stats['bytes_sent'] += sent
+				session.stats['fragments_sent'] += len(packets)
+				session.stats['frames_sent'] += 1
+		if self.multicast is not None:
+			for session, _ in subscribers:
+				session.stats['frames_sent'] += 1
+		self.stats['frames'] += 1
+		self.stats['packets'] += len(packets)
+
+	def recvFeedback(self):
+		"""Answer NACKs from any viewer with a unicast retransmission."""
+		while not self._stop.is_set():
+			try:
+				readable, _, _ = select.select([self.sock], [], [], 0.5)
+				if not readable:
+					continue
+				data, address = self.sock.recvfrom(2048)
+			except (OSError, ValueError):
+				break
+			for pt, fmt, body in iterPackets(data):
+				if pt == PT_RTPFB and fmt == FMT_NACK:
+					for seq, fragments in parseNack(body):
+						self.retransmit(seq, fragments, address)
+
+	def retransmit(self, seq, fragments, address):
+		request = self.ring.request(seq, fragments, self.mtu, time.monotonic())
+		if request is None:
+			return
+		data, timestamp, resend = request
+		packets = self.packetize(data, seq, timestamp, resend, FLAG_RETRANSMIT)
+		try:
+			self.sender.sendPackets(packets, address)
+		except OSError:
+			return
+		self.stats['fragments_retransmitted'] += len(packets)
+
+	def summary(self):
+		"""One-line report of the broadcast's fan-out."""
+		return (f"[BROADCAST] {self.filename} | {self.stats['frames']} frames ({self.stats['loops']} loops) | "
+				f"{self.stats['packets']} packets built, {self.stats['sends']} fan-out sends | "
+				f"peak {self.stats['peak_viewers']} viewers | {self.stats['bytes_sent'] / 1048576:.1f} MB | "
+				f"resent {self.stats['fragments_retransmitted']} fragments")
@@ -2,15 +2,27 @@ import sys
 from tkinter import *
 import tkinter.messagebox as messagebox
 from PIL import Image, ImageTk
-import socket, threading, time, os, glob
-from collections import deque
+import socket, threading, time, os, glob, random
 import struct
 
-from RtpPacket import RtpPacket
+from RtpPacket import RtpPacket, HEADER_SIZE
+from Fragmentation import FrameAssembler, FRAG_HEADER_V1, isWholeFrame, fragmentInfo, FLAG_PARITY, FLAG_RETRANSMIT
+from RtpReceiver import RtpReceiver, MAX_UDP_PAYLOAD
+from JitterBuffer import JitterBuffer
+from FrameDecoder import FrameDecoder, fitSize
+from Rtcp import (buildNack, isRtcp, iterPackets, PT_SR, PT_APP, parseSenderReport, buildReceiverReport,
+	buildQosReport, buildRemb, parseSkipNotice, buildMtuProbe, parseMtuProbe, ReceptionStats)
+from Congestion import DelayBasedEstimator
+from PathMtu import routeMtu, IP_HEADER, UDP_HEADER
+from Rtsp import RtspParser, RtspError, RECV_SIZE, LEGACY_GRACE, buildRequest, splitParams
 
 CACHE_FILE_NAME = "cache-"
 CACHE_FILE_EXT = ".jpg"
 
+def isNewerSeq(a, b):
+	"""True if 16-bit sequence number a comes after b (allowing for wraparound)."""
+	return 0 < ((a - b) & 0xFFFF) < 0x8000
+
 class Client:
 	INIT = 0
 	READY = 1
@@ -21,11 +33,24 @@ class Client:
 	PLAY = 1
 	PAUSE = 2
 	TEARDOWN = 3
+	KEEPALIVE = 4
 	
-	BUFFER_SIZE = 1
 	MAX_BUFFER = 50
+	UNDERRUN_TIMEOUT = 0.25  # Seconds without a frame before showing "Buffering"
+	DEFAULT_DISPLAY_SIZE = (1280, 680)  # Until the video label reports its size
+	MAX_PHOTOS = 4  # PhotoImages kept for recently used output sizes
+	
+	# Selective retransmission: NACK the missing fragments of a frame once a
+	# newer frame starts arriving, at most MAX_NACKS_PER_FRAME times
+	NACK_RETRY_INTERVAL = 0.04
+	NACK_DEADLINE = 0.5  # Stop asking this long after a frame's first fragment
+	MAX_NACKS_PER_FRAME = 3
+	MAX_NACK_GAP = 8  # Whole missing frames requested per sequence gap
+	
+	REPORT_INTERVAL = 1.0  # Seconds between RTCP receiver reports
+	REMB_MIN_INTERVAL = 0.1  # Earliest resend of a falling bandwidth estimate
 	
-	def __init__(self, master, serveraddr, serverport, rtpport, filename):
+	def __init__(self, master, serveraddr, serverport, rtpport, filename, lowLatency=False, latencyBudget=0.1):
 		self.master = master
 		self.master.protocol("WM_DELETE_WINDOW", self.handler)
 		self.createWidgets()
@@ -37,27 +62,82 @@ class Client:
 		self.sessionId = 0
 		self.requestSent = -1
 		self.teardownAcked = 0
+		# Session timeout announced by the server (keepalives go out at half of it)
+		self.sessionTimeout = None
+		self.replyPending = False
 		self.connectToServer()
 		self.frameNbr = 0
 		
-		self.frameBuffer = deque(maxlen=100)
-		self.bufferThreshold = self.BUFFER_SIZE
+		# Live-edge mode: show the newest frame within latencyBudget seconds,
+		# skipping older ones, instead of playing every frame smoothly
+		self.lowLatency = lowLatency
+		self.latencyBudget = latencyBudget
+		
+		# Frames are released at their RTP presentation time, not by buffer fill level
+		if lowLatency:
+			self.frameBuffer = JitterBuffer(capacity=100, maxDelay=latencyBudget)
+		else:
+			self.frameBuffer = JitterBuffer(capacity=100)
 		self.buffering = False
 		
-		self.lastLabelWidth = 0
-		self.lastLabelHeight = 0
+		# JPEG decode and scaling run on a thread pool as frames arrive
+		self.decoder = FrameDecoder()
+		self.decoder.targetSize = self.DEFAULT_DISPLAY_SIZE
+		# Frames that are due but still being decoded, oldest first
+		self.pendingFrames = []
+		self.lastDisplayTime = 0.0
+		
+		self.displaySize = self.DEFAULT_DISPLAY_SIZE
+		# One PhotoImage per output size, updated in place with paste()
+		self.photos = {}
+		self.shownPhoto = None
 		self.frameDisplayCount = 0
 		
-		self.fragmentBuffer = {}
 		self.fragmentTimeout = 3.0
+		self.assembler = FrameAssembler(self.fragmentTimeout)
 		
 		self.lastSeqNum = -1
 		self.seqNumGaps = 0
 		
+		self.ssrc = random.getrandbits(32)
+		# frameNumber -> [NACKs sent, time of the last one]
+		self.nackState = {}
+		
+		# Pre-repair loss for receiver reports, and the last sender report
+		# (NTP middle 32 bits, local arrival time) for the server's RTT
+		self.reception = ReceptionStats()
+		self.lastSr = None
+		self.nextReport = 0.0
+		# Delay-based bandwidth estimate sent to the server's congestion control
+		self.bandwidth = DelayBasedEstimator()
+		self.lastRemb = 0.0
+		
+		self.rtpReceiver = None
+		# Largest packet advertised to the server in SETUP (see maxPacketSize)
+		self.packetLimit = MAX_UDP_PAYLOAD + IP_HEADER + UDP_HEADER
+		self.rtpPacket = RtpPacket()
+		self.packetCount = 0
+		
+		# (group, port) when the server broadcasts to a multicast group
+		self.multicast = None
+		
+		self.duration = 0.0
+		self.seekPosition = None
+		self.seekPending = False
+		
 		self.stats = {
 			'frames_received': 0,
 			'frames_dropped': 0,
+			'frames_skipped': 0,
+			'frames_recovered': 0,
+			'nacks_sent': 0,
+			'fragments_requested': 0,
+			'fec_unrecoverable': 0,
+			'fec_bytes': 0,
+			'reports_sent': 0,
+			'rembs_sent': 0,
 			'fragments_received': 0,
+			'packets_truncated': 0,
 			'bytes_received': 0,
 			'start_time': None,
 			'latency': []
@@ -75,6 +155,8 @@ class Client:
 		self.label = Label(self.master, bg="black")
 		self.label.grid(row=0, column=0, columnspan=4, sticky=W+E+N+S, padx=5, pady=5)
 		self.label.pack_propagate(False)
+		# Scaling geometry only changes when the label is resized
+		self.label.bind('<Configure>', self.onLabelResize)
 		
 		button_frame = Frame(self.master)
 		button_frame.grid(row=1, column=0, columnspan=4, sticky=W+E, padx=5, pady=5)
@@ -99,9 +181,14 @@ class Client:
 							   font=("Arial", 12), padx=20, pady=10, bg="#F44336", fg="white")
 		self.teardown.grid(row=0, column=3, padx=2, pady=2, sticky=W+E)
 		
+		self.seekScale = Scale(self.master, from_=0, to=0, resolution=0.1, orient=HORIZONTAL,
+							   label="Seek (s)", showvalue=True)
+		self.seekScale.grid(row=2, column=0, columnspan=4, sticky=W+E, padx=5, pady=2)
+		self.seekScale.bind("<ButtonRelease-1>", self.seekMovie)
+		
 		self.statsLabel = Label(self.master, text="Ready", fg="blue", font=("Arial", 10), 
 							   bg="lightgray", height=2, wraplength=800)
-		self.statsLabel.grid(row=2, column=0, columnspan=4, sticky=W+E, padx=5, pady=2)
+		self.statsLabel.grid(row=3, column=0, columnspan=4, sticky=W+E, padx=5, pady=2)
 	
 	def setupMovie(self):
 		if self.state == self.INIT:
@@ -111,6 +198,8 @@ class Client:
 		try:
 			if hasattr(self, 'playEvent') and self.playEvent:
 				self.playEvent.set()
+			self.stopListening()
+			self.decoder.close()
 			
 			self.sendRtspRequest(self.TEARDOWN)
 			
@@ -154,11 +243,21 @@ class Client:
 		if self.state == self.PLAYING:
 			self.sendRtspRequest(self.PAUSE)
 	
+	def seekMovie(self, event=None):
+		"""Jump to the slider position: immediately while playing, or on the next PLAY."""
+		if self.state == self.INIT:
+			return
+		self.seekPosition = float(self.seekScale.get())
+		if self.state == self.PLAYING:
+			self.sendRtspRequest(self.PLAY)
+	
 	def playMovie(self):
 		if self.state == self.READY:
 			self.stats['start_time'] = time.time()
 			self.buffering = True
 			
+			self.rtpReceiver = RtpReceiver(self.rtpSocket, self.handleRtpPacket,
+										   self.packetLimit - IP_HEADER - UDP_HEADER)
 			threading.Thread(target=self.listenRtp).start()
 			
 			self.master.after(50, self.displayFramesScheduled)
@@ -168,53 +267,47 @@ class Client:
 			self.sendRtspRequest(self.PLAY)
 
 	def displayFramesScheduled(self):
-
+		"""Show every frame whose presentation time has come, then sleep until the next one."""
 		try:
 			if self.playEvent.isSet():
 				return
 			
-			if self.buffering:
-				if len(self.frameBuffer) >= self.bufferThreshold:
-					self.buffering = False
-					print(f"[BUFFER] Ready - {len(self.frameBuffer)} frames buffered")
-				else:
-					self.updateStatsLabel(f"Buffering: {len(self.frameBuffer)}/{self.bufferThreshold}")
-					self.master.after(1, self.displayFramesScheduled)
-					return
-			
-			if len(self.frameBuffer) < 1:
-				self.buffering = True
-				print("[BUFFER] Rebuffering...")
-				self.master.after(10, self.displayFramesScheduled)
+			now = time.time()
+			frame_info = self.takeFrame(now)
+			if frame_info is None and self.pendingFrames:
+				# Due but still decoding: check back shortly
+				self.master.after(2, self.displayFramesScheduled)
 				return
-			if len(self.frameBuffer) > 0:
-				frame_info = self.frameBuffer.popleft()
+			
+			if frame_info is None:
+				# An empty buffer between frames is normal; only a stall is an underrun
+				if len(self.frameBuffer) == 0 and not self.buffering and now - self.lastDisplayTime > self.UNDERRUN_TIMEOUT:
+					self.buffering = True
+					print("[BUFFER] Underrun, waiting for frames...")
+				if self.buffering:
+					self.updateStatsLabel(f"Buffering... (target delay {self.frameBuffer.targetDelay * 1000:.0f}ms)")
+			else:
+				if self.buffering:
+					self.buffering = False
+					print(f"[BUFFER] Playing - {len(self.frameBuffer)} frames queued, target delay {self.frameBuffer.targetDelay * 1000:.0f}ms")
 				
-				latency = (time.time() - frame_info['timestamp']) * 1000
+				latency = (now - frame_info['timestamp']) * 1000
 				if len(self.stats['latency']) >= 100:
 					self.stats['latency'].pop(0)
 				self.stats['latency'].append(latency)
 				
-				self.updateMovie(frame_info['data'])
+				if frame_info['image'].exception() is None:
+					self.updateMovie(frame_info['image'].result())
 				self.frameDisplayCount += 1
+				self.lastDisplayTime = now
 				
 				if self.frameDisplayCount % 20 == 0:
 					self.updateStatsLabel()
-				
-				if len(self.frameBuffer) > 15:
-					delay = 0
-				elif len(self.frameBuffer) > 10:
-					delay = 0
-				elif len(self.frameBuffer) > 5:
-					delay = 1
-				elif len(self.frameBuffer) > 2:
-					delay = 2
-				else:
-					delay = 3
-				
-				self.master.after(delay, self.displayFramesScheduled)
-			else:
-				self.master.after(50, self.displayFramesScheduled)
+			
+			# Wake up when the next frame is due (poll while the buffer is empty)
+			due = self.frameBuffer.nextDue(time.time())
+			delay = 10 if due is None else int(due * 1000)
+			self.master.after(delay, self.displayFramesScheduled)
 				
 		except Exception as e:
 			if not self.playEvent.isSet():
@@ -225,119 +318,278 @@ class Client:
 					pass
 
 	
+	def takeFrame(self, now):
+		"""Return the frame to show now, or None (pendingFrames holds due frames still decoding)."""
+		if not self.lowLatency:
+			frame_info = self.pendingFrames.pop(0) if self.pendingFrames else self.frameBuffer.pop(now)
+			if frame_info is not None and not frame_info['image'].done():
+				# Hold it so frames stay in order
+				self.pendingFrames.append(frame_info)
+				return None
+			return frame_info
+		
+		# Live edge: of all due frames, show the newest decoded one and skip the older ones
+		waiting = self.pendingFrames + self.frameBuffer.popAll(now)
+		newest = None
+		for i in range(len(waiting) - 1, -1, -1):
+			if waiting[i]['image'].done():
+				newest = i
+				break
+		
+		if newest is None:
+			# Nothing decoded yet: give up on frames past the budget that a newer one replaces
+			stale = 0
+			while stale < len(waiting) - 1 and now - waiting[stale]['timestamp'] > self.latencyBudget:
+				stale += 1
+			self.skipFrames(waiting[:stale])
+			self.pendingFrames = waiting[stale:]
+			return None
+		
+		self.skipFrames(waiting[:newest])
+		self.pendingFrames = waiting[newest + 1:]
+		return waiting[newest]
+	
+	def skipFrames(self, frames):
+		"""Discard stale frames in live-edge mode, cancelling decodes not started yet."""
+		for frame_info in frames:
+			frame_info['image'].cancel()
+		self.stats['frames_skipped'] += len(frames)
+	
 	def listenRtp(self):
 		print("[CLIENT] Listening for RTP packets...")
+		# Blocks in select/epoll until packets arrive or stopListening() is called
+		self.rtpReceiver.run()
+		print("[CLIENT] RTP listener stopping...")
+	
+	def stopListening(self):
+		if self.rtpReceiver is not None and not self.rtpReceiver.stopped:
+			self.rtpReceiver.stop()
+			# The next PLAY makes a new receiver: keep the count
+			self.stats['packets_truncated'] += self.rtpReceiver.stats['truncated']
+	
+	def handleRtpPacket(self, data):
+		"""Handle one datagram; data is a view of a pooled receive buffer."""
+		# RTCP shares the port with RTP (RFC 5761)
+		if isRtcp(data):
+			self.handleRtcp(data)
+			return
+		rtpPacket = RtpPacket.parse(data, self.rtpPacket)
 		
-		packet_count = 0
-		while True:
-			if hasattr(self, 'playEvent') and self.playEvent and self.playEvent.isSet():
-				print("[CLIENT] RTP listener stopping...")
-				break
-			
-			try:
-				data = self.rtpSocket.recv(524288)
-				
-				if data:
-					rtpPacket = RtpPacket()
-					rtpPacket.decode(data)
-					
-					self.stats['bytes_received'] += len(data)
-					payload = rtpPacket.getPayload()
-					packet_count += 1
-					
-					if packet_count % 2000 == 0:
-						print(f"[STATS] Received {packet_count} RTP packets, Buffer: {len(self.frameBuffer)}")
-					
-					if len(payload) > 6 and self.isFragmented(payload):
-						self.handleFragment(rtpPacket, payload)
-					else:
-						self.handleFrame(rtpPacket.seqNum(), payload)
-					
-			except socket.timeout:
-				continue
-			except Exception as e:
-				if self.playEvent.isSet():
-					break
-				print(f"[RTP ERROR] {e}")
+		self.stats['bytes_received'] += len(data)
+		payload = rtpPacket.getPayload()
+		self.packetCount += 1
+		now = time.monotonic()
+		self.bandwidth.onPacket(rtpPacket.timestamp(), len(data), now)
+		
+		if self.packetCount % 2000 == 0:
+			print(f"[STATS] Received {self.packetCount} RTP packets, Buffer: {len(self.frameBuffer)}")
+		
+		if self.isFragmented(payload):
+			self.handleFragment(rtpPacket, payload)
+		else:
+			# The receive buffer is reused: keep a copy of whole frames
+			self.reception.onPacket(rtpPacket.seqNum(), 1)
+			if self.nackState.pop(rtpPacket.seqNum(), None) is not None:
+				self.stats['frames_recovered'] += 1
+			self.handleFrame(rtpPacket.seqNum(), bytes(payload), rtpPacket.timestamp())
+		
+		if now >= self.nextReport:
+			self.nextReport = now + self.REPORT_INTERVAL
+			self.sendReport(now)
+		elif self.bandwidth.urgent() and now - self.lastRemb >= self.REMB_MIN_INTERVAL:
+			# Congestion: tell the server now rather than at the next report
+			self.sendRemb(now)
 	
-	def isFragmented(self, payload):
+	def handleRtcp(self, data):
+		"""Remember the time of the server's latest sender report; note frames it skipped; echo MTU probes."""
+		for pt, _, body in iterPackets(data):
+			if pt == PT_SR:
+				self.lastSr = (parseSenderReport(body)[1], time.monotonic())
+			elif pt == PT_APP:
+				notice = parseSkipNotice(body)
+				if notice is not None:
+					self.onFramesSkipped(*notice)
+				probeSize = parseMtuProbe(body)
+				if probeSize is not None:
+					self.echoMtuProbe(probeSize)
+	
+	def echoMtuProbe(self, probeSize):
+		"""Tell the server a probe of probeSize bytes got through."""
+		source = self.rtpReceiver.source if self.rtpReceiver is not None else None
+		if source is None:
+			return
 		try:
-			fragNum, numFrags, frameSize = struct.unpack('!HHH', payload[:6])
-			return numFrags > 1
-		except:
-			return False
+			self.rtpSocket.sendto(buildMtuProbe(self.ssrc, probeSize), source)
+		except OSError:
+			pass
+	
+	def maxPacketSize(self):
+		"""Largest IP packet to accept: the route MTU to the server, at most a whole UDP datagram.
+		
+		Advertised in SETUP; the receive buffers are sized to match.
+		"""
+		limit = MAX_UDP_PAYLOAD + IP_HEADER + UDP_HEADER
+		route = routeMtu((self.serverAddr, self.serverPort))
+		self.packetLimit = min(route, limit) if route else limit
+		return self.packetLimit
+	
+	def onFramesSkipped(self, firstFrame, count):
+		"""The server left these frames out (congestion control or pacing): they are not losses."""
+		self.reception.onSkipped(firstFrame, count)
+		lastFrame = (firstFrame + count - 1) & 0xFFFF
+		if self.lastSeqNum >= 0 and isNewerSeq(lastFrame, self.lastSeqNum):
+			self.lastSeqNum = lastFrame
+	
+	def sendReport(self, now):
+		"""Send a compound RTCP RR (loss, jitter, LSR/DLSR) + QoS APP (playout buffer) to the server."""
+		source = self.rtpReceiver.source if self.rtpReceiver is not None else None
+		if source is None or self.reception.maxSeq is None:
+			return
+		lsr, dlsr = 0, 0
+		if self.lastSr is not None:
+			lsr = self.lastSr[0]
+			dlsr = int((now - self.lastSr[1]) * 65536) & 0xFFFFFFFF
+		report = buildReceiverReport(self.ssrc, 0, self.reception.fractionLost(), self.reception.cumulativeLost(),
+			self.reception.extendedHighest(), self.frameBuffer.jitter * 90000, lsr, dlsr)
+		report += buildQosReport(self.ssrc, len(self.frameBuffer) + len(self.pendingFrames),
+			self.frameBuffer.targetDelay * 1000, self.stats['bytes_received'])
+		if self.bandwidth.estimate is not None:
+			report += buildRemb(self.ssrc, self.bandwidth.estimate)
+			self.bandwidth.markReported()
+			self.lastRemb = now
+		try:
+			self.rtpSocket.sendto(report, source)
+		except OSError:
+			return
+		self.stats['reports_sent'] += 1
+	
+	def sendRemb(self, now):
+		"""Send the current bandwidth estimate on its own."""
+		source = self.rtpReceiver.source if self.rtpReceiver is not None else None
+		if source is None:
+			return
+		self.bandwidth.markReported()
+		self.lastRemb = now
+		try:
+			self.rtpSocket.sendto(buildRemb(self.ssrc, self.bandwidth.estimate), source)
+		except OSError:
+			return
+		self.stats['rembs_sent'] += 1
+	
+	def isFragmented(self, payload):
+		# Unfragmented frames are bare JPEG data; anything else carries a fragmentation header
+		return len(payload) > FRAG_HEADER_V1.size and not isWholeFrame(payload)
 	
 	def handleFragment(self, rtpPacket, payload):
 		try:
-			fragNum, numFragments, frameSize = struct.unpack('!HHH', payload[:6])
-			fragmentData = payload[6:]
-			
 			frameNumber = rtpPacket.seqNum()
-			marker = rtpPacket.getMarker()
+			timestamp = rtpPacket.timestamp()
 			
 			self.stats['fragments_received'] += 1
 			
-			if self.lastSeqNum >= 0 and frameNumber > self.lastSeqNum + 1:
-				gap = frameNumber - self.lastSeqNum - 1
-				self.seqNumGaps += gap
-				if self.seqNumGaps % 10 == 0:
-					print(f"[LOSS] Detected {gap} missing frame(s) between seq {self.lastSeqNum} and {frameNumber}")
-			self.lastSeqNum = frameNumber
-			
-			if frameNumber not in self.fragmentBuffer:
-				self.fragmentBuffer[frameNumber] = {
-					'fragments': {},
-					'total': numFragments,
-					'size': frameSize,
-					'timestamp': time.time(),
-					'received_count': 0
-				}
-			
-			if fragNum not in self.fragmentBuffer[frameNumber]['fragments']:
-				self.fragmentBuffer[frameNumber]['fragments'][fragNum] = fragmentData
-				self.fragmentBuffer[frameNumber]['received_count'] += 1
-			
-			received = self.fragmentBuffer[frameNumber]['received_count']
-			total = numFragments
-			
-			if received == total:
-				completeFrame = b''
-				for i in range(numFragments):
-					if i in self.fragmentBuffer[frameNumber]['fragments']:
-						completeFrame += self.fragmentBuffer[frameNumber]['fragments'][i]
-				
-				if len(completeFrame) >= frameSize - 16:
-					self.handleFrame(frameNumber, completeFrame)
-					del self.fragmentBuffer[frameNumber]
-				else:
-					self.stats['frames_dropped'] += 1
-					del self.fragmentBuffer[frameNumber]
+			# Loss is counted before repair: parity and retransmissions are not originals
+			flags, total = fragmentInfo(payload)
+			if not flags & FLAG_PARITY:
+				self.reception.onPacket(frameNumber, total, not flags & FLAG_RETRANSMIT)
+			
+			# Retransmitted fragments of older frames must not move the sequence forward
+			if self.lastSeqNum < 0 or isNewerSeq(frameNumber, self.lastSeqNum):
+				missingFrames = []
+				if self.lastSeqNum >= 0:
+					gap = ((frameNumber - self.lastSeqNum) & 0xFFFF) - 1
+					if gap > 0:
+						self.seqNumGaps += gap
+						if self.seqNumGaps % 10 == 0:
+							print(f"[LOSS] Detected {gap} missing frame(s) between seq {self.lastSeqNum} and {frameNumber}")
+						missingFrames = [(self.lastSeqNum + i) & 0xFFFF for i in range(1, min(gap, self.MAX_NACK_GAP) + 1)]
+					# A newer frame has started: whatever older frames still lack was lost
+					self.requestRetransmission(frameNumber, missingFrames, time.time())
+				self.lastSeqNum = frameNumber
+			
+			# Fragments are written straight into a per-frame buffer
+			corrupt = self.assembler.stats['frames_corrupt']
+			parity = self.assembler.stats['fec_received']
+			completeFrame = self.assembler.addFragment(frameNumber, payload, time.time())
+			if self.assembler.stats['fec_received'] > parity:
+				self.stats['fec_bytes'] += HEADER_SIZE + len(payload)
+			if completeFrame is not None:
+				if self.nackState.pop(frameNumber, None) is not None:
+					self.stats['frames_recovered'] += 1
+				self.handleFrame(frameNumber, completeFrame, timestamp)
+			elif self.assembler.stats['frames_corrupt'] > corrupt:
+				self.stats['frames_dropped'] += 1
 			
 			if self.stats['fragments_received'] % 100 == 0:
-				current_time = time.time()
-				timeout_frames = []
-				for fn in list(self.fragmentBuffer.keys()):
-					age = current_time - self.fragmentBuffer[fn]['timestamp']
-					if age > self.fragmentTimeout:
-						timeout_frames.append(fn)
-				
-				for fn in timeout_frames:
-					del self.fragmentBuffer[fn]
-					self.stats['frames_dropped'] += 1
+				self.stats['frames_dropped'] += self.assembler.expire(time.time())
 					
 		except Exception as e:
 			self.stats['frames_dropped'] += 1
 	
-	def handleFrame(self, frameNumber, data):
+	def requestRetransmission(self, currentFrame, missingFrames, now):
+		"""NACK missing fragments of older incomplete frames, and whole missing frames."""
+		losses = []
+		for frameNumber, frame in list(self.assembler.pending.items()):
+			if not isNewerSeq(currentFrame, frameNumber) or now - frame.timestamp > self.NACK_DEADLINE:
+				continue
+			if frame.parity is not None and frameNumber not in self.nackState:
+				# Parity arrived but too many fragments of a group were lost
+				self.stats['fec_unrecoverable'] += 1
+			if self.allowNack(frameNumber, now):
+				losses.append((frameNumber, frame.missing()))
+		for frameNumber in missingFrames:
+			if self.allowNack(frameNumber, now):
+				losses.append((frameNumber, None))
+		
+		# Forget frames that are past the deadline
+		if len(self.nackState) > 4 * self.MAX_NACK_GAP:
+			for frameNumber in [fn for fn, state in self.nackState.items() if now - state[1] > self.NACK_DEADLINE]:
+				del self.nackState[frameNumber]
+		
+		if losses:
+			self.sendNack(losses)
+	
+	def allowNack(self, frameNumber, now):
+		"""Rate-limit NACKs per frame; record one if allowed."""
+		state = self.nackState.get(frameNumber)
+		if state is None:
+			self.nackState[frameNumber] = [1, now]
+			return True
+		if state[0] >= self.MAX_NACKS_PER_FRAME or now - state[1] < self.NACK_RETRY_INTERVAL:
+			return False
+		state[0] += 1
+		state[1] = now
+		return True
+	
+	def sendNack(self, losses):
+		"""Send an RTCP NACK back to the address the RTP stream comes from."""
+		source = self.rtpReceiver.source if self.rtpReceiver is not None else None
+		if source is None:
+			return
+		try:
+			self.rtpSocket.sendto(buildNack(self.ssrc, 0, losses), source)
+		except OSError:
+			return
+		self.stats['nacks_sent'] += 1
+		self.stats['fragments_requested'] += sum(len(fragments) if fragments is not None else 1 for _, fragments in losses)
+	
+	def handleFrame(self, frameNumber, data, rtpTimestamp):
 		try:
+			arrival = time.time()
 			frame_info = {
 				'frame_num': frameNumber,
-				'data': data,
-				'timestamp': time.time()
+				'image': self.decoder.submit(data),
+				'timestamp': arrival
 			}
 			
-			self.frameBuffer.append(frame_info)
+			dropped = self.frameBuffer.push(frame_info, rtpTimestamp, arrival)
 			self.stats['frames_received'] += 1
+			if dropped is not None:
+				# Buffer full: the oldest frame will never play, like a live-edge skip
+				self.skipFrames([dropped])
+				overflow = self.frameBuffer.stats['overflow']
+				if overflow == 1 or overflow % 100 == 0:
+					print(f"[BUFFER] Full ({self.frameBuffer.capacity} frames): dropped frame {dropped['frame_num']} "
+						  f"unplayed ({overflow} so far)")
 			self.frameNbr = frameNumber
 			
 		except Exception as e:
@@ -346,89 +598,36 @@ class Client:
 	def cleanupOldCacheFiles(self, max_keep=50):
 		pass
 	
-	def displayFrames(self):
-		print("[CLIENT] Starting playback with buffering...")
-		
-		while True:
-			try:
-				if self.playEvent.isSet():
-					break
-				
-				if self.buffering:
-					if len(self.frameBuffer) >= self.bufferThreshold:
-						self.buffering = False
-						print(f"[BUFFER] Ready - {len(self.frameBuffer)} frames buffered")
-					else:
-						self.updateStatsLabel(f"Buffering: {len(self.frameBuffer)}/{self.bufferThreshold}")
-						time.sleep(0.1)
-						continue
-				
-				if len(self.frameBuffer) < 2:
-					self.buffering = True
-					print("[BUFFER] Rebuffering...")
-					continue
-				
-				if len(self.frameBuffer) > 0:
-					frame_info = self.frameBuffer.popleft()
-					
-					latency = (time.time() - frame_info['timestamp']) * 1000
-					self.stats['latency'].append(latency)
-					if len(self.stats['latency']) > 100:
-						self.stats['latency'].pop(0)
-					
-					self.updateMovie(frame_info['file'])
-					try:
-						os.remove(frame_info['file'])
-					except:
-						pass
-					self.updateStatsLabel()
-					
-					if len(self.frameBuffer) > 7:
-						delay = 0.01
-					elif len(self.frameBuffer) < 3:
-						delay = 0.1
-					else:
-						delay = 0.05
-					
-					time.sleep(delay)
-				else:
-					time.sleep(0.05)
-					
-			except Exception as e:
-				print(f"Display error: {e}")
-				time.sleep(0.1)
+	def onLabelResize(self, event):
+		"""Recompute the output size when the video label changes size."""
+		if event.width <= 1 or event.height <= 1:
+			return
+		size = (event.width, event.height)
+		if size != self.displaySize:
+			self.displaySize = size
+			# Frames decoded from now on are scaled to the new size
+			self.decoder.targetSize = size
 	
-	def updateMovie(self, jpegData):
+	def updateMovie(self, img):
+		"""Show a decoded frame (runs on the Tk thread)."""
 		try:
-			from io import BytesIO
-			
-			img = Image.open(BytesIO(jpegData))
-			orig_width, orig_height = img.size
-			
-			label_width = self.label.winfo_width()
-			label_height = self.label.winfo_height()
-			
-			if label_width <= 1:
-				label_width = self.lastLabelWidth if self.lastLabelWidth > 0 else 1280
-			if label_height <= 1:
-				label_height = self.lastLabelHeight if self.lastLabelHeight > 0 else 680
-			else:
-				self.lastLabelWidth = label_width
-				self.lastLabelHeight = label_height
-			
-			needs_scaling = orig_width > label_width or orig_height > label_height
-			
-			if needs_scaling:
-				scale = min(label_width / orig_width, label_height / orig_height)
-				
-				if scale < 1.0:
-					new_width = int(orig_width * scale)
-					new_height = int(orig_height * scale)
-					img = img.resize((new_width, new_height), Image.BILINEAR)
-			
-			photo = ImageTk.PhotoImage(img)
-			self.label.configure(image=photo)
-			self.label.image = photo
+			# Decoded before a resize: finish the scaling here
+			size = fitSize(img.size, self.displaySize)
+			if size != img.size:
+				img = img.resize(size, Image.BILINEAR)
+			
+			photo = self.photos.get(size)
+			if photo is None:
+				if len(self.photos) >= self.MAX_PHOTOS:
+					self.photos.pop(next(iter(self.photos)))
+				photo = self.photos[size] = ImageTk.PhotoImage('RGB', size)
+			photo.paste(img)
+			
+			# Only touch the label when the image object itself changes
+			if photo is not self.shownPhoto:
+				self.label.configure(image=photo)
+				self.label.image = photo
+				self.shownPhoto = photo
 			
 		except Exception as e:
 			pass
@@ -443,7 +642,11 @@ class Client:
 			
 			stats_text = (f"Frame: {self.frameNbr} | FPS: {fps:.1f} | "
 			             f"Latency: {avg_latency:.1f}ms | Buffer: {len(self.frameBuffer)} | "
+			             f"Jitter: {self.frameBuffer.jitter * 1000:.1f}ms | Delay: {self.frameBuffer.targetDelay * 1000:.0f}ms | "
+			             f"Decode: {self.decoder.avgDecodeTime * 1000:.1f}ms (queue {self.decoder.pending}) | "
 			             f"Received: {self.stats['frames_received']} | Dropped: {self.stats['frames_dropped']}")
+			if self.lowLatency:
+				stats_text += f" | Skipped: {self.stats['frames_skipped']}"
 			
 			self.statsLabel.config(text=stats_text)
 	
@@ -458,77 +661,207 @@ class Client:
 		if requestCode == self.SETUP and self.state == self.INIT:
 			threading.Thread(target=self.recvRtspReply).start()
 			self.rtspSeq += 1
-			request = f"SETUP {self.fileName} RTSP/1.0\nCSeq: {self.rtspSeq}\nTransport: RTP/UDP; client_port= {self.rtpPort}"
+			# mtu: the largest packet this client can take, so the server sizes fragments to fit
+			headers = [('Transport', f"RTP/UDP; client_port= {self.rtpPort}; mtu={self.maxPacketSize()}"),
+					   # Lets the server pick a rendition no larger than needed
+					   ('X-Display-Size', f"{self.displaySize[0]}x{self.displaySize[1]}")]
+			request = buildRequest('SETUP', self.fileName, self.rtspSeq, headers)
 			self.requestSent = self.SETUP
 			
-		elif requestCode == self.PLAY and self.state == self.READY:
+		elif requestCode == self.PLAY and (self.state == self.READY or self.seekPosition is not None):
 			self.rtspSeq += 1
-			request = f"PLAY {self.fileName} RTSP/1.0\nCSeq: {self.rtspSeq}\nSession: {self.sessionId}"
+			headers = [('Session', self.sessionId)]
+			if self.seekPosition is not None:
+				headers.append(('Range', f"npt={self.seekPosition:.3f}-"))
+				self.seekPosition = None
+				self.seekPending = True
+			request = buildRequest('PLAY', self.fileName, self.rtspSeq, headers)
 			self.requestSent = self.PLAY
 			
 		elif requestCode == self.PAUSE and self.state == self.PLAYING:
 			self.rtspSeq += 1
-			request = f"PAUSE {self.fileName} RTSP/1.0\nCSeq: {self.rtspSeq}\nSession: {self.sessionId}"
+			request = buildRequest('PAUSE', self.fileName, self.rtspSeq, [('Session', self.sessionId)])
 			self.requestSent = self.PAUSE
 			
 		elif requestCode == self.TEARDOWN and not self.state == self.INIT:
 			self.rtspSeq += 1
-			request = f"TEARDOWN {self.fileName} RTSP/1.0\nCSeq: {self.rtspSeq}\nSession: {self.sessionId}"
+			request = buildRequest('TEARDOWN', self.fileName, self.rtspSeq, [('Session', self.sessionId)])
 			self.requestSent = self.TEARDOWN
+		
+		# Never in the way of a request still waiting for its reply
+		elif requestCode == self.KEEPALIVE and not self.state == self.INIT and not self.replyPending:
+			self.rtspSeq += 1
+			request = buildRequest('GET_PARAMETER', self.fileName, self.rtspSeq, [('Session', self.sessionId)])
+			self.requestSent = self.KEEPALIVE
 		else:
 			return
 		
-		self.rtspSocket.send(request.encode())
-		print('\nData sent:\n' + request)
+		self.replyPending = True
+		self.rtspSocket.send(request)
+		print('\nData sent:\n' + request.decode())
 	
 	def recvRtspReply(self):
+		parser = RtspParser()
 		while True:
-			reply = self.rtspSocket.recv(1024)
+			# Servers from before the codec end a reply with the write: wait a moment for more before taking it as whole
+			self.rtspSocket.settimeout(LEGACY_GRACE if parser.unterminated else None)
+			try:
+				data = self.rtspSocket.recv(RECV_SIZE)
+			except socket.timeout:
+				data = None
+			except OSError:
+				break
+			if data == b'':
+				print("[CLIENT] RTSP connection closed by the server")
+				break
 			
-			if reply:
-				self.parseRtspReply(reply.decode("utf-8"))
+			try:
+				replies = parser.feed(data) if data is not None else parser.flush()
+			except RtspError as e:
+				print(f"[CLIENT] Bad RTSP reply: {e}")
+				break
+			for reply in replies:
+				self.parseRtspReply(reply)
 			
-			if self.requestSent == self.TEARDOWN:
+			if self.requestSent == self.TEARDOWN and replies:
 				self.rtspSocket.shutdown(socket.SHUT_RDWR)
 				self.rtspSocket.close()
 				break
 	
-	def parseRtspReply(self, data):
-		lines = data.split('\n')
-		seqNum = int(lines[1].split(' ')[1])
+	def parseRtspReply(self, reply):
+		"""Act on a reply (an RtspMessage) to the request last sent."""
+		try:
+			seqNum = int(reply.cseq)
+		except (TypeError, ValueError):
+			return
 		
 		if seqNum == self.rtspSeq:
-			session = int(lines[2].split(' ')[1])
+			self.replyPending = False
+			if reply.code != 200:
+				# Refused: nothing changes (a SETUP for a missing file leaves the client in INIT)
+				print(f"[RTSP] Request {seqNum} refused: {reply.code} {reply.reason}")
+				return
+			session = self.parseSession(reply.header('Session', ''))
 			
 			if self.sessionId == 0:
 				self.sessionId = session
 			
 			if self.sessionId == session:
+				self.parseRange(reply)
 				if self.requestSent == self.SETUP:
 					self.state = self.READY
+					self.parseTransport(reply)
 					self.openRtpPort()
+					if self.sessionTimeout:
+						self.master.after(int(self.sessionTimeout * 500), self.scheduleKeepalive)
 				elif self.requestSent == self.PLAY:
 					self.state = self.PLAYING
+					if self.seekPending:
+						self.seekPending = False
+						self.flushBuffers()
 				elif self.requestSent == self.PAUSE:
 					self.state = self.READY
 					self.playEvent.set()
+					self.stopListening()
 				elif self.requestSent == self.TEARDOWN:
 					self.state = self.INIT
 					self.teardownAcked = 1
 	
+	def parseSession(self, value):
+		"""Return the id of a 'Session: id[;timeout=seconds]' header value (0 if none) and note the timeout."""
+		session, params = splitParams(value)
+		if 'timeout' in params:
+			try:
+				self.sessionTimeout = float(params['timeout'])
+			except ValueError:
+				pass
+		try:
+			return int(session)
+		except ValueError:
+			return 0
+	
+	def scheduleKeepalive(self):
+		"""Keep the session alive with GET_PARAMETER at half the server's timeout (paused or not)."""
+		if self.state == self.INIT or self.teardownAcked:
+			return
+		self.sendRtspRequest(self.KEEPALIVE)
+		self.master.after(int(self.sessionTimeout * 500), self.scheduleKeepalive)
+	
+	def parseRange(self, reply):
+		"""Pick up stream duration from a 'Range: npt=start-end' reply header."""
+		value = reply.header('Range')
+		if value is None or not value.startswith('npt='):
+			return
+		start, _, end = value[4:].partition('-')
+		try:
+			start = float(start) if start.strip() else None
+			if end.strip():
+				self.duration = float(end)
+		except ValueError:
+			return
+		# Runs on the RTSP reply thread; let Tk update the slider
+		self.master.after(0, self.updateSeekScale, start)
+	
+	def parseTransport(self, reply):
+		"""Pick up the multicast group from a 'Transport: ...;multicast;destination=G;port=P' reply header."""
+		_, params = splitParams(reply.header('Transport', ''))
+		if 'multicast' in params and 'destination' in params:
+			try:
+				self.multicast = (params['destination'], int(str(params.get('port', self.rtpPort)).split('-')[0]))
+			except ValueError:
+				return
+	
+	def updateSeekScale(self, position):
+		self.seekScale.config(to=self.duration)
+		if position is not None:
+			self.seekScale.set(position)
+	
+	def flushBuffers(self):
+		"""Drop frames from before a seek so playback resumes at the new position."""
+		self.frameBuffer.clear()
+		for frame_info in self.pendingFrames:
+			frame_info['image'].cancel()
+		self.pendingFrames = []
+		self.assembler.clear()
+		self.nackState.clear()
+		self.reception.reset()
+		self.bandwidth.reset()
+		self.lastSeqNum = -1
+		self.buffering = True
+	
 	def openRtpPort(self):
 		self.rtpSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-		self.rtpSocket.settimeout(0.01)
+		self.rtpSocket.setblocking(False)
 		try:
 			self.rtpSocket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4*1024*1024)
 		except:
 			pass
 		
+		if self.multicast is not None:
+			self.joinMulticast(*self.multicast)
+			return
+		
 		try:
 			self.rtpSocket.bind(('', self.rtpPort))
 		except:
 			messagebox.showwarning('Unable to Bind', 'Unable to bind PORT=%d' % self.rtpPort)
 	
+	def joinMulticast(self, group, port):
+		"""Receive the broadcast from its multicast group (other viewers on this host may share the port)."""
+		self.rtpSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		if hasattr(socket, 'SO_REUSEPORT'):
+			try:
+				self.rtpSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+			except OSError:
+				pass
+		try:
+			self.rtpSocket.bind(('', port))
+			membership = struct.pack('4s4s', socket.inet_aton(group), socket.inet_aton('0.0.0.0'))
+			self.rtpSocket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+			print(f"[CLIENT] Joined multicast group {group}:{port}")
+		except OSError:
+			messagebox.showwarning('Unable to Join', f'Unable to join multicast group {group}:{port}')
+	
 	def handler(self):
 		self.pauseMovie()
 		if messagebox.askokcancel("Quit?", "Are you sure you want to quit?"):
@@ -548,20 +881,39 @@ class Client:
 			print("="*70)
 			print(f"Frames Received:      {self.stats['frames_received']}")
 			print(f"Frames Dropped:       {self.stats['frames_dropped']}")
+			if self.lowLatency:
+				print(f"Frames Skipped:       {self.stats['frames_skipped']} (live edge, budget {self.latencyBudget * 1000:.0f}ms; "
+					  f"{self.frameBuffer.stats['overflow']} on buffer overflow; not network loss)")
+			elif self.stats['frames_skipped']:
+				print(f"Frames Skipped:       {self.stats['frames_skipped']} (jitter buffer overflow; not network loss)")
 			print(f"Frame Loss Rate:      {loss_rate:.2f}%")
 			print(f"Seq Num Gaps:         {self.seqNumGaps} (missing frames detected)")
 			print(f"Fragments Received:   {self.stats['fragments_received']}")
+			if self.stats['packets_truncated']:
+				print(f"Packets Truncated:    {self.stats['packets_truncated']} (over the {self.packetLimit}-byte mtu advertised)")
+			print(f"NACKs Sent:           {self.stats['nacks_sent']} ({self.stats['fragments_requested']} fragments requested)")
+			print(f"Frames Recovered:     {self.stats['frames_recovered']} (completed after a NACK)")
+			if self.assembler.stats['fec_received']:
+				print(f"FEC Parity Received:  {self.assembler.stats['fec_received']} packets ({self.stats['fec_bytes']:,} bytes overhead)")
+				print(f"FEC Recovered:        {self.assembler.stats['fec_recovered']} fragments")
+				print(f"FEC Unrecoverable:    {self.stats['fec_unrecoverable']} frames (sent with parity, still incomplete)")
 			print(f"Average FPS:          {fps:.2f}")
 			print(f"Average Latency:      {avg_latency:.2f}ms")
+			print(f"Interarrival Jitter:  {self.frameBuffer.jitter * 1000:.2f}ms")
+			print(f"Playout Delay:        {self.frameBuffer.targetDelay * 1000:.1f}ms")
+			if self.bandwidth.estimate is not None:
+				print(f"Bandwidth Estimate:   {self.bandwidth.estimate / 1000:.0f} kbit/s (received {self.bandwidth.receivedRate() / 1000:.0f} kbit/s)")
+			print(f"Average Decode Time:  {self.decoder.avgDecodeTime * 1000:.2f}ms ({self.decoder.stats['drafted']} DCT-scaled, {self.decoder.stats['failed']} failed)")
+			print(f"Late Frames:          {self.frameBuffer.stats['late']} (arrived after a newer frame played)")
 			print(f"Total Bytes:          {self.stats['bytes_received']:,}")
 			print(f"Elapsed Time:         {elapsed:.1f}s")
 			print("="*70 + "\n")
 			
 			if loss_rate > 5:
 				print("[WARNING] High packet loss detected!")
-				print("  → Reduce FRAME_RATE on server")
+				print("  → Check the server's [CC] log: congestion control sheds frames to fit the path")
 				print("  → Check network conditions (latency, bandwidth, jitter)")
-				print("  → Increase MTU size on both client/server")
+				print("  → Check the server's [MTU] log: fragments over the path MTU are split into IP fragments")
 				print("  → Consider using TCP instead of UDP if possible")
 			elif loss_rate > 1:
 				print("[INFO] Minor packet loss detected. Consider optimizations.")
\ No newline at end of file
@@ -1,20 +1,23 @@
-import sys
+import sys, argparse
 from tkinter import Tk
 from Client import Client
 
 if __name__ == "__main__":
-	try:
-		serverAddr = sys.argv[1]
-		serverPort = sys.argv[2]
-		rtpPort = sys.argv[3]
-		fileName = sys.argv[4]	
-	except:
-		print("[Usage: ClientLauncher.py Server_name Server_port RTP_port Video_file]\n")	
-	
+	parser = argparse.ArgumentParser(usage="ClientLauncher.py Server_name Server_port RTP_port Video_file [--live] [--latency-budget MS]")
+	parser.add_argument('serverAddr', help="RTSP server host")
+	parser.add_argument('serverPort', help="RTSP server port")
+	parser.add_argument('rtpPort', help="local RTP port")
+	parser.add_argument('fileName', help="video file on the server")
+	parser.add_argument('--live', action='store_true',
+						help="low-latency live-edge mode: always show the newest frame, skipping stale ones")
+	parser.add_argument('--latency-budget', type=float, default=100,
+						help="live-edge latency budget in ms (default 100)")
+	args = parser.parse_args()
+
 	root = Tk()
-	
+
 	# Create a new client
-	app = Client(root, serverAddr, serverPort, rtpPort, fileName)
-	app.master.title("RTPClient")	
+	app = Client(root, args.serverAddr, args.serverPort, args.rtpPort, args.fileName,
+				 lowLatency=args.live, latencyBudget=args.latency_budget / 1000.0)
+	app.master.title("RTPClient")
 	root.mainloop()
-	
\ No newline at end of file
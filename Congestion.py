@@ -0,0 +1,309 @@
+import time
+from collections import deque
+
+RTP_CLOCK_RATE = 90000  # Video media clock (RFC 3551)
+
+# Delay-based estimation (receiver side, after GCC's trendline filter).
+# A group is one frame: the packets sharing an RTP timestamp.
+TRENDLINE_WINDOW = 20         # Groups in the delay-slope regression
+TRENDLINE_SMOOTHING = 0.9
+TRENDLINE_GAIN = 4.0
+THRESHOLD_INITIAL = 12.5      # ms
+THRESHOLD_MIN = 2.0
+THRESHOLD_MAX = 600.0
+THRESHOLD_UP = 0.0087         # Threshold adaptation speed above / below it
+THRESHOLD_DOWN = 0.039
+OVERUSE_TIME = 0.010          # Seconds the trend must stay above the threshold
+
+RATE_WINDOW = 1.0             # Seconds of arrivals behind the received rate
+DECREASE_FACTOR = 0.85        # Estimate after overuse, as a share of the received rate
+INCREASE_PER_SECOND = 0.08    # Multiplicative probing while the path is not overused
+NEAR_CAPACITY_INCREASE = 0.02 # Slower probing within CAPACITY_MARGIN of the rate that last overused it
+CAPACITY_MARGIN = 0.15
+MAX_RATE_RATIO = 1.25         # Estimate never runs further ahead of the received rate
+REPORT_DROP = 0.03            # Report a falling estimate at once when it drops this much
+
+# Send-rate control (sender side): loss-based rate of GCC, capped by the
+# receiver's delay-based estimate
+LOSS_HIGH = 0.10
+LOSS_LOW = 0.02
+LOSS_INCREASE = 1.05
+MIN_BITRATE = 100000          # bit/s floor, so bad feedback cannot starve a session
+CREDIT_WINDOW = 0.5           # Seconds of target rate a quiet period can save up
+
+def _tsDiff(a, b):
+	"""Signed difference a - b of two 32-bit RTP timestamps."""
+	diff = (a - b) & 0xFFFFFFFF
+	return diff - 0x100000000 if diff >= 0x80000000 else diff
+
+class DelayBasedEstimator:
+	"""Receiver-side bandwidth estimate from packet arrival timing (GCC-like).
+
+	For each frame the arrival of its first packet is compared with its RTP
+	timestamp: the first fragment leaves the server at the frame's media-clock
+	deadline, so a growing arrival - send offset means a queue is building at
+	the bottleneck. The offsets are smoothed and their slope over the last
+	TRENDLINE_WINDOW frames is compared with an adaptive threshold. Overuse
+	cuts the estimate to DECREASE_FACTOR of the rate actually received;
+	otherwise it probes upward by INCREASE_PER_SECOND, slowing to
+	NEAR_CAPACITY_INCREASE close to the rate at the last overuse, and never
+	more than MAX_RATE_RATIO above the received rate.
+	"""
+
+	def __init__(self, clockRate=RTP_CLOCK_RATE):
+		self.clockRate = clockRate
+		self.reset()
+
+	def reset(self):
+		self.estimate = None      # bit/s
+		self.state = 'normal'     # 'normal', 'overuse', 'hold' (after a decrease) or 'underuse'
+		self.trend = 0.0
+		self.threshold = THRESHOLD_INITIAL
+		self._arrivals = deque()  # (arrival, bytes) within RATE_WINDOW
+		self._windowBytes = 0
+		self._groupTs = None
+		self._groupArrival = None
+		self._firstArrival = None
+		self._accumulated = 0.0
+		self._smoothed = 0.0
+		self._points = deque(maxlen=TRENDLINE_WINDOW)
+		self._deltas = 0
+		self._overuseTime = None
+		self._overuseCount = 0
+		self._lastUpdate = None
+		self._lastThresholdUpdate = None
+		self._reported = None
+		self._capacity = None     # Received rate when overuse was last detected
+
+	def receivedRate(self):
+		"""Bits per second received over the last RATE_WINDOW (or since the first packet, if shorter)."""
+		if not self._arrivals:
+			return 0.0
+		span = min(RATE_WINDOW, max(RATE_WINDOW / 2, self._arrivals[-1][0] - self._firstArrival))
+		return self._windowBytes * 8 / span
+
+	def onPacket(self, rtpTimestamp, size, now):
+		"""Account one received packet (now on a monotonic clock, in seconds)."""
+		self._arrivals.append((now, size))
+		self._windowBytes += size
+		while self._arrivals and now - self._arrivals[0][0] > RATE_WINDOW:
+			self._windowBytes -= self._arrivals.popleft()[1]
+
+		if self._groupTs is None:
+			self._groupTs, self._groupArrival, self._firstArrival = rtpTimestamp, now, now
+			self._lastUpdate = now
+			return
+		sendDelta = _tsDiff(rtpTimestamp, self._groupTs)
+		if sendDelta <= 0:
+			# Same frame, a retransmission or parity of an older one
+			return
+
+		arrivalDelta = now - self._groupArrival
+		self._groupTs, self._groupArrival = rtpTimestamp, now
+		self._onDelta(arrivalDelta - sendDelta / self.clockRate, sendDelta / self.clockRate, now)
+		self._updateRate(now)
+
+	def _onDelta(self, delta, sendDelta, now):
+		"""Feed one inter-frame delay variation (seconds) to the trendline and detector."""
+		self._deltas += 1
+		self._accumulated += delta * 1000
+		self._smoothed = TRENDLINE_SMOOTHING * self._smoothed + (1 - TRENDLINE_SMOOTHING) * self._accumulated
+		self._points.append(((now - self._firstArrival) * 1000, self._smoothed))
+		if len(self._points) < TRENDLINE_WINDOW:
+			return
+
+		# Least-squares slope of smoothed delay (ms) over arrival time (ms)
+		meanX = sum(x for x, _ in self._points) / len(self._points)
+		meanY = sum(y for _, y in self._points) / len(self._points)
+		num = sum((x - meanX) * (y - meanY) for x, y in self._points)
+		den = sum((x - meanX) ** 2 for x, _ in self._points)
+		slope = num / den if den else 0.0
+		previous = self.trend
+		self.trend = min(self._deltas, 60) * slope * TRENDLINE_GAIN
+
+		if self.trend > self.threshold:
+			if self._overuseTime is None:
+				self._overuseTime = sendDelta / 2
+			else:
+				self._overuseTime += sendDelta
+			self._overuseCount += 1
+			if self._overuseTime > OVERUSE_TIME and self._overuseCount > 1 and self.trend >= previous:
+				self._overuseTime = 0.0
+				self._overuseCount = 0
+				self.state = 'overuse'
+		elif self.trend < -self.threshold:
+			self._overuseTime = None
+			self._overuseCount = 0
+			self.state = 'underuse'
+		else:
+			self._overuseTime = None
+			self._overuseCount = 0
+			self.state = 'normal'
+		self._adaptThreshold(now)
+
+	def _adaptThreshold(self, now):
+		"""Move the threshold toward |trend| so it tracks the path's normal delay noise."""
+		trend = abs(self.trend)
+		if self._lastThresholdUpdate is None:
+			self._lastThresholdUpdate = now
+		# Large spikes (e.g. a route change) must not drag the threshold along
+		if trend > self.threshold + 15.0:
+			self._lastThresholdUpdate = now
+			return
+		k = THRESHOLD_DOWN if trend < self.threshold else THRESHOLD_UP
+		elapsed = min((now - self._lastThresholdUpdate) * 1000, 100.0)
+		self.threshold = max(THRESHOLD_MIN, min(THRESHOLD_MAX, self.threshold + k * (trend - self.threshold) * elapsed))
+		self._lastThresholdUpdate = now
+
+	def _updateRate(self, now):
+		"""AIMD on the estimate, driven by the detector state."""
+		elapsed = now - self._lastUpdate
+		self._lastUpdate = now
+		received = self.receivedRate()
+		if now - self._arrivals[0][0] < RATE_WINDOW / 2 or received <= 0:
+			return
+		if self.estimate is None:
+			self.estimate = received
+			return
+
+		if self.state == 'overuse':
+			# Back off below what actually gets through, then hold until normal
+			if self.estimate > DECREASE_FACTOR * received:
+				self.estimate = DECREASE_FACTOR * received
+			self._capacity = received
+			self.state = 'hold'
+		elif self.state == 'normal':
+			if self._capacity is not None and received > (1 + CAPACITY_MARGIN) * self._capacity:
+				# The path carries more than it did: that capacity is no longer the limit
+				self._capacity = None
+			near = self._capacity is not None and self.estimate > (1 - CAPACITY_MARGIN) * self._capacity
+			rate = NEAR_CAPACITY_INCREASE if near else INCREASE_PER_SECOND
+			self.estimate *= (1 + rate) ** min(elapsed, 1.0)
+		self.estimate = min(self.estimate, MAX_RATE_RATIO * received)
+
+	def urgent(self):
+		"""True if the estimate fell by REPORT_DROP since it was last reported."""
+		return (self.estimate is not None and self._reported is not None
+				and self.estimate < (1 - REPORT_DROP) * self._reported)
+
+	def markReported(self):
+		self._reported = self.estimate
+
+class SendRateController:
+	"""Per-session send budget that sheds whole frames to stay under the path estimate.
+
+	The target bit rate is the lower of the receiver's delay-based estimate
+	(REMB) and a loss-based rate driven by receiver reports: above LOSS_HIGH
+	loss it is cut in proportion to the loss, below LOSS_LOW it grows by
+	LOSS_INCREASE per report. While there is loss at all it is also held to
+	the rate the receiver reports as delivered, which is what the
+	bottleneck actually carries (as in BBR). Frames are admitted against a credit that
+	refills at the target rate; a frame that finds no credit is skipped, so
+	the media clock is kept and the session simply sends fewer frames per
+	second. Until any feedback arrives every frame is admitted.
+	"""
+
+	def __init__(self, minBitrate=MIN_BITRATE, clock=time.monotonic):
+		self.minBitrate = minBitrate
+		self.clock = clock
+		self.delayBased = None
+		self.lossBased = None
+		self.delivered = None
+		self.lastLoss = 0.0
+		self._credit = None
+		self._lastRefill = None
+		# (time, bytes) of frames admitted within RATE_WINDOW
+		self._sent = deque()
+		self._sentBytes = 0
+		# (time, target, send rate, frames/s) after each feedback update
+		self.history = deque(maxlen=600)
+		self.stats = {
+			'frames_admitted': 0,
+			'frames_shed': 0,
+			'decreases': 0
+		}
+
+	def target(self):
+		"""Current target bit rate, or None while there is no feedback."""
+		rates = [rate for rate in (self.delayBased, self.lossBased) if rate is not None]
+		if not rates:
+			return None
+		return max(self.minBitrate, min(rates))
+
+	def sendRate(self, now=None):
+		"""Bits per second of frames admitted over the last RATE_WINDOW."""
+		if now is not None:
+			self._expire(now)
+		return self._sentBytes * 8 / RATE_WINDOW
+
+	def frameRate(self, now=None):
+		"""Frames per second admitted over the last RATE_WINDOW."""
+		if now is not None:
+			self._expire(now)
+		return len(self._sent) / RATE_WINDOW
+
+	def _expire(self, now):
+		while self._sent and now - self._sent[0][0] > RATE_WINDOW:
+			self._sentBytes -= self._sent.popleft()[1]
+
+	def onRemb(self, bitrate, now=None):
+		"""Take the receiver's delay-based estimate (bit/s)."""
+		if now is None:
+			now = self.clock()
+		if self.delayBased is not None and bitrate < self.delayBased:
+			self.stats['decreases'] += 1
+		self.delayBased = bitrate
+		self._record(now)
+
+	def onDelivered(self, bitrate):
+		"""Take the throughput the receiver measured (bit/s)."""
+		self.delivered = bitrate
+
+	def onLoss(self, fractionLost, now=None):
+		"""Update the loss-based rate from a receiver report's fraction lost (0-1)."""
+		if now is None:
+			now = self.clock()
+		self.lastLoss = fractionLost
+		sending = self.sendRate(now)
+		if self.lossBased is None:
+			if sending <= 0:
+				return
+			self.lossBased = sending
+		if fractionLost > LOSS_HIGH:
+			self.lossBased *= 1 - 0.5 * fractionLost
+			self.stats['decreases'] += 1
+		elif fractionLost < LOSS_LOW:
+			self.lossBased *= LOSS_INCREASE
+		if fractionLost >= LOSS_LOW and self.delivered:
+			self.lossBased = min(self.lossBased, self.delivered)
+		# Growth is only meaningful relative to what is actually being sent
+		if sending > 0:
+			self.lossBased = min(self.lossBased, MAX_RATE_RATIO * sending)
+		self.lossBased = max(self.minBitrate, self.lossBased)
+		self._record(now)
+
+	def _record(self, now):
+		self.history.append((now, self.target(), self.sendRate(now), self.frameRate()))
+
+	def admit(self, frameBytes, now=None):
+		"""Return True if a frame of frameBytes fits the budget now (and charge it)."""
+		if now is None:
+			now = self.clock()
+		self._expire(now)
+		target = self.target()
+		if target is not None:
+			budget = target / 8
+			if self._credit is None:
+				self._credit = budget * CREDIT_WINDOW
+			else:
+				self._credit = min(budget * CREDIT_WINDOW, self._credit + (now - self._lastRefill) * budget)
+			self._lastRefill = now
+			if self._credit <= 0:
+				self.stats['frames_shed'] += 1
+				return False
+			# A frame larger than the remaining credit still goes; the debt delays the next ones
+			self._credit -= frameBytes
+		self._sent.append((now, frameBytes))
+		self._sentBytes += frameBytes
+		self.stats['frames_admitted'] += 1
+		return True
@@ -0,0 +1,261 @@
+import struct
+from collections import deque
+
+# Version 1 fragmentation header (legacy): fragment_num (2), total_fragments (2),
+# frame_size & 0xFFFF (2). Frames over 64 KB cannot be size-checked with it.
+FRAG_HEADER_V1 = struct.Struct('!HHH')
+
+# Version 2 fragmentation header: version (1), flags (1), fragment_num (2),
+# total_fragments (2), frame_size (4), byte offset of this fragment (4)
+FRAG_HEADER_V2 = struct.Struct('!BBHHII')
+FRAG_V2 = 0x82  # High bit + version; never a v1 fragment_num high byte in practice
+
+# Version 2 flags. A parity packet carries the XOR of fragments
+# fragment_num .. fragment_num + count - 1, each zero-padded to the fragment
+# size (the parity payload length); count is stored in flags bits 1-7
+FLAG_PARITY = 0x01
+MAX_PARITY_GROUP = 0x7F
+# Set on retransmitted data fragments (never together with FLAG_PARITY)
+FLAG_RETRANSMIT = 0x02
+
+JPEG_SOI = b'\xFF\xD8'
+
+# Completed frame numbers remembered so late parity or retransmitted
+# fragments do not start a new copy of a frame that was already delivered
+COMPLETED_HISTORY = 64
+
+def fragHeaderSize(fragVersion):
+	"""Bytes of the fragmentation header of the given version."""
+	return FRAG_HEADER_V1.size if fragVersion == 1 else FRAG_HEADER_V2.size
+
+def packFragmentHeader(buf, offset, fragNum, numFragments, frameSize, fragOffset, flags=0):
+	"""Write a version 2 fragmentation header into buf at offset."""
+	FRAG_HEADER_V2.pack_into(buf, offset, FRAG_V2, flags, fragNum, numFragments, frameSize, fragOffset)
+
+def parityFlags(count):
+	"""Flags byte of a parity packet covering count fragments."""
+	return FLAG_PARITY | (count << 1)
+
+def xorParity(view, first, count, fragmentSize):
+	"""XOR of count fragments of a frame starting at fragment first, padded to fragmentSize."""
+	return _xorFragments(view, first, count, fragmentSize).to_bytes(fragmentSize, 'little')
+
+def _xorFragments(view, first, count, fragmentSize):
+	acc = 0
+	end = len(view)
+	for fragNum in range(first, first + count):
+		start = fragNum * fragmentSize
+		if start >= end:
+			break
+		# Little-endian: a short fragment is implicitly zero-padded at its end
+		acc ^= int.from_bytes(view[start:min(start + fragmentSize, end)], 'little')
+	return acc
+
+def fragmentInfo(payload):
+	"""Return (flags, total fragments) from a fragment's header (v1 fragments have no flags)."""
+	if payload[0] == FRAG_V2:
+		_, flags, _, total, _, _ = FRAG_HEADER_V2.unpack_from(payload)
+		return flags, total
+	_, total, _ = FRAG_HEADER_V1.unpack_from(payload)
+	return 0, total
+
+def isWholeFrame(payload):
+	"""True if the payload is an unfragmented JPEG frame (no fragmentation header)."""
+	return payload[:2] == JPEG_SOI
+
+class PendingFrame:
+	"""A frame being reassembled straight into its final buffer."""
+	__slots__ = ('buffer', 'view', 'bitmap', 'total', 'received', 'size', 'bytesReceived', 'timestamp', 'fragments', 'parity')
+
+	def __init__(self, total, size, timestamp, legacy=False):
+		self.total = total
+		self.size = size
+		self.received = 0
+		self.bytesReceived = 0
+		self.timestamp = timestamp
+		# first fragment -> (count, parity payload) of FEC groups received
+		self.parity = None
+		# One bit per fragment
+		self.bitmap = bytearray((total + 7) >> 3)
+		if legacy:
+			# v1 carries no offsets or full size: keep fragments until all arrive
+			self.buffer = self.view = None
+			self.fragments = [None] * total
+		else:
+			self.buffer = bytearray(size)
+			self.view = memoryview(self.buffer)
+			self.fragments = None
+
+	def has(self, fragNum):
+		return self.bitmap[fragNum >> 3] & (1 << (fragNum & 7))
+
+	def mark(self, fragNum, length):
+		self.bitmap[fragNum >> 3] |= 1 << (fragNum & 7)
+		self.received += 1
+		self.bytesReceived += length
+
+	def missing(self):
+		"""Fragment numbers not received yet."""
+		return [n for n in range(self.total) if not self.has(n)]
+
+class FrameAssembler:
+	"""Reassemble fragmented frames with one allocation per frame.
+
+	Version 2 fragments carry the full 32-bit frame size and their byte
+	offset, so each frame gets a bytearray of its real size up front and
+	every fragment is written straight to its offset through a memoryview.
+	Arrivals are tracked in a bitmap and the finished bytearray is handed
+	over as-is. Legacy version 1 fragments are still accepted.
+	"""
+
+	def __init__(self, timeout=3.0):
+		self.timeout = timeout
+		self.pending = {}
+		self.completed = set()
+		self._completedOrder = deque()
+		self.stats = {
+			'frames_completed': 0,
+			'frames_expired': 0,
+			'frames_corrupt': 0,
+			'duplicates': 0,
+			'legacy_fragments': 0,
+			'fec_received': 0,
+			'fec_recovered': 0
+		}
+
+	def addFragment(self, frameNumber, payload, now):
+		"""Store one fragment payload; return the complete frame buffer or None."""
+		if payload[0] == FRAG_V2:
+			_, flags, fragNum, total, frameSize, offset = FRAG_HEADER_V2.unpack_from(payload)
+			data = payload[FRAG_HEADER_V2.size:]
+			if flags & FLAG_PARITY:
+				return self.addParity(frameNumber, fragNum, flags >> 1, total, frameSize, data, now)
+			legacy = False
+		else:
+			fragNum, total, frameSize = FRAG_HEADER_V1.unpack_from(payload)
+			data = payload[FRAG_HEADER_V1.size:]
+			offset = 0
+			legacy = True
+			self.stats['legacy_fragments'] += 1
+
+		if fragNum >= total:
+			self.stats['frames_corrupt'] += 1
+			return None
+
+		if frameNumber in self.completed:
+			self.stats['duplicates'] += 1
+			return None
+
+		frame = self.pending.get(frameNumber)
+		if frame is None or frame.total != total or frame.size != frameSize:
+			# New frame (or the sequence number wrapped onto a stale one)
+			frame = self.pending[frameNumber] = PendingFrame(total, frameSize, now, legacy)
+
+		if frame.has(fragNum):
+			self.stats['duplicates'] += 1
+			return None
+
+		length = len(data)
+		if legacy:
+			frame.fragments[fragNum] = data
+		else:
+			if offset + length > frameSize:
+				self.stats['frames_corrupt'] += 1
+				del self.pending[frameNumber]
+				return None
+			frame.view[offset:offset + length] = data
+		frame.mark(fragNum, length)
+
+		if frame.received < frame.total:
+			if frame.parity:
+				for first in frame.parity:
+					if first <= fragNum < first + frame.parity[first][0]:
+						return self._recover(frameNumber, frame, first)
+			return None
+		return self._finish(frameNumber, frame, legacy)
+
+	def addParity(self, frameNumber, first, count, total, frameSize, data, now):
+		"""Store a parity packet; return the complete frame if it repairs the last gap."""
+		self.stats['fec_received'] += 1
+		if count == 0 or first >= total:
+			self.stats['frames_corrupt'] += 1
+			return None
+		if frameNumber in self.completed:
+			# Every fragment of the group already arrived
+			return None
+		frame = self.pending.get(frameNumber)
+		if frame is None or frame.total != total or frame.size != frameSize:
+			frame = self.pending[frameNumber] = PendingFrame(total, frameSize, now)
+		if frame.fragments is not None:
+			# Legacy frames carry no offsets to rebuild from
+			return None
+		if frame.parity is None:
+			frame.parity = {}
+		# The receive buffer is reused: keep a copy
+		frame.parity[first] = (count, bytes(data))
+		return self._recover(frameNumber, frame, first)
+
+	def _recover(self, frameNumber, frame, first):
+		"""Rebuild the fragment of a FEC group if it is the only one missing."""
+		count, parity = frame.parity[first]
+		fragmentSize = len(parity)
+		last = min(first + count, frame.total)
+		missing = None
+		for fragNum in range(first, last):
+			if not frame.has(fragNum):
+				if missing is not None:
+					return None
+				missing = fragNum
+		del frame.parity[first]
+		if missing is None:
+			return None
+
+		# Missing fragments are still zero in the frame buffer, so XOR-ing the
+		# whole group span with the parity leaves exactly the lost bytes
+		offset = missing * fragmentSize
+		length = min(fragmentSize, frame.size - offset)
+		if length <= 0:
+			self.stats['frames_corrupt'] += 1
+			return None
+		span = _xorFragments(frame.view, first, last - first, fragmentSize)
+		rebuilt = (span ^ int.from_bytes(parity, 'little')).to_bytes(fragmentSize, 'little')
+		frame.view[offset:offset + length] = rebuilt[:length]
+		frame.mark(missing, length)
+		self.stats['fec_recovered'] += 1
+
+		if frame.received < frame.total:
+			return None
+		return self._finish(frameNumber, frame, False)
+
+	def _finish(self, frameNumber, frame, legacy):
+		"""Hand over a frame whose fragments have all arrived."""
+		del self.pending[frameNumber]
+		if legacy:
+			complete = b''.join(frame.fragments)
+			ok = (len(complete) & 0xFFFF) == frame.size
+		else:
+			complete = frame.buffer
+			ok = frame.bytesReceived == frame.size
+			frame.view.release()
+		if not ok:
+			self.stats['frames_corrupt'] += 1
+			return None
+		self.stats['frames_completed'] += 1
+		self.completed.add(frameNumber)
+		self._completedOrder.append(frameNumber)
+		if len(self._completedOrder) > COMPLETED_HISTORY:
+			self.completed.discard(self._completedOrder.popleft())
+		return complete
+
+	def expire(self, now):
+		"""Drop frames older than the timeout; return how many were dropped."""
+		stale = [fn for fn, frame in self.pending.items() if now - frame.timestamp > self.timeout]
+		for fn in stale:
+			del self.pending[fn]
+		self.stats['frames_expired'] += len(stale)
+		return len(stale)
+
+	def clear(self):
+		self.pending.clear()
+		self.completed.clear()
+		self._completedOrder.clear()
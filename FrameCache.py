@@ -0,0 +1,118 @@
+import threading
+from collections import OrderedDict
+
+DEFAULT_BUDGET = 256 * 1024 * 1024  # 256 MB of frame data per process
+
+class FrameCache:
+	"""Process-wide LRU cache of frame bytes keyed by (file, frame number).
+
+	Every VideoStream reads through the shared instance, so sessions playing
+	the same file share one copy of each hot frame and concurrent misses on
+	the same frame trigger a single disk read.
+	"""
+
+	_shared = None
+	_sharedLock = threading.Lock()
+
+	def __init__(self, budget=DEFAULT_BUDGET):
+		self.budget = budget
+		self.bytes = 0
+		self._frames = OrderedDict()
+		self._loading = {}
+		self._lock = threading.Lock()
+		self.stats = {
+			'hits': 0,
+			'misses': 0,
+			'evictions': 0,
+			'evicted_bytes': 0
+		}
+
+	@classmethod
+	def shared(cls):
+		"""Return the process-wide cache, creating it on first use."""
+		with cls._sharedLock:
+			if cls._shared is None:
+				cls._shared = cls()
+			return cls._shared
+
+	def get(self, key, loader):
+		"""Return the frame for key, calling loader() once on a miss."""
+		with self._lock:
+			data = self._frames.get(key)
+			if data is not None:
+				self._frames.move_to_end(key)
+				self.stats['hits'] += 1
+				return data
+
+			pending = self._loading.get(key)
+			if pending is None:
+				pending = self._loading[key] = threading.Event()
+				owner = True
+				self.stats['misses'] += 1
+			else:
+				owner = False
+				self.stats['hits'] += 1
+
+		if not owner:
+			# Another session is already reading this frame from disk
+			pending.wait()
+			with self._lock:
+				data = self._frames.get(key)
+			if data is not None:
+				return data
+			return loader()
+
+		try:
+			data = loader()
+			if data is not None:
+				self.put(key, data)
+			return data
+		finally:
+			with self._lock:
+				del self._loading[key]
+			pending.set()
+
+	def put(self, key, data):
+		"""Insert a frame and evict least recently used frames over budget."""
+		size = len(data)
+		if size > self.budget:
+			return
+		with self._lock:
+			old = self._frames.pop(key, None)
+			if old is not None:
+				self.bytes -= len(old)
+			self._frames[key] = data
+			self.bytes += size
+			while self.bytes > self.budget:
+				_, evicted = self._frames.popitem(last=False)
+				self.bytes -= len(evicted)
+				self.stats['evictions'] += 1
+				self.stats['evicted_bytes'] += len(evicted)
+
+	def resize(self, budget):
+		"""Change the byte budget, evicting immediately if it shrank."""
+		with self._lock:
+			self.budget = budget
+			while self.bytes > self.budget and self._frames:
+				_, evicted = self._frames.popitem(last=False)
+				self.bytes -= len(evicted)
+				self.stats['evictions'] += 1
+				self.stats['evicted_bytes'] += len(evicted)
+
+	def snapshot(self):
+		"""Return a copy of the counters plus current occupancy."""
+		with self._lock:
+			snap = dict(self.stats)
+			snap['frames'] = len(self._frames)
+			snap['bytes'] = self.bytes
+			snap['budget'] = self.budget
+		lookups = snap['hits'] + snap['misses']
+		snap['hit_rate'] = snap['hits'] / lookups if lookups else 0.0
+		return snap
+
+	def summary(self):
+		"""One-line human readable cache report."""
+		snap = self.snapshot()
+		return (f"[CACHE] {snap['frames']} frames, {snap['bytes'] / 1048576:.1f}/{snap['budget'] / 1048576:.0f} MB | "
+				f"hits {snap['hits']} misses {snap['misses']} ({snap['hit_rate'] * 100:.1f}%) | "
+				f"evictions {snap['evictions']}")
@@ -0,0 +1,78 @@
+import threading, time
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+# PIL releases the GIL while decoding, so a few threads decode in parallel
+DECODE_WORKERS = 2
+
+class FrameDecoder:
+	"""Decode and scale JPEG frames on a thread pool, away from the Tk main loop.
+
+	submit() returns a Future of the decoded PIL image, already scaled to
+	fit targetSize. When the frame is larger than the target, Image.draft
+	lets libjpeg decode at 1/2, 1/4 or 1/8 scale in the DCT domain, so only
+	the small remainder is done by a resize. PhotoImages must still be
+	created on the Tk thread.
+	"""
+
+	def __init__(self, workers=DECODE_WORKERS):
+		self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='decode')
+		# (width, height) to fit frames into; set from the UI thread
+		self.targetSize = None
+		self.avgDecodeTime = 0.0
+		self._lock = threading.Lock()
+		self.pending = 0
+		self.stats = {
+			'decoded': 0,
+			'failed': 0,
+			'drafted': 0
+		}
+
+	def submit(self, jpegData):
+		"""Queue a frame for decoding; return a Future of the PIL image."""
+		with self._lock:
+			self.pending += 1
+		future = self.pool.submit(self._decode, jpegData, self.targetSize)
+		# Also runs for frames cancelled before their decode started
+		future.add_done_callback(self._done)
+		return future
+
+	def _done(self, future):
+		with self._lock:
+			self.pending -= 1
+
+	def _decode(self, jpegData, targetSize):
+		start = time.perf_counter()
+		try:
+			img = Image.open(BytesIO(jpegData))
+			if targetSize is not None:
+				size = fitSize(img.size, targetSize)
+				if size != img.size:
+					# DCT-domain downscale to the smallest power of two >= size
+					if img.draft('RGB', size) is not None:
+						self.stats['drafted'] += 1
+					if img.size != size:
+						img = img.resize(size, Image.BILINEAR)
+			img.load()
+			self.stats['decoded'] += 1
+			return img
+		except Exception:
+			self.stats['failed'] += 1
+			raise
+		finally:
+			elapsed = time.perf_counter() - start
+			with self._lock:
+				self.avgDecodeTime += (elapsed - self.avgDecodeTime) / 16.0
+
+	def close(self):
+		self.pool.shutdown(wait=False, cancel_futures=True)
+
+def fitSize(size, bounds):
+	"""Largest size with the aspect ratio of size that fits in bounds (never upscaled)."""
+	width, height = size
+	maxWidth, maxHeight = bounds
+	if width <= maxWidth and height <= maxHeight:
+		return size
+	scale = min(maxWidth / width, maxHeight / height)
+	return max(1, int(width * scale)), max(1, int(height * scale))
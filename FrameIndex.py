@@ -0,0 +1,293 @@
+import os, sys, mmap, re, struct, threading
+from array import array
+
+INDEX_EXT = '.idx'
+INDEX_MAGIC = b'MJIX'
+INDEX_VERSION = 1
+
+# magic, version, format, has_timestamps, mtime_ns, file size, frame count
+INDEX_HEADER = struct.Struct('<4sHBBqqI')
+
+FORMAT_HEADER = 'header'  # 10-byte ASCII length before every frame
+FORMAT_RAW = 'raw'        # Pure concatenated JPEG stream
+FORMAT_CODES = {FORMAT_HEADER: 0, FORMAT_RAW: 1}
+
+HEADER_LEN = 10
+
+SOI = b'\xFF\xD8'
+
+# Markers that stand alone without a 2-byte length field (TEM, RSTn, SOI, EOI)
+STANDALONE_MARKERS = frozenset([0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8, 0xD9])
+
+# Inside entropy-coded data FF is stuffed as FF00 and RSTn/fill bytes are not
+# segment boundaries, so the first FF followed by anything else is a real marker
+ECS_MARKER = re.compile(rb'\xFF[^\x00\xD0-\xD7\xFF]')
+
+def findJpegFrame(buf, pos=0):
+	"""Return (start, end) of the next complete JPEG image at or after pos, or None.
+
+	Walks the marker segments by their length fields and skips entropy-coded
+	data with a regex search, so FF D9 bytes inside APPn payloads (e.g. EXIF
+	thumbnails) or scan data never end a frame early.
+	"""
+	size = len(buf)
+	start = buf.find(SOI, pos)
+	if start < 0:
+		return None
+	pos = start + 2
+
+	while pos + 1 < size:
+		if buf[pos] != 0xFF:
+			# Corrupt segment layout: resync on the next real marker
+			m = ECS_MARKER.search(buf, pos)
+			if m is None:
+				return None
+			pos = m.start()
+			continue
+
+		marker = buf[pos + 1]
+		if marker == 0xFF:  # Fill byte before a marker
+			pos += 1
+		elif marker == 0xD9:  # EOI
+			return start, pos + 2
+		elif marker == 0xD8:  # SOI before EOI: previous frame was truncated
+			start = pos
+			pos += 2
+		elif marker in STANDALONE_MARKERS:
+			pos += 2
+		else:
+			if pos + 4 > size:
+				return None
+			length = (buf[pos + 2] << 8) | buf[pos + 3]
+			pos += 2 + length
+			if marker == 0xDA:  # SOS: entropy-coded data runs until the next marker
+				m = ECS_MARKER.search(buf, pos)
+				if m is None:
+					return None
+				pos = m.start()
+
+	return None
+
+def detectFormat(head):
+	"""Detect if data starting with head uses 10-byte headers or a raw JPEG stream."""
+	if not head:
+		return FORMAT_RAW
+
+	# Check if starts with JPEG marker (FFD8)
+	if head.startswith(SOI):
+		print("[FORMAT] Detected raw JPEG stream format")
+		return FORMAT_RAW
+
+	# Check if starts with ASCII digits (10-byte header)
+	if head[0:1].isdigit() or head[0:1] in b' ':
+		try:
+			int(head[:HEADER_LEN].decode('utf-8').strip())
+			print("[FORMAT] Detected 10-byte header format")
+			return FORMAT_HEADER
+		except:
+			pass
+
+	# Default to raw JPEG if unsure
+	print("[FORMAT] Defaulting to raw JPEG format")
+	return FORMAT_RAW
+
+def parseFrameLength(header):
+	"""Parse a 10-byte ASCII length header, or return None if unreadable."""
+	try:
+		return int(header.decode('utf-8').strip())
+	except (ValueError, UnicodeDecodeError):
+		# Fallback: extract first contiguous digit sequence
+		m = re.search(rb"(\d+)", header)
+		if not m:
+			return None
+		return int(m.group(1))
+
+class FrameIndex:
+	"""Frame number -> (offset, length, timestamp) table for one media file.
+
+	Built once per file and persisted next to it as a sidecar
+	(<file>.idx). The sidecar records the file's mtime and size and is
+	rebuilt automatically when either changes.
+	"""
+
+	# In-process cache so sessions opening the same file share one index.
+	# _lock only guards the dicts; each path has its own lock for the
+	# sidecar read or scan, so one slow file never blocks the others
+	_loaded = {}
+	_lock = threading.Lock()
+	_pathLocks = {}
+
+	def __init__(self, filename, formatType, offsets, lengths, timestamps=None, mtime=0, size=0):
+		self.filename = filename
+		self.formatType = formatType
+		self.offsets = offsets
+		self.lengths = lengths
+		self.timestamps = timestamps
+		self.mtime = mtime
+		self.size = size
+
+	def __len__(self):
+		return len(self.offsets)
+
+	@property
+	def key(self):
+		"""Identity of the indexed file contents, used to key cached frames."""
+		return (self.filename, self.mtime, self.size)
+
+	def frame(self, n):
+		"""Return (offset, length, timestamp) of zero-based frame n."""
+		timestamp = self.timestamps[n] if self.timestamps is not None else None
+		return self.offsets[n], self.lengths[n], timestamp
+
+	def matches(self, st):
+		"""Return True if the index was built for the file state in st (os.stat result)."""
+		return self.mtime == st.st_mtime_ns and self.size == st.st_size
+
+	@classmethod
+	def load(cls, filename):
+		"""Return a valid index for filename, from memory, the sidecar, or a fresh scan."""
+		path = os.path.realpath(filename)
+		st = os.stat(path)
+
+		with cls._lock:
+			index = cls._loaded.get(path)
+			if index is not None and index.matches(st):
+				return index
+			pathLock = cls._pathLocks.setdefault(path, threading.Lock())
+
+		with pathLock:
+			# Another session may have loaded it while this one waited
+			with cls._lock:
+				index = cls._loaded.get(path)
+			if index is not None and index.matches(st):
+				return index
+
+			index = cls.readSidecar(path, st)
+			if index is None:
+				index = cls.build(path, st)
+				index.writeSidecar()
+			with cls._lock:
+				cls._loaded[path] = index
+			return index
+
+	@classmethod
+	def build(cls, filename, st=None):
+		"""Scan filename and build its index."""
+		if st is None:
+			st = os.stat(filename)
+		offsets = array('Q')
+		lengths = array('I')
+
+		with open(filename, 'rb') as f:
+			if st.st_size == 0:
+				return cls(filename, FORMAT_RAW, offsets, lengths, mtime=st.st_mtime_ns, size=0)
+			with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+				formatType = detectFormat(buf[:20])
+				if formatType == FORMAT_HEADER:
+					cls._scanHeadered(buf, offsets, lengths)
+				else:
+					cls._scanRaw(buf, offsets, lengths)
+
+		print(f"[INDEX] Indexed {len(offsets)} frames in {filename}")
+		return cls(filename, formatType, offsets, lengths, mtime=st.st_mtime_ns, size=st.st_size)
+
+	@staticmethod
+	def _scanHeadered(buf, offsets, lengths):
+		"""Hop from length header to length header without touching frame data."""
+		size = len(buf)
+		pos = 0
+		while pos + HEADER_LEN <= size:
+			framelength = parseFrameLength(buf[pos:pos + HEADER_LEN])
+			if framelength is None:
+				print(f"[ERROR] Cannot parse frame length from header at offset {pos}")
+				break
+			start = pos + HEADER_LEN
+			if start + framelength > size:
+				print(f"[ERROR] Expected {framelength} bytes, got {size - start}")
+				break
+			offsets.append(start)
+			lengths.append(framelength)
+			pos = start + framelength
+
+	@staticmethod
+	def _scanRaw(buf, offsets, lengths):
+		"""Collect SOI/EOI bounds of every complete JPEG in the stream."""
+		pos = 0
+		while True:
+			bounds = findJpegFrame(buf, pos)
+			if bounds is None:
+				break
+			start, pos = bounds
+			offsets.append(start)
+			lengths.append(pos - start)
+
+	@staticmethod
+	def sidecarPath(filename):
+		return filename + INDEX_EXT
+
+	@classmethod
+	def readSidecar(cls, filename, st):
+		"""Load the sidecar for filename, or return None if missing, corrupt or stale."""
+		try:
+			with open(cls.sidecarPath(filename), 'rb') as f:
+				data = f.read()
+		except OSError:
+			return None
+
+		try:
+			magic, version, formatCode, hasTimestamps, mtime, size, count = INDEX_HEADER.unpack_from(data)
+		except struct.error:
+			return None
+		if magic != INDEX_MAGIC or version != INDEX_VERSION:
+			return None
+		if mtime != st.st_mtime_ns or size != st.st_size:
+			return None
+
+		offsets = array('Q')
+		lengths = array('I')
+		timestamps = array('d') if hasTimestamps else None
+		pos = INDEX_HEADER.size
+		try:
+			for arr in (offsets, lengths, timestamps):
+				if arr is None:
+					continue
+				end = pos + count * arr.itemsize
+				arr.frombytes(data[pos:end])
+				pos = end
+		except ValueError:
+			return None
+		if len(offsets) != count or len(lengths) != count:
+			return None
+
+		if sys.byteorder == 'big':
+			for arr in (offsets, lengths, timestamps):
+				if arr is not None:
+					arr.byteswap()
+
+		formatType = FORMAT_HEADER if formatCode == FORMAT_CODES[FORMAT_HEADER] else FORMAT_RAW
+		return cls(filename, formatType, offsets, lengths, timestamps, mtime, size)
+
+	def writeSidecar(self):
+		"""Persist the index atomically; a read-only media directory is not an error."""
+		path = self.sidecarPath(self.filename)
+		tmp = f"{path}.{os.getpid()}.tmp"
+		arrays = [self.offsets, self.lengths]
+		if self.timestamps is not None:
+			arrays.append(self.timestamps)
+
+		try:
+			with open(tmp, 'wb') as f:
+				f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, FORMAT_CODES[self.formatType],
+					self.timestamps is not None, self.mtime, self.size, len(self.offsets)))
+				for arr in arrays:
+					if sys.byteorder == 'big':
+						arr = array(arr.typecode, arr)
+						arr.byteswap()
+					f.write(arr.tobytes())
+			os.replace(tmp, path)
+		except OSError as e:
+			print(f"[INDEX] Could not save {path}: {e}")
+			try:
+				os.remove(tmp)
+			except OSError:
+				pass
@@ -0,0 +1,187 @@
+"""Prebuilt fragment payloads ("hint track") for an MJPEG file.
+
+Usage: python HintTrack.py media.mjpeg [--mtu N] [--frag-version 1|2]
+
+Writes <file>.<mtu>.v<frag version>.hint next to the media file. Sessions
+whose payload size and header version match a current sidecar send from
+it; all others fragment each frame as it is sent.
+"""
+import os, sys, mmap, struct, argparse, threading, time
+from array import array
+from collections import OrderedDict
+
+from FrameIndex import FrameIndex
+from Fragmentation import FRAG_HEADER_V1, fragHeaderSize, packFragmentHeader
+
+HINT_EXT = '.hint'
+HINT_MAGIC = b'MJHT'
+HINT_VERSION = 1
+
+# magic, version, fragmentation header version, pad, media mtime_ns, media size,
+# fragment payload size (MTU), frame count
+HINT_HEADER = struct.Struct('<4sHBxqqII')
+
+# Mapped tracks kept open per process, and how long a missing sidecar is
+# remembered before looking for it again
+MAX_LOADED = 64
+RECHECK_INTERVAL = 30.0
+
+def hintSize(frameSize, mtu, fragVersion):
+	"""Bytes of a frame's hint: every fragment's header plus the frame itself."""
+	return frameSize + (frameSize + mtu - 1) // mtu * fragHeaderSize(fragVersion)
+
+def buildHint(data, mtu, fragVersion=2):
+	"""Fragment header + payload of every fragment of a frame, back to back.
+
+	Fragment i starts at i * (header size + mtu), so the packets of a frame
+	are fixed-stride slices of the result and only need an RTP header.
+	"""
+	frameSize = len(data)
+	numFragments = (frameSize + mtu - 1) // mtu
+	headerSize = fragHeaderSize(fragVersion)
+	blob = bytearray(hintSize(frameSize, mtu, fragVersion))
+	view = memoryview(data)
+	pos = 0
+	for fragNum in range(numFragments):
+		offset = fragNum * mtu
+		length = min(mtu, frameSize - offset)
+		if fragVersion == 1:
+			FRAG_HEADER_V1.pack_into(blob, pos, fragNum, numFragments, frameSize & 0xFFFF)
+		else:
+			packFragmentHeader(blob, pos, fragNum, numFragments, frameSize, offset)
+		blob[pos + headerSize:pos + headerSize + length] = view[offset:offset + length]
+		pos += headerSize + length
+	return bytes(blob)
+
+class HintTrack:
+	"""Per-frame prebuilt fragment payloads of one media file for one MTU.
+
+	Only exists as the memory-mapped <file>.<mtu>.v<version>.hint sidecar
+	(so sessions share the page cache), and only while it matches the
+	file's mtime and size. Building hints in memory would cost more than
+	fragmenting on the fly, which sends slices of the frame without copying.
+	"""
+
+	# (file identity, mtu, frag version) -> (track or None, when checked),
+	# least recently used first
+	_loaded = OrderedDict()
+	_lock = threading.Lock()
+
+	def __init__(self, index, mtu, fragVersion, offsets, blobs):
+		self.index = index
+		self.mtu = mtu
+		self.fragVersion = fragVersion
+		self.stride = fragHeaderSize(fragVersion) + mtu
+		self.offsets = offsets
+		self.blobs = blobs
+
+	@staticmethod
+	def sidecarPath(filename, mtu, fragVersion):
+		return f"{filename}.{mtu}.v{fragVersion}{HINT_EXT}"
+
+	@classmethod
+	def load(cls, index, mtu, fragVersion):
+		"""Return the shared hint track of an indexed file, or None without a current sidecar."""
+		key = (index.key, mtu, fragVersion)
+		now = time.monotonic()
+		with cls._lock:
+			entry = cls._loaded.get(key)
+			if entry is not None and (entry[0] is not None or now - entry[1] < RECHECK_INTERVAL):
+				cls._loaded.move_to_end(key)
+				return entry[0]
+			# Tracks of an earlier version of the file are never asked for again
+			for stale in [k for k in cls._loaded if k[0][0] == index.filename and k[0] != index.key]:
+				del cls._loaded[stale]
+			track = cls.readSidecar(index, mtu, fragVersion)
+			cls._loaded[key] = (track, now)
+			while len(cls._loaded) > MAX_LOADED:
+				cls._loaded.popitem(last=False)
+			return track
+
+	@classmethod
+	def readSidecar(cls, index, mtu, fragVersion):
+		"""Map the sidecar, or return None if it is missing or stale."""
+		path = cls.sidecarPath(index.filename, mtu, fragVersion)
+		try:
+			f = open(path, 'rb')
+		except OSError:
+			return None
+		with f:
+			try:
+				blobs = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+			except ValueError:
+				return None
+		try:
+			magic, version, hintFragVersion, mtime, size, hintMtu, count = HINT_HEADER.unpack_from(blobs)
+		except struct.error:
+			blobs.close()
+			return None
+		if (magic != HINT_MAGIC or version != HINT_VERSION or hintFragVersion != fragVersion
+				or mtime != index.mtime or size != index.size or hintMtu != mtu or count != len(index)):
+			blobs.close()
+			return None
+		offsets = array('Q')
+		try:
+			offsets.frombytes(blobs[HINT_HEADER.size:HINT_HEADER.size + (count + 1) * offsets.itemsize])
+		except ValueError:
+			blobs.close()
+			return None
+		if sys.byteorder == 'big':
+			offsets.byteswap()
+		if len(offsets) != count + 1 or offsets[count] > len(blobs):
+			# Truncated write
+			blobs.close()
+			return None
+		print(f"[HINT] Using {path}")
+		return cls(index, mtu, fragVersion, offsets, blobs)
+
+	def frame(self, n):
+		"""Hint of zero-based frame n."""
+		return memoryview(self.blobs)[self.offsets[n]:self.offsets[n + 1]]
+
+	@classmethod
+	def write(cls, filename, mtu, fragVersion=2):
+		"""Build the sidecar for filename (offline)."""
+		index = FrameIndex.load(filename)
+		count = len(index)
+		offsets = array('Q', [0] * (count + 1))
+		pos = HINT_HEADER.size + (count + 1) * offsets.itemsize
+		for n in range(count):
+			offsets[n] = pos
+			pos += hintSize(index.lengths[n], mtu, fragVersion)
+		offsets[count] = pos
+
+		path = cls.sidecarPath(index.filename, mtu, fragVersion)
+		tmp = f"{path}.{os.getpid()}.tmp"
+		with open(index.filename, 'rb') as media, open(tmp, 'wb') as out:
+			out.write(HINT_HEADER.pack(HINT_MAGIC, HINT_VERSION, fragVersion, index.mtime, index.size, mtu, count))
+			table = offsets
+			if sys.byteorder == 'big':
+				table = array('Q', offsets)
+				table.byteswap()
+			out.write(table.tobytes())
+			with mmap.mmap(media.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+				for n in range(count):
+					offset, length, _ = index.frame(n)
+					out.write(buildHint(buf[offset:offset + length], mtu, fragVersion))
+		os.replace(tmp, path)
+		print(f"[HINT] Wrote {path}: {count} frames, {pos / 1048576:.1f} MB")
+		return path
+
+def main():
+	from ServerWorker import ServerWorker
+	from PathMtu import ETHERNET_MTU, payloadSize
+	parser = argparse.ArgumentParser(usage="HintTrack.py media_file [--mtu N] [--frag-version 1|2]")
+	parser.add_argument('filename', help="MJPEG file to build the hint track of")
+	parser.add_argument('--mtu', type=int, default=None,
+						help="fragment payload size (default: the server's for a 1500-byte path MTU)")
+	parser.add_argument('--frag-version', type=int, choices=[1, 2], default=ServerWorker.FRAG_VERSION,
+						help="fragmentation header version (default the server's)")
+	args = parser.parse_args()
+	mtu = args.mtu
+	if mtu is None:
+		mtu = payloadSize(ETHERNET_MTU, args.frag_version) if ServerWorker.PATH_MTU else ServerWorker.MTU
+	HintTrack.write(args.filename, mtu, args.frag_version)
+
+if __name__ == "__main__":
+	main()
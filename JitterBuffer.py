@@ -0,0 +1,147 @@
+import heapq, threading
+
+RTP_CLOCK_RATE = 90000  # Video media clock (RFC 3551)
+
+# A jump this large between media time and arrival time is a seek or a
+# restarted stream rather than network jitter: re-anchor the playout clock
+RESYNC_THRESHOLD = 1.0
+
+class JitterBuffer:
+	"""Hold received frames until their presentation time.
+
+	Each frame's RTP timestamp is mapped to the local clock through an
+	anchor (the smallest arrival - media time offset seen, i.e. the fastest
+	transit) plus a target delay. The target delay follows the RFC 3550
+	interarrival jitter estimate: it grows quickly when jitter rises and
+	shrinks slowly when the network calms down, so playback stays smooth at
+	the source rate with as little added latency as the path allows.
+	"""
+
+	def __init__(self, clockRate=RTP_CLOCK_RATE, capacity=100, minDelay=0.010, maxDelay=0.500, jitterFactor=3.0):
+		self.clockRate = clockRate
+		self.capacity = capacity
+		self.minDelay = minDelay
+		self.maxDelay = maxDelay
+		self.jitterFactor = jitterFactor
+
+		self.jitter = 0.0  # Interarrival jitter in seconds
+		self.targetDelay = minDelay
+		self._lock = threading.Lock()
+		self._heap = []
+		self._counter = 0
+		self._reset()
+		self.stats = {
+			'late': 0,
+			'overflow': 0,
+			'resyncs': 0
+		}
+
+	def _reset(self):
+		self._anchor = None
+		self._lastRaw = None
+		self._lastExt = 0
+		self._lastMedia = None
+		self._lastArrival = None
+		self._lastPlayed = None
+
+	def _unwrap(self, timestamp):
+		"""Extend a 32-bit RTP timestamp across wraparounds."""
+		if self._lastRaw is None:
+			ext = timestamp
+		else:
+			diff = (timestamp - self._lastRaw) & 0xFFFFFFFF
+			if diff >= 0x80000000:
+				diff -= 0x100000000
+			ext = self._lastExt + diff
+		self._lastRaw = timestamp
+		self._lastExt = ext
+		return ext
+
+	def push(self, frameInfo, timestamp, arrival):
+		"""Queue a frame with its RTP timestamp and local arrival time.
+
+		Returns the frameInfo of the oldest frame if the buffer was full and
+		dropped it to make room (the caller accounts for it), else None.
+		"""
+		with self._lock:
+			media = self._unwrap(timestamp) / self.clockRate
+
+			if self._lastMedia is not None:
+				# RFC 3550 A.8: D = (Rj - Ri) - (Sj - Si), J += (|D| - J) / 16
+				transit = (arrival - self._lastArrival) - (media - self._lastMedia)
+				if abs(transit) > RESYNC_THRESHOLD:
+					self._heap.clear()
+					self._anchor = None
+					self._lastPlayed = None
+					self.stats['resyncs'] += 1
+				else:
+					self.jitter += (abs(transit) - self.jitter) / 16.0
+			self._lastMedia = media
+			self._lastArrival = arrival
+
+			offset = arrival - media
+			if self._anchor is None or offset < self._anchor:
+				self._anchor = offset
+			elif offset > self._anchor + self.maxDelay:
+				# Frames keep arriving later than the anchor allows (clock drift)
+				self._anchor = offset
+
+			self._counter += 1
+			heapq.heappush(self._heap, (media, self._counter, frameInfo))
+			dropped = None
+			if len(self._heap) > self.capacity:
+				dropped = heapq.heappop(self._heap)[2]
+				self.stats['overflow'] += 1
+			self._adapt()
+			return dropped
+
+	def _adapt(self):
+		target = min(self.maxDelay, max(self.minDelay, self.jitterFactor * self.jitter))
+		# Grow quickly to absorb bursts, shrink slowly to avoid stutter
+		rate = 0.5 if target > self.targetDelay else 0.02
+		self.targetDelay += (target - self.targetDelay) * rate
+
+	def _playoutTime(self, media):
+		return self._anchor + media + self.targetDelay
+
+	def pop(self, now):
+		"""Return the next frame if its presentation time has come, else None."""
+		with self._lock:
+			while self._heap:
+				media, _, frameInfo = self._heap[0]
+				if self._lastPlayed is not None and media <= self._lastPlayed:
+					# Completed after a newer frame was shown
+					heapq.heappop(self._heap)
+					self.stats['late'] += 1
+					continue
+				if self._playoutTime(media) > now:
+					return None
+				heapq.heappop(self._heap)
+				self._lastPlayed = media
+				return frameInfo
+			return None
+
+	def popAll(self, now):
+		"""Return every frame whose presentation time has come, oldest first."""
+		frames = []
+		frameInfo = self.pop(now)
+		while frameInfo is not None:
+			frames.append(frameInfo)
+			frameInfo = self.pop(now)
+		return frames
+
+	def nextDue(self, now):
+		"""Seconds until the next frame is due (0 if overdue), or None if empty."""
+		with self._lock:
+			if not self._heap:
+				return None
+			return max(0.0, self._playoutTime(self._heap[0][0]) - now)
+
+	def clear(self):
+		"""Drop all frames and re-anchor on the next one (e.g. after a seek)."""
+		with self._lock:
+			self._heap.clear()
+			self._reset()
+
+	def __len__(self):
+		return len(self._heap)
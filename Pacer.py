@@ -0,0 +1,108 @@
+import time
+
+# Up to this many frames behind schedule the pacer sends back-to-back to catch
+# up; further behind it skips frames so the stream stays on the media clock
+MAX_CATCHUP_FRAMES = 3
+
+class FramePacer:
+	"""Release frames on absolute deadlines instead of sleeping a fixed interval.
+
+	Deadline n is start + n * interval on a monotonic clock, so the time spent
+	reading, packetizing and sending a frame never accumulates into drift.
+	When a frame goes out late the following ones are sent straight away until
+	the schedule is met again; beyond MAX_CATCHUP_FRAMES behind, the frames
+	whose deadlines have passed are dropped instead.
+	"""
+
+	def __init__(self, interval, maxCatchup=MAX_CATCHUP_FRAMES, clock=time.monotonic):
+		self.interval = interval
+		self.maxCatchup = maxCatchup
+		self.clock = clock
+		self.start()
+
+	def start(self, now=None):
+		"""(Re)start the schedule with the first frame due now."""
+		if now is None:
+			now = self.clock()
+		self.startTime = now
+		self.deadline = now
+		self.stats = {
+			'frames': 0,
+			'dropped': 0,
+			'catchups': 0,
+			'error_total': 0.0,
+			'error_max': 0.0
+		}
+
+	def setInterval(self, interval):
+		"""Change the frame interval from the next deadline on."""
+		self.interval = interval
+
+	def next(self, now=None):
+		"""Account for a frame about to be sent; return how many frames to drop first."""
+		if now is None:
+			now = self.clock()
+		lateness = now - self.deadline
+		error = abs(lateness)
+		self.stats['error_total'] += error
+		if error > self.stats['error_max']:
+			self.stats['error_max'] = error
+
+		drop = 0
+		behind = int(lateness / self.interval) if lateness > 0 else 0
+		if behind > self.maxCatchup:
+			drop = behind
+			self.stats['dropped'] += drop
+		elif behind > 0:
+			self.stats['catchups'] += 1
+		self.stats['frames'] += 1
+		self.deadline += (drop + 1) * self.interval
+		return drop
+
+	def wait(self, event=None):
+		"""Sleep until the next deadline (or until event is set); return frames to drop."""
+		delay = self.deadline - self.clock()
+		if delay > 0:
+			if event is not None:
+				if event.wait(delay):
+					return 0
+			else:
+				time.sleep(delay)
+		return self.next()
+
+	def achievedFps(self, now=None):
+		"""Frames actually sent per second since start()."""
+		if now is None:
+			now = self.clock()
+		elapsed = now - self.startTime
+		return self.stats['frames'] / elapsed if elapsed > 0 else 0.0
+
+	def meanError(self):
+		"""Average distance in seconds between a frame's deadline and its send time."""
+		return self.stats['error_total'] / self.stats['frames'] if self.stats['frames'] else 0.0
+
+	def summary(self):
+		return (f"[PACER] {self.achievedFps():.2f} fps (target {1.0 / self.interval:.2f}) | "
+				f"error avg {self.meanError() * 1000:.2f} ms max {self.stats['error_max'] * 1000:.2f} ms | "
+				f"dropped {self.stats['dropped']} | catch-ups {self.stats['catchups']}")
+
+class TokenBucket:
+	"""Byte budget that refills at rate bytes/s and holds at most burst bytes."""
+
+	def __init__(self, rate, burst, clock=time.monotonic):
+		self.rate = rate
+		self.burst = burst
+		self.clock = clock
+		self.tokens = burst
+		self.last = clock()
+
+	def delay(self, nbytes, now=None):
+		"""Take nbytes from the bucket; return seconds to wait before sending them."""
+		if now is None:
+			now = self.clock()
+		self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+		self.last = now
+		self.tokens -= nbytes
+		if self.tokens >= 0:
+			return 0.0
+		return -self.tokens / self.rate
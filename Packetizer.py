@@ -0,0 +1,72 @@
+import socket
+
+from RtpPacket import RtpPacket, HEADER_SIZE
+from Fragmentation import FRAG_HEADER_V1, FRAG_HEADER_V2, packFragmentHeader
+from PathMtu import setDontFragment
+
+RTP_PT_MJPEG = 26
+RTP_CLOCK_RATE = 90000  # Video media clock (RFC 3551)
+
+def makeRtpHeader(frameNbr, marker, timestamp):
+	"""Build only the 12-byte RTP header for a packet of this frame."""
+	header = bytearray(HEADER_SIZE)
+	RtpPacket.packHeader(header, 0, frameNbr, marker, RTP_PT_MJPEG, 0, timestamp)
+	return header
+
+def buildFragments(data, frameNumber, timestamp, mtu, fragVersion=2, fragments=None, flags=0):
+	"""Packetize a frame (or only the given fragment numbers) as (header, payload) buffer pairs.
+
+	Fragments carry mtu bytes of the frame each, behind an RTP header and a
+	fragmentation header of the given version.
+	"""
+	frameSize = len(data)
+	numFragments = (frameSize + mtu - 1) // mtu
+	if fragments is None:
+		fragments = range(numFragments)
+	# Fragments are memoryview slices: no copy of the frame data
+	view = memoryview(data)
+	# RTP + fragmentation headers of all fragments share one buffer
+	legacy = fragVersion == 1
+	stride = HEADER_SIZE + (FRAG_HEADER_V1.size if legacy else FRAG_HEADER_V2.size)
+	headers = bytearray(stride * len(fragments))
+	headerView = memoryview(headers)
+	packets = []
+
+	for i, fragNum in enumerate(fragments):
+		# Calculate fragment boundaries
+		offset = fragNum * mtu
+		fragmentSize = min(mtu, frameSize - offset)
+
+		# Marker bit = 1 only for last fragment
+		marker = 1 if (fragNum == numFragments - 1) else 0
+
+		pos = i * stride
+		RtpPacket.packHeader(headers, pos, frameNumber, marker, RTP_PT_MJPEG, 0, timestamp)
+		if legacy:
+			FRAG_HEADER_V1.pack_into(headers, pos + HEADER_SIZE,
+				fragNum,
+				numFragments,
+				frameSize & 0xFFFF  # Use lower 16 bits
+			)
+		else:
+			packFragmentHeader(headers, pos + HEADER_SIZE, fragNum, numFragments, frameSize, offset, flags)
+
+		# Headers and data are gathered by the kernel
+		packets.append((headerView[pos:pos + stride], view[offset:offset + fragmentSize]))
+	return packets
+
+def openRtpSocket(dontFragment=False):
+	"""Create an RTP/UDP socket for sending video; dontFragment for fragments sized to the path MTU."""
+	rtpSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+	# Increase buffer sizes for high-speed HD streaming
+	rtpSocket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 16*1024*1024)  # 16MB send buffer for 360 FPS
+	# Fragments are sized to the path: never let the kernel split one
+	if dontFragment:
+		setDontFragment(rtpSocket)
+	# Enable QoS (Quality of Service) for prioritized video delivery
+	try:
+		rtpSocket.setsockopt(socket.IPPROTO_IP, socket.IP_TOS, 0x88)
+	except:
+		pass
+	return rtpSocket
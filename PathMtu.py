@@ -0,0 +1,101 @@
+import socket, sys, threading
+
+from RtpPacket import HEADER_SIZE
+from Fragmentation import fragHeaderSize
+from Rtcp import buildMtuProbe
+
+IP_HEADER = 20   # IPv4 without options
+UDP_HEADER = 8
+
+ETHERNET_MTU = 1500
+MAX_MTU = 9000   # Jumbo frames; loopback reports 65536
+MIN_MTU = 576    # Every IPv4 host must accept this
+
+# Candidate probe sizes below the route MTU: Ethernet, PPPoE, typical
+# tunnels (IPsec, GRE, WireGuard) and the IPv6 minimum link MTU
+PROBE_SIZES = (ETHERNET_MTU, 1492, 1420, 1400, 1280)
+PROBE_TIMEOUT = 0.3
+
+# Linux values, for Python builds whose socket module lacks the names
+IP_MTU_DISCOVER = getattr(socket, 'IP_MTU_DISCOVER', 10)
+IP_PMTUDISC_DO = getattr(socket, 'IP_PMTUDISC_DO', 2)
+IP_MTU = getattr(socket, 'IP_MTU', 14)
+
+def canDiscover():
+	"""True where the kernel exposes the path MTU and a per-socket don't-fragment bit (Linux)."""
+	return sys.platform.startswith('linux')
+
+def payloadSize(mtu, fragVersion):
+	"""Fragment payload bytes so that a whole fragment packet fits in one IP packet of mtu bytes."""
+	return mtu - IP_HEADER - UDP_HEADER - HEADER_SIZE - fragHeaderSize(fragVersion)
+
+def setDontFragment(sock):
+	"""Set DF on a UDP socket's packets so oversized ones fail instead of being IP-fragmented."""
+	if not canDiscover():
+		return False
+	try:
+		sock.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_DO)
+	except OSError:
+		return False
+	return True
+
+def routeMtu(address):
+	"""MTU of the route to address (host, port) as the kernel knows it, or None if unknown."""
+	if not canDiscover():
+		return None
+	sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	try:
+		setDontFragment(sock)
+		sock.connect(address)
+		return sock.getsockopt(socket.IPPROTO_IP, IP_MTU)
+	except OSError:
+		return None
+	finally:
+		sock.close()
+
+def chooseMtu(route, clientLimit=None):
+	"""Return (MTU to use without probing, largest size worth probing).
+
+	route is the local route MTU (None if unknown) and clientLimit the
+	largest packet the client advertised. Without a limit from the client,
+	and beyond the first hop, nothing larger than Ethernet is assumed to
+	get through; a probe may go up to the smaller of the two.
+	"""
+	limit = min(route or ETHERNET_MTU, clientLimit or ETHERNET_MTU, MAX_MTU)
+	limit = max(limit, MIN_MTU)
+	return min(limit, ETHERNET_MTU), limit
+
+class MtuProbe:
+	"""Find the largest packet that reaches a client by sending one DF probe per candidate size.
+
+	Probes are RTCP APP packets padded to the candidate size; the client
+	echoes each one it receives. Sizes above the local route MTU fail to
+	send and sizes above a smaller MTU further along the path are dropped
+	there, so the largest echo is the path MTU (RFC 8899 style, without
+	relying on ICMP).
+	"""
+
+	def __init__(self, limit):
+		self.sizes = sorted({size for size in PROBE_SIZES + (limit,) if size <= limit}, reverse=True)
+		self.largest = None
+		self.sent = 0
+		self.done = threading.Event()
+
+	def send(self, sock, address):
+		"""Send the probes largest first."""
+		for size in self.sizes:
+			try:
+				sock.sendto(buildMtuProbe(0, size, size - IP_HEADER - UDP_HEADER), address)
+				self.sent += 1
+			except OSError:
+				# EMSGSIZE: over the local route MTU
+				pass
+
+	def onEcho(self, size):
+		"""Note an echoed probe; the largest one getting through ends the probe early."""
+		if size not in self.sizes or self.done.is_set():
+			return
+		if self.largest is None or size > self.largest:
+			self.largest = size
+		if size == self.sizes[0]:
+			self.done.set()
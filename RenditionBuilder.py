@@ -0,0 +1,124 @@
+"""Build lower-resolution renditions of an MJPEG file for adaptive serving.
+
+Usage: python RenditionBuilder.py media.mjpeg [--ladder 1280x720:80,640x360:70,320x180:60] [--workers N]
+
+Frames are decoded once and re-encoded at every rung by a process pool,
+written next to the source as raw JPEG streams (<name>.<W>x<H>.mjpeg) with
+their frame indexes, and described in <name>.mjpeg.ladder for the server.
+"""
+import os, sys, argparse
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+from FrameIndex import FrameIndex
+from FrameDecoder import fitSize
+from Renditions import Ladder, renditionPath
+
+DEFAULT_LADDER = '1920x1080:85,1280x720:80,854x480:75,640x360:70,320x180:60'
+CHUNK_FRAMES = 32  # Frames per pool task
+
+def parseLadder(spec):
+	"""Parse 'WxH:quality,...' into [(width, height, quality)]."""
+	rungs = []
+	for item in spec.split(','):
+		size, _, quality = item.strip().partition(':')
+		width, _, height = size.partition('x')
+		rungs.append((int(width), int(height), int(quality or 75)))
+	return rungs
+
+def encodeChunk(filename, frames, sizes):
+	"""Re-encode frames [(offset, length)] at every (width, height, quality); return one list per size."""
+	out = [[] for _ in sizes]
+	largest = max(sizes, key=lambda size: size[0] * size[1])[:2]
+	with open(filename, 'rb') as f:
+		for offset, length in frames:
+			f.seek(offset)
+			img = Image.open(BytesIO(f.read(length)))
+			# DCT-domain downscale to just above the largest rung
+			img.draft('RGB', largest)
+			img = img.convert('RGB')
+			for i, (width, height, quality) in enumerate(sizes):
+				scaled = img if img.size == (width, height) else img.resize((width, height), Image.LANCZOS)
+				buf = BytesIO()
+				scaled.save(buf, 'JPEG', quality=quality, optimize=True)
+				out[i].append(buf.getvalue())
+	return out
+
+def build(filename, rungs, workers=None):
+	"""Write the renditions of filename smaller than the source and its ladder sidecar."""
+	st = os.stat(filename)
+	index = FrameIndex.load(filename)
+	if len(index) == 0:
+		raise ValueError(f"{filename} has no frames")
+	offset, length, _ = index.frame(0)
+	with open(filename, 'rb') as f:
+		f.seek(offset)
+		sourceSize = Image.open(BytesIO(f.read(length))).size
+
+	# Only rungs below the source; each keeps the source aspect ratio
+	sizes = []
+	for width, height, quality in rungs:
+		size = fitSize(sourceSize, (width, height))
+		if size != sourceSize and size not in [s[:2] for s in sizes]:
+			sizes.append(size + (quality,))
+	if not sizes:
+		print(f"[LADDER] {filename} is already {sourceSize[0]}x{sourceSize[1]}: nothing to build")
+		return None
+
+	paths = [renditionPath(filename, width, height) for width, height, _ in sizes]
+	tmps = [f"{path}.{os.getpid()}.tmp" for path in paths]
+	outputs = [open(tmp, 'wb') for tmp in tmps]
+	written = [0] * len(sizes)
+	frames = [(index.offsets[n], index.lengths[n]) for n in range(len(index))]
+	chunks = [frames[i:i + CHUNK_FRAMES] for i in range(0, len(frames), CHUNK_FRAMES)]
+	try:
+		with ProcessPoolExecutor(max_workers=workers) as pool:
+			done = 0
+			# map() yields in submission order, so frames stay in sequence
+			for result in pool.map(encodeChunk, [filename] * len(chunks), chunks, [sizes] * len(chunks)):
+				for i, encoded in enumerate(result):
+					for data in encoded:
+						outputs[i].write(data)
+						written[i] += len(data)
+				done += CHUNK_FRAMES
+				print(f"\r[LADDER] {min(done, len(frames))}/{len(frames)} frames", end='', flush=True)
+		print()
+	finally:
+		for output in outputs:
+			output.close()
+	for tmp, path in zip(tmps, paths):
+		os.replace(tmp, path)
+
+	renditions = [{'file': os.path.abspath(filename), 'width': sourceSize[0], 'height': sourceSize[1],
+				   'quality': None, 'frames': len(index), 'bytes': sum(index.lengths)}]
+	for (width, height, quality), path, size in zip(sizes, paths, written):
+		# Builds and persists the rendition's own frame index
+		count = len(FrameIndex.load(path))
+		if count != len(index):
+			raise ValueError(f"{path} has {count} frames, expected {len(index)}")
+		renditions.append({'file': os.path.abspath(path), 'width': width, 'height': height,
+						   'quality': quality, 'frames': count, 'bytes': size})
+		print(f"[LADDER] {width}x{height} q{quality}: {size / 1048576:.1f} MB "
+			  f"({size / renditions[0]['bytes'] * 100:.1f}% of the source)")
+
+	ladder = Ladder(os.path.abspath(filename), sorted(renditions, key=lambda entry: entry['bytes']))
+	ladder.write(st, len(index))
+	return ladder
+
+def main():
+	parser = argparse.ArgumentParser(usage="RenditionBuilder.py media_file [--ladder WxH:Q,...] [--workers N]")
+	parser.add_argument('filename', help="MJPEG file to build renditions of")
+	parser.add_argument('--ladder', default=DEFAULT_LADDER,
+						help=f"rendition sizes and JPEG qualities (default {DEFAULT_LADDER})")
+	parser.add_argument('--workers', type=int, default=None,
+						help="encoder processes (default: one per CPU)")
+	args = parser.parse_args()
+	try:
+		rungs = parseLadder(args.ladder)
+	except ValueError:
+		parser.error("--ladder must look like 1280x720:80,640x360:70")
+	build(args.filename, rungs, args.workers)
+
+if __name__ == "__main__":
+	main()
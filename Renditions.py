@@ -0,0 +1,239 @@
+import os, json
+
+from VideoStream import VideoStream
+
+LADDER_EXT = '.ladder'
+LADDER_VERSION = 1
+
+# Selection: a rendition is chosen if its bit rate fits this share of the
+# bandwidth estimate; stepping up needs UP_RATIO of headroom over the current
+# one and is retried after UP_HOLD seconds (doubled after each failed step up,
+# i.e. one followed by a step down within PROBE_WINDOW)
+HEADROOM = 0.85
+UP_RATIO = 1.3
+UP_HOLD = 5.0
+UP_HOLD_MAX = 60.0
+PROBE_WINDOW = 5.0
+
+def renditionPath(filename, width, height):
+	"""Path of the width x height rendition of filename, next to it."""
+	stem, ext = os.path.splitext(filename)
+	return f"{stem}.{width}x{height}{ext or '.mjpeg'}"
+
+class Ladder:
+	"""Renditions of one media file, lowest bit rate first.
+
+	Described by a JSON sidecar (<file>.ladder) written by RenditionBuilder.
+	Every rendition has the same frames as the source, so a session can
+	switch between them at any frame boundary. The sidecar records the
+	source's mtime and size and is ignored once the source changes.
+	"""
+
+	def __init__(self, filename, renditions):
+		self.filename = filename
+		# [{'file', 'width', 'height', 'quality', 'frames', 'bytes'}]
+		self.renditions = renditions
+
+	def __len__(self):
+		return len(self.renditions)
+
+	def __getitem__(self, i):
+		return self.renditions[i]
+
+	@staticmethod
+	def sidecarPath(filename):
+		return filename + LADDER_EXT
+
+	@classmethod
+	def load(cls, filename):
+		"""Return the ladder of filename, or None if it has none (or it is stale)."""
+		path = cls.sidecarPath(filename)
+		try:
+			with open(path) as f:
+				manifest = json.load(f)
+			st = os.stat(filename)
+		except (OSError, ValueError):
+			return None
+		source = manifest.get('source', {})
+		if manifest.get('version') != LADDER_VERSION or source.get('mtime_ns') != st.st_mtime_ns \
+				or source.get('size') != st.st_size:
+			print(f"[LADDER] Ignoring stale {path}")
+			return None
+
+		directory = os.path.dirname(filename)
+		renditions = []
+		for entry in manifest.get('renditions', []):
+			entry = dict(entry)
+			entry['file'] = os.path.join(directory, entry['file'])
+			if entry['frames'] != source.get('frames') or not os.path.exists(entry['file']):
+				print(f"[LADDER] Skipping {entry['file']}: missing or not frame-aligned with the source")
+				continue
+			renditions.append(entry)
+		if len(renditions) < 2:
+			return None
+		renditions.sort(key=lambda entry: entry['bytes'])
+		return cls(filename, renditions)
+
+	def write(self, st, frames):
+		"""Write the sidecar for a source in state st (os.stat result) with frames frames."""
+		directory = os.path.dirname(self.filename)
+		manifest = {
+			'version': LADDER_VERSION,
+			'source': {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'frames': frames},
+			'renditions': [dict(entry, file=os.path.relpath(entry['file'], directory or '.'))
+				for entry in self.renditions]
+		}
+		path = self.sidecarPath(self.filename)
+		tmp = f"{path}.{os.getpid()}.tmp"
+		with open(tmp, 'w') as f:
+			json.dump(manifest, f, indent=1)
+		os.replace(tmp, path)
+
+	def bitrate(self, i, fps):
+		"""Average bit rate of rendition i at fps frames per second."""
+		entry = self.renditions[i]
+		return entry['bytes'] * 8 / entry['frames'] * fps if entry['frames'] else 0.0
+
+	def fitDisplay(self, width, height):
+		"""Index of the smallest rendition that covers a width x height display (or the largest)."""
+		for i, entry in enumerate(self.renditions):
+			if entry['width'] >= width or entry['height'] >= height:
+				return i
+		return len(self.renditions) - 1
+
+class RenditionStream:
+	"""VideoStream over a ladder: reads each frame from the selected rendition.
+
+	The frame position is shared, so select() takes effect at the next frame
+	read. Streams of the renditions are opened on first use.
+	"""
+
+	def __init__(self, ladder, fps=None):
+		self.ladder = ladder
+		self.filename = ladder.filename
+		self.fps = fps
+		self.streams = [None] * len(ladder)
+		self.rendition = len(ladder) - 1
+		# Timing and position come from the source file's index
+		self.source = self._stream(self._sourceIndex())
+		self.fps = self.source.fps
+
+	def _sourceIndex(self):
+		source = os.path.realpath(self.ladder.filename)
+		for i, entry in enumerate(self.ladder.renditions):
+			if os.path.realpath(entry['file']) == source:
+				return i
+		return len(self.ladder) - 1
+
+	def _stream(self, i):
+		if self.streams[i] is None:
+			self.streams[i] = VideoStream(self.ladder[i]['file'], self.fps)
+		return self.streams[i]
+
+	def openAll(self):
+		"""Open every rendition now instead of at its first use (e.g. off an event loop)."""
+		for i in range(len(self.ladder)):
+			self._stream(i)
+
+	def select(self, i):
+		"""Read frames from rendition i from the next frame on."""
+		self._stream(i)
+		self.rendition = i
+
+	def current(self):
+		"""Ladder entry of the selected rendition."""
+		return self.ladder[self.rendition]
+
+	def nextFrame(self):
+		if self.source.frameNum >= self.source.frameCount():
+			return None
+		data = self.readFrame(self.source.frameNum)
+		self.source.frameNum += 1
+		return data
+
+	def readFrame(self, n):
+		"""Read zero-based frame n from the selected rendition."""
+		return self._stream(self.rendition).readFrame(n)
+
+	def hintTrack(self, mtu, fragVersion):
+		"""Hint track of the selected rendition, or None."""
+		return self._stream(self.rendition).hintTrack(mtu, fragVersion)
+
+	def seek(self, n):
+		self.source.seek(n)
+
+	def seekTime(self, seconds):
+		return self.source.seekTime(seconds)
+
+	def frameTime(self, n):
+		return self.source.frameTime(n)
+
+	def currentTime(self):
+		return self.source.currentTime()
+
+	def frameCount(self):
+		return self.source.frameCount()
+
+	def duration(self):
+		return self.source.duration()
+
+	def frameNbr(self):
+		return self.source.frameNbr()
+
+	def close(self):
+		for stream in self.streams:
+			if stream is not None:
+				stream.close()
+		self.streams = [None] * len(self.ladder)
+
+class RenditionSelector:
+	"""Pick a session's rendition from its display size and bandwidth estimate.
+
+	The display size caps the ladder at the smallest rendition that covers
+	it. Within that, a bit rate above the estimate steps down at once to the
+	best rendition that fits HEADROOM of it; stepping up is one rung at a
+	time, after UP_HOLD seconds with UP_RATIO of headroom. Congestion
+	control only grows its estimate slightly past what is being sent, so a
+	step up doubles as the probe: if it is followed by a step down within
+	PROBE_WINDOW, the next attempt waits twice as long.
+	"""
+
+	def __init__(self, ladder, cap=None):
+		self.ladder = ladder
+		self.cap = len(ladder) - 1 if cap is None else cap
+		self.current = self.cap
+		self.upHold = UP_HOLD
+		self._lastChange = None
+		self._lastUp = None
+
+	def choose(self, target, fps, now):
+		"""Return the rendition index for the next frame; target is bit/s or None."""
+		if self._lastChange is None:
+			self._lastChange = now
+		if target is None:
+			return self.current
+
+		ladder = self.ladder
+		if self.current > 0 and ladder.bitrate(self.current, fps) > target:
+			best = 0
+			for i in range(self.current - 1, -1, -1):
+				if ladder.bitrate(i, fps) <= target * HEADROOM:
+					best = i
+					break
+			if self._lastUp is not None and now - self._lastUp < PROBE_WINDOW:
+				self.upHold = min(UP_HOLD_MAX, self.upHold * 2)
+			self._lastUp = None
+			self._switch(best, now)
+		elif self.current < self.cap and now - self._lastChange >= self.upHold \
+				and target >= ladder.bitrate(self.current, fps) * UP_RATIO:
+			self._lastUp = now
+			self._switch(self.current + 1, now)
+		elif self._lastUp is not None and now - self._lastUp >= PROBE_WINDOW:
+			# The step up held: later ones need not wait longer
+			self._lastUp = None
+			self.upHold = UP_HOLD
+		return self.current
+
+	def _switch(self, i, now):
+		self.current = i
+		self._lastChange = now
@@ -0,0 +1,106 @@
+import threading
+from collections import OrderedDict
+
+RING_FRAMES = 64              # Recent frames kept per session (~2 s at 30 fps)
+RING_BYTES = 8 * 1024 * 1024
+RETRANSMIT_DEADLINE = 0.5     # Seconds after the original send; later copies would miss playout
+MAX_RETRIES = 2               # Resends of any one fragment
+RETRANSMIT_SHARE = 0.2        # Resent bytes may use up to this share of the bytes sent
+RETRANSMIT_BURST = 512 * 1024
+
+class SentFrame:
+	__slots__ = ('data', 'timestamp', 'sentAt', 'retries', 'fec')
+
+	def __init__(self, data, timestamp, sentAt, fec=False):
+		self.data = data
+		self.timestamp = timestamp
+		self.sentAt = sentAt
+		self.retries = {}
+		# Sent with parity: a NACK means FEC could not repair it
+		self.fec = fec
+
+class RetransmitRing:
+	"""Recently sent frames of one session, used to answer NACKs.
+
+	Frames are kept by reference (they come from the shared frame cache),
+	bounded by RING_FRAMES and RING_BYTES. A request is refused when the
+	frame is gone or older than the deadline, when a fragment has already
+	been resent MAX_RETRIES times, or when the retransmission budget is
+	spent. That budget grows by RETRANSMIT_SHARE of every frame sent, so
+	NACK storms cannot take more than a fixed share of the stream's bandwidth.
+	"""
+
+	def __init__(self, capacity=RING_FRAMES, maxBytes=RING_BYTES, deadline=RETRANSMIT_DEADLINE,
+				 maxRetries=MAX_RETRIES, share=RETRANSMIT_SHARE, burst=RETRANSMIT_BURST):
+		self.capacity = capacity
+		self.maxBytes = maxBytes
+		self.deadline = deadline
+		self.maxRetries = maxRetries
+		self.share = share
+		self.burst = burst
+		self.frames = OrderedDict()
+		self.bytes = 0
+		self.credit = burst
+		self._lock = threading.Lock()
+		self.stats = {
+			'nack_fragments': 0,
+			'resent_fragments': 0,
+			'expired': 0,
+			'limited': 0,
+			'fec_unrecoverable': 0
+		}
+
+	def add(self, frameNumber, data, timestamp, now, fec=False):
+		"""Remember a frame that has just been sent."""
+		with self._lock:
+			old = self.frames.pop(frameNumber, None)
+			if old is not None:
+				self.bytes -= len(old.data)
+			self.frames[frameNumber] = SentFrame(data, timestamp, now, fec)
+			self.bytes += len(data)
+			self.credit = min(self.burst, self.credit + len(data) * self.share)
+			while len(self.frames) > self.capacity or (self.bytes > self.maxBytes and len(self.frames) > 1):
+				_, frame = self.frames.popitem(last=False)
+				self.bytes -= len(frame.data)
+
+	def request(self, frameNumber, fragments, fragmentSize, now):
+		"""Return (data, timestamp, fragments to resend) for a NACK, or None if refused.
+
+		fragments is None for a whole lost frame; a frame that fits in one
+		packet is treated as the single fragment 0.
+		"""
+		with self._lock:
+			frame = self.frames.get(frameNumber)
+			if frame is None or now - frame.sentAt > self.deadline:
+				self.stats['expired'] += len(fragments) if fragments is not None else 1
+				return None
+
+			if frame.fec:
+				self.stats['fec_unrecoverable'] += 1
+				frame.fec = False
+			numFragments = (len(frame.data) + fragmentSize - 1) // fragmentSize
+			if fragments is None:
+				fragments = range(numFragments)
+			self.stats['nack_fragments'] += len(fragments)
+
+			resend = []
+			for fragNum in fragments:
+				if fragNum >= numFragments:
+					continue
+				retries = frame.retries.get(fragNum, 0)
+				if retries >= self.maxRetries or self.credit < fragmentSize:
+					self.stats['limited'] += 1
+					continue
+				frame.retries[fragNum] = retries + 1
+				self.credit -= fragmentSize
+				resend.append(fragNum)
+
+			if not resend:
+				return None
+			self.stats['resent_fragments'] += len(resend)
+			return frame.data, frame.timestamp, resend
+
+	def clear(self):
+		with self._lock:
+			self.frames.clear()
+			self.bytes = 0
@@ -0,0 +1,313 @@
+import struct, time
+
+# Common RTCP header: V(2) P(1) count/FMT(5), packet type, length in 32-bit words minus one
+RTCP_HEADER = struct.Struct('!BBH')
+
+PT_SR = 200
+PT_RR = 201
+PT_APP = 204
+PT_RTPFB = 205  # Transport-layer feedback (RFC 4585)
+PT_PSFB = 206   # Payload-specific feedback (RFC 4585)
+FMT_NACK = 1
+FMT_AFB = 15    # Application layer feedback
+
+NTP_EPOCH_OFFSET = 2208988800  # Seconds from 1900 (NTP) to 1970 (Unix)
+
+# Sender report: SSRC, NTP timestamp (seconds, fraction), RTP timestamp,
+# sender's packet count, sender's octet count
+SENDER_INFO = struct.Struct('!IIIIII')
+
+# Report block: source SSRC, fraction lost (8) + cumulative lost (24),
+# extended highest sequence number, interarrival jitter (RTP timestamp
+# units), last SR (middle 32 bits of its NTP time), delay since last SR (1/65536 s)
+REPORT_BLOCK = struct.Struct('!IIIIII')
+
+# Application-defined receiver quality report: SSRC, name, frames buffered
+# for playout, playout delay (ms), octets received (mod 2^32)
+APP_QOS = struct.Struct('!I4sHHI')
+APP_QOS_NAME = b'QOSR'
+
+# Sender notice of frames left out on purpose (congestion control or
+# pacing): SSRC, name, first skipped frame number, number of frames
+APP_SKIP = struct.Struct('!I4sHH')
+APP_SKIP_NAME = b'SKIP'
+
+# Path MTU probe: SSRC, name, size of the IP packet that carried the probe.
+# The sender pads probes to that size; the receiver echoes each one unpadded
+APP_MTU = struct.Struct('!I4sH2x')
+APP_MTU_NAME = b'PMTU'
+
+# Receiver estimated maximum bitrate (draft-alvestrand-rmcat-remb) after the
+# feedback header: 'REMB', SSRC count (8), exponent (6) + mantissa (18)
+REMB = struct.Struct('!4sBBH')
+REMB_NAME = b'REMB'
+
+# Feedback header after the common header: sender SSRC, media source SSRC
+FEEDBACK_SSRC = struct.Struct('!II')
+
+# This stream reuses the RTP sequence number as the frame number, so the
+# generic NACK's PID/BLP is addressed per fragment instead: frame number,
+# first lost fragment, bitmask of lost fragments among the following 16
+NACK_ENTRY = struct.Struct('!HHH2x')
+NACK_MASK_BITS = 16
+FRAG_ALL = 0xFFFF  # First-fragment value meaning "the whole frame"
+
+def isRtcp(data):
+	"""True if a datagram is RTCP rather than RTP (RFC 5761 demultiplexing)."""
+	return len(data) >= RTCP_HEADER.size and 192 <= data[1] <= 223
+
+def ntpTime(now=None):
+	"""Current wall-clock time as a 64-bit NTP timestamp (seconds, fraction)."""
+	if now is None:
+		now = time.time()
+	seconds = int(now)
+	return (seconds + NTP_EPOCH_OFFSET) & 0xFFFFFFFF, int((now - seconds) * 0x100000000) & 0xFFFFFFFF
+
+def ntpMiddle(seconds, fraction):
+	"""Middle 32 bits of an NTP timestamp, as used by LSR and for RTT."""
+	return ((seconds & 0xFFFF) << 16) | (fraction >> 16)
+
+def _packet(pt, count, body):
+	"""Prefix body (a multiple of 4 bytes) with an RTCP header."""
+	return RTCP_HEADER.pack(0x80 | count, pt, len(body) // 4) + body
+
+def buildSenderReport(ssrc, rtpTimestamp, packets, octets, now=None):
+	"""SR without report blocks (the server receives no RTP)."""
+	seconds, fraction = ntpTime(now)
+	return _packet(PT_SR, 0, SENDER_INFO.pack(ssrc, seconds, fraction, rtpTimestamp & 0xFFFFFFFF,
+		packets & 0xFFFFFFFF, octets & 0xFFFFFFFF))
+
+def parseSenderReport(body):
+	"""Return (ssrc, NTP middle 32 bits, RTP timestamp, packets, octets) of an SR."""
+	ssrc, seconds, fraction, rtpTimestamp, packets, octets = SENDER_INFO.unpack_from(body)
+	return ssrc, ntpMiddle(seconds, fraction), rtpTimestamp, packets, octets
+
+def buildReceiverReport(ssrc, mediaSsrc, fractionLost, cumulativeLost, highestSeq, jitter, lsr, dlsr):
+	"""RR with one report block about mediaSsrc."""
+	lost = (fractionLost & 0xFF) << 24 | (cumulativeLost & 0xFFFFFF)
+	return _packet(PT_RR, 1, struct.pack('!I', ssrc) + REPORT_BLOCK.pack(mediaSsrc, lost,
+		highestSeq & 0xFFFFFFFF, int(jitter) & 0xFFFFFFFF, lsr, dlsr))
+
+def parseReceiverReport(body, count):
+	"""Return [(fraction lost 0-1, cumulative lost, highest seq, jitter, LSR, DLSR)] of an RR."""
+	blocks = []
+	for i in range(count):
+		pos = 4 + i * REPORT_BLOCK.size
+		if pos + REPORT_BLOCK.size > len(body):
+			break
+		_, lost, highestSeq, jitter, lsr, dlsr = REPORT_BLOCK.unpack_from(body, pos)
+		cumulative = lost & 0xFFFFFF
+		if cumulative & 0x800000:
+			cumulative -= 0x1000000  # Signed: duplicates can make it negative
+		blocks.append(((lost >> 24) / 256.0, cumulative, highestSeq, jitter, lsr, dlsr))
+	return blocks
+
+def buildQosReport(ssrc, bufferFrames, playoutDelayMs, octets):
+	"""APP packet with the receiver's playout buffer state and bytes received."""
+	return _packet(PT_APP, 0, APP_QOS.pack(ssrc, APP_QOS_NAME, min(bufferFrames, 0xFFFF),
+		min(int(playoutDelayMs), 0xFFFF), octets & 0xFFFFFFFF))
+
+def parseQosReport(body):
+	"""Return (frames buffered, playout delay ms, octets received), or None for other APP packets."""
+	if len(body) < APP_QOS.size:
+		return None
+	_, name, bufferFrames, playoutDelayMs, octets = APP_QOS.unpack_from(body)
+	if name != APP_QOS_NAME:
+		return None
+	return bufferFrames, playoutDelayMs, octets
+
+def buildSkipNotice(ssrc, firstFrame, count):
+	"""APP packet telling the receiver that count frames from firstFrame were not sent."""
+	return _packet(PT_APP, 0, APP_SKIP.pack(ssrc, APP_SKIP_NAME, firstFrame & 0xFFFF, min(count, 0xFFFF)))
+
+def parseSkipNotice(body):
+	"""Return (first skipped frame number, count), or None for other APP packets."""
+	if len(body) < APP_SKIP.size:
+		return None
+	_, name, firstFrame, count = APP_SKIP.unpack_from(body)
+	if name != APP_SKIP_NAME:
+		return None
+	return firstFrame, count
+
+def buildMtuProbe(ssrc, probeSize, length=None):
+	"""APP packet naming a probe size, zero-padded to length bytes (a multiple of 4) if given."""
+	body = APP_MTU.pack(ssrc, APP_MTU_NAME, probeSize)
+	if length is not None:
+		body += bytes(max(0, length - RTCP_HEADER.size - len(body)) & ~3)
+	return _packet(PT_APP, 0, body)
+
+def parseMtuProbe(body):
+	"""Return the probe size of a path MTU probe or echo, or None for other APP packets."""
+	if len(body) < APP_MTU.size:
+		return None
+	_, name, probeSize = APP_MTU.unpack_from(body)
+	if name != APP_MTU_NAME:
+		return None
+	return probeSize
+
+def buildRemb(ssrc, bitrate, mediaSsrcs=(0,)):
+	"""PSFB REMB packet carrying the receiver's bandwidth estimate in bit/s."""
+	bitrate = max(0, int(bitrate))
+	exponent = 0
+	while bitrate > 0x3FFFF:
+		bitrate >>= 1
+		exponent += 1
+	body = FEEDBACK_SSRC.pack(ssrc, 0) + REMB.pack(REMB_NAME, len(mediaSsrcs),
+		(exponent << 2) | (bitrate >> 16), bitrate & 0xFFFF)
+	body += b''.join(struct.pack('!I', media) for media in mediaSsrcs)
+	return _packet(PT_PSFB, FMT_AFB, body)
+
+def parseRemb(body):
+	"""Return the bit rate of a REMB packet, or None for other application feedback."""
+	pos = FEEDBACK_SSRC.size
+	if len(body) < pos + REMB.size:
+		return None
+	name, _, expMantissa, low = REMB.unpack_from(body, pos)
+	if name != REMB_NAME:
+		return None
+	return (((expMantissa & 0x03) << 16) | low) << (expMantissa >> 2)
+
+def iterPackets(data):
+	"""Yield (packetType, count/FMT, body) for each packet of a compound RTCP datagram."""
+	view = memoryview(data)
+	pos = 0
+	while pos + RTCP_HEADER.size <= len(view):
+		first, pt, length = RTCP_HEADER.unpack_from(view, pos)
+		end = pos + (length + 1) * 4
+		if first >> 6 != 2 or end > len(view):
+			return
+		yield pt, first & 0x1F, view[pos + RTCP_HEADER.size:end]
+		pos = end
+
+def buildNack(ssrc, mediaSsrc, losses):
+	"""Build a NACK for losses, a list of (frameNumber, fragment numbers or None for the whole frame)."""
+	entries = []
+	for frameNumber, fragments in losses:
+		if fragments is None:
+			entries.append((frameNumber & 0xFFFF, FRAG_ALL, 0))
+			continue
+		fragments = sorted(fragments)
+		i = 0
+		while i < len(fragments):
+			base = fragments[i]
+			mask = 0
+			i += 1
+			while i < len(fragments) and fragments[i] - base <= NACK_MASK_BITS:
+				mask |= 1 << (fragments[i] - base - 1)
+				i += 1
+			entries.append((frameNumber & 0xFFFF, base, mask))
+
+	length = (RTCP_HEADER.size + FEEDBACK_SSRC.size + NACK_ENTRY.size * len(entries)) // 4 - 1
+	buf = bytearray((length + 1) * 4)
+	RTCP_HEADER.pack_into(buf, 0, 0x80 | FMT_NACK, PT_RTPFB, length)
+	FEEDBACK_SSRC.pack_into(buf, RTCP_HEADER.size, ssrc, mediaSsrc)
+	pos = RTCP_HEADER.size + FEEDBACK_SSRC.size
+	for entry in entries:
+		NACK_ENTRY.pack_into(buf, pos, *entry)
+		pos += NACK_ENTRY.size
+	return bytes(buf)
+
+def parseNack(body):
+	"""Return [(frameNumber, fragment numbers or None)] from the body of a NACK packet."""
+	losses = []
+	for pos in range(FEEDBACK_SSRC.size, len(body) - NACK_ENTRY.size + 1, NACK_ENTRY.size):
+		frameNumber, base, mask = NACK_ENTRY.unpack_from(body, pos)
+		if base == FRAG_ALL:
+			losses.append((frameNumber, None))
+			continue
+		fragments = [base]
+		for bit in range(NACK_MASK_BITS):
+			if mask & (1 << bit):
+				fragments.append(base + bit + 1)
+		losses.append((frameNumber, fragments))
+	return losses
+
+class ReceptionStats:
+	"""Receiver-side loss accounting for receiver reports (after RFC 3550 A.3).
+
+	The RTP sequence number is the frame number here, so loss is counted in
+	fragments: each frame is expected to deliver the fragment total from its
+	fragmentation header, and a frame missing entirely counts as the size of
+	the newest one seen before it. Only original transmissions count as received
+	(not retransmissions or FEC repairs), so the report shows the loss the
+	path caused, before any recovery.
+	"""
+
+	def __init__(self):
+		self.maxSeq = None
+		self.cycles = 0
+		self.expected = 0
+		self.received = 0
+		self._expectedPrior = 0
+		self._receivedPrior = 0
+		self._lastTotal = 1
+		# seq -> [fragments expected, originals received] of frames still arriving
+		self._frames = {}
+
+	def onPacket(self, seq, total, original=True):
+		"""Count one data packet of frame seq, which has total fragments."""
+		if self.maxSeq is None:
+			self.maxSeq = seq
+		else:
+			delta = (seq - self.maxSeq) & 0xFFFF
+			if 0 < delta < 0x8000:
+				if seq < self.maxSeq:
+					self.cycles += 0x10000
+				# Frames skipped entirely in between
+				self.expected += (delta - 1) * self._lastTotal
+				self.maxSeq = seq
+				self._closeFrames()
+
+		frame = self._frames.get(seq)
+		if frame is None:
+			if 2 <= ((self.maxSeq - seq) & 0xFFFF) < 0x8000:
+				# Late packet of a frame that has already been accounted
+				return
+			frame = self._frames[seq] = [total, 0]
+			if seq == self.maxSeq:
+				self._lastTotal = total
+		if original:
+			frame[1] += 1
+
+	def onSkipped(self, firstSeq, count):
+		"""Frames firstSeq .. firstSeq + count - 1 were not sent on purpose: do not count them as lost."""
+		lastSeq = (firstSeq + count - 1) & 0xFFFF
+		if self.maxSeq is None or count <= 0:
+			return
+		delta = (lastSeq - self.maxSeq) & 0xFFFF
+		if not 0 < delta < 0x8000:
+			return
+		# Frames missing before the skipped run are still losses
+		gap = (firstSeq - self.maxSeq - 1) & 0xFFFF
+		if gap < 0x8000:
+			self.expected += gap * self._lastTotal
+		if lastSeq < self.maxSeq:
+			self.cycles += 0x10000
+		self.maxSeq = lastSeq
+		self._closeFrames()
+
+	def _closeFrames(self):
+		"""Account frames at least two behind the newest; their originals have all arrived by now."""
+		for seq in [s for s in self._frames if ((self.maxSeq - s) & 0xFFFF) >= 2]:
+			total, received = self._frames.pop(seq)
+			self.expected += total
+			self.received += min(received, total)
+
+	def extendedHighest(self):
+		return self.cycles + (self.maxSeq or 0)
+
+	def cumulativeLost(self):
+		return self.expected - self.received
+
+	def fractionLost(self):
+		"""Share of packets lost since the previous call, in 1/256 (RR format)."""
+		expected = self.expected - self._expectedPrior
+		lost = expected - (self.received - self._receivedPrior)
+		self._expectedPrior = self.expected
+		self._receivedPrior = self.received
+		if expected <= 0 or lost <= 0:
+			return 0
+		return min(255, (lost << 8) // expected)
+
+	def reset(self):
+		self.__init__()
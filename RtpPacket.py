@@ -1,78 +1,99 @@
 import sys
+import struct
 from time import time
 
 HEADER_SIZE = 12
 
-class RtpPacket:	
-	header = bytearray(HEADER_SIZE)
-	
+# Byte 0: V(2) + P(1) + X(1) + CC(4), byte 1: M(1) + PT(7),
+# sequence number (16), timestamp (32), SSRC (32)
+RTP_HEADER = struct.Struct('!BBHII')
+
+class RtpPacket:
+	# Fixed attribute layout: no per-instance __dict__ on the per-packet path.
+	# A packet is a buffer holding header + payload, the end of the packet
+	# in it, and the unpacked header fields
+	__slots__ = ('_buf', '_end', '_fields')
+
 	def __init__(self):
-		pass
-		
-	def encode(self, version, padding, extension, cc, seqnum, marker, pt, ssrc, payload):
+		self._buf = bytearray(HEADER_SIZE)
+		self._end = HEADER_SIZE
+		# Unpacked header: (V/P/X/CC, M/PT, seqnum, timestamp, SSRC)
+		self._fields = (0, 0, 0, 0, 0)
+
+	@staticmethod
+	def packHeader(buf, offset, seqnum, marker, pt, ssrc, timestamp, version=2, padding=0, extension=0, cc=0):
+		"""Write a 12-byte RTP header into buf at offset (no allocation)."""
+		RTP_HEADER.pack_into(buf, offset,
+			(version << 6) | (padding << 5) | (extension << 4) | cc,
+			(marker << 7) | pt,
+			seqnum & 0xFFFF,
+			timestamp & 0xFFFFFFFF,
+			ssrc & 0xFFFFFFFF)
+
+	@classmethod
+	def parse(cls, buf, packet=None, length=None):
+		"""Parse the first length bytes (default all) of buf without copying them.
+
+		Only the header fields are unpacked; the payload is sliced from buf
+		when asked for (a view if buf is a memoryview, so a receive loop can
+		pass its pooled buffer). Pass an existing instance as packet to reuse
+		it; the packet is valid as long as buf holds the datagram.
+		"""
+		if packet is None:
+			packet = cls.__new__(cls)
+		packet._fields = RTP_HEADER.unpack_from(buf)
+		packet._buf = buf
+		packet._end = len(buf) if length is None else length
+		return packet
+
+	def encode(self, version, padding, extension, cc, seqnum, marker, pt, ssrc, payload, timestamp=None):
 		"""Encode the RTP packet with header fields and payload."""
-		timestamp = int(time())
-		header = bytearray(HEADER_SIZE)
-		
-		# Byte 0: V(2) + P(1) + X(1) + CC(4)
-		header[0] = (version << 6) | (padding << 5) | (extension << 4) | cc
-		
-		# Byte 1: M(1) + PT(7)
-		# Marker bit for fragmentation support
-		header[1] = (marker << 7) | pt
-		
-		# Bytes 2-3: Sequence number
-		header[2] = (seqnum >> 8) & 0xFF
-		header[3] = seqnum & 0xFF
-		
-		# Bytes 4-7: Timestamp
-		header[4] = (timestamp >> 24) & 0xFF
-		header[5] = (timestamp >> 16) & 0xFF
-		header[6] = (timestamp >> 8) & 0xFF
-		header[7] = timestamp & 0xFF
-		
-		# Bytes 8-11: SSRC
-		header[8] = (ssrc >> 24) & 0xFF
-		header[9] = (ssrc >> 16) & 0xFF
-		header[10] = (ssrc >> 8) & 0xFF
-		header[11] = ssrc & 0xFF
-		
-		self.header = header
-		self.payload = payload
-		
+		if timestamp is None:
+			timestamp = int(time())
+		buf = bytearray(HEADER_SIZE)
+		self.packHeader(buf, 0, seqnum, marker, pt, ssrc, timestamp, version, padding, extension, cc)
+		buf += payload
+		self.parse(buf, self)
+
 	def decode(self, byteStream):
 		"""Decode the RTP packet."""
-		self.header = bytearray(byteStream[:HEADER_SIZE])
-		self.payload = byteStream[HEADER_SIZE:]
-	
+		self.parse(byteStream, self)
+
+	@property
+	def header(self):
+		"""The 12-byte header, sliced from the packet buffer."""
+		return self._buf[:HEADER_SIZE]
+
 	def version(self):
 		"""Return RTP version."""
-		return int(self.header[0] >> 6)
-	
+		return self._fields[0] >> 6
+
 	def seqNum(self):
 		"""Return sequence (frame) number."""
-		seqNum = self.header[2] << 8 | self.header[3]
-		return int(seqNum)
-	
+		return self._fields[2]
+
 	def timestamp(self):
 		"""Return timestamp."""
-		timestamp = self.header[4] << 24 | self.header[5] << 16 | self.header[6] << 8 | self.header[7]
-		return int(timestamp)
-	
+		return self._fields[3]
+
+	def ssrc(self):
+		"""Return synchronization source identifier."""
+		return self._fields[4]
+
 	def payloadType(self):
 		"""Return payload type."""
-		pt = self.header[1] & 0x7F
-		return int(pt)
-	
+		return self._fields[1] & 0x7F
+
 	def getMarker(self):
 		"""Return marker bit (for fragmentation)."""
-		marker = (self.header[1] >> 7) & 0x01
-		return int(marker)
-	
+		return self._fields[1] >> 7
+
 	def getPayload(self):
 		"""Return payload."""
-		return self.payload
-		
+		return self._buf[HEADER_SIZE:self._end]
+
 	def getPacket(self):
 		"""Return RTP packet."""
-		return self.header + self.payload
\ No newline at end of file
+		if self._end == len(self._buf):
+			return self._buf
+		return self._buf[:self._end]
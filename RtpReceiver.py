@@ -0,0 +1,118 @@
+import socket, selectors, sys
+
+# Largest UDP payload over IPv4 (65535 minus the IP and UDP headers)
+MAX_UDP_PAYLOAD = 65507
+# Default receive buffer size: any datagram. The client sizes its buffers
+# for the largest packet it advertised in SETUP instead
+RECV_BUFFER_SIZE = MAX_UDP_PAYLOAD
+POOL_SIZE = 64
+
+# recvmsg reports a datagram cut short by the buffer in its flags; with
+# MSG_TRUNC passed in, Linux also returns the datagram's real length
+CAN_RECVMSG = hasattr(socket.socket, 'recvmsg_into')
+TRUNC_FLAGS = socket.MSG_TRUNC if CAN_RECVMSG and sys.platform.startswith('linux') else 0
+WSAEMSGSIZE = 10040  # Windows: datagram larger than the buffer (and discarded)
+
+class RtpReceiver:
+	"""Drain an RTP socket into a pool of preallocated buffers.
+
+	The receive thread blocks in select/epoll on the socket and a stop
+	socketpair, so it uses no CPU while idle and wakes immediately on
+	stop(). Each wakeup drains up to POOL_SIZE datagrams with recvmsg_into
+	and passes memoryviews of the pooled buffers to handler(view). Views are
+	only valid during the call: handlers must copy data they keep.
+	Datagrams larger than bufferSize cannot be used; they are counted in
+	stats['truncated'] and the first one is logged.
+	"""
+
+	def __init__(self, sock, handler, bufferSize=RECV_BUFFER_SIZE, poolSize=POOL_SIZE):
+		self.sock = sock
+		self.handler = handler
+		self.bufferSize = bufferSize
+		self.pool = [bytearray(bufferSize) for _ in range(poolSize)]
+		self.views = [memoryview(buf) for buf in self.pool]
+		self._stopRecv, self._stopSend = socket.socketpair()
+		self.stopped = False
+		# Address the server sends from; feedback (RTCP) goes back to it
+		self.source = None
+		self.stats = {
+			'datagrams': 0,
+			'wakeups': 0,
+			'truncated': 0
+		}
+
+	def run(self):
+		"""Receive until stop() is called (runs on the caller's thread)."""
+		self.sock.setblocking(False)
+		selector = selectors.DefaultSelector()
+		selector.register(self.sock, selectors.EVENT_READ)
+		selector.register(self._stopRecv, selectors.EVENT_READ)
+		try:
+			while not self.stopped:
+				events = selector.select()
+				if self.stopped:
+					break
+				for key, _ in events:
+					if key.fileobj is self.sock:
+						self._drain()
+		except (OSError, ValueError):
+			# Socket closed underneath us during teardown
+			pass
+		finally:
+			selector.close()
+			self._stopRecv.close()
+			self._stopSend.close()
+
+	def _drain(self):
+		"""Read every queued datagram (up to the pool size) then dispatch them."""
+		self.stats['wakeups'] += 1
+		ready = []
+		for view in self.views:
+			try:
+				n, truncated, source = self._recv(view)
+			except (BlockingIOError, InterruptedError):
+				break
+			if self.source is None:
+				self.source = source
+			if truncated:
+				self._truncated(n)
+				continue
+			ready.append(view[:n])
+
+		self.stats['datagrams'] += len(ready)
+		for packet in ready:
+			try:
+				self.handler(packet)
+			except Exception as e:
+				print(f"[RTP ERROR] {e}")
+
+	def _recv(self, view):
+		"""Receive one datagram into view; return (length, truncated, source address)."""
+		if CAN_RECVMSG:
+			n, _, flags, source = self.sock.recvmsg_into([view], 0, TRUNC_FLAGS)
+			return n, bool(flags & socket.MSG_TRUNC), source
+		try:
+			n, source = self.sock.recvfrom_into(view)
+		except OSError as e:
+			if getattr(e, 'winerror', None) != WSAEMSGSIZE:
+				raise
+			return 0, True, None
+		return n, False, source
+
+	def _truncated(self, size):
+		"""Count a datagram too large for the buffers (size is its real length where known)."""
+		self.stats['truncated'] += 1
+		if self.stats['truncated'] == 1:
+			what = f"{size}-byte datagram" if size > self.bufferSize else "datagram"
+			print(f"[RTP] Dropped a {what} over the {self.bufferSize}-byte receive buffers "
+				  f"(larger than the mtu advertised in SETUP)")
+
+	def stop(self):
+		"""Wake the receive thread and make it exit."""
+		if self.stopped:
+			return
+		self.stopped = True
+		try:
+			self._stopSend.send(b'\0')
+		except OSError:
+			pass
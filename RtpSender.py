@@ -0,0 +1,94 @@
+import sys, socket, struct, errno
+
+# Linux UDP generic segmentation offload (kernel >= 4.18): one sendmsg()
+# carries many equal-sized datagrams that the kernel splits on the way out
+SOL_UDP = getattr(socket, 'SOL_UDP', 17)
+UDP_SEGMENT = getattr(socket, 'UDP_SEGMENT', 103)
+GSO_MAX_SEGMENTS = 64
+GSO_MAX_BYTES = 65000  # Stay under the 65507-byte UDP payload limit
+
+# Errors meaning "this kernel/NIC/path can't do GSO" rather than a network failure
+GSO_ERRORS = (errno.EINVAL, errno.EIO, errno.ENOPROTOOPT, errno.EOPNOTSUPP, errno.EMSGSIZE)
+
+class RtpSender:
+	"""Send RTP packets given as lists of buffers, with as few copies and syscalls as possible.
+
+	Each packet is a sequence of buffers (e.g. RTP header, fragment header,
+	memoryview of the frame) that is never concatenated in Python:
+	  - gso:     consecutive equal-sized packets go out in one sendmsg() with UDP_SEGMENT
+	  - sendmsg: one scatter-gather sendmsg() per packet
+	  - sendto:  buffers joined and sent with sendto() (no sendmsg, e.g. Windows or asyncio transports)
+	"""
+
+	def __init__(self, sock, useGso=True):
+		self.sock = sock
+		self.canSendmsg = hasattr(sock, 'sendmsg')
+		self.gso = useGso and self.canSendmsg and sys.platform.startswith('linux')
+		self.stats = {
+			'packets': 0,
+			'syscalls': 0
+		}
+
+	def mode(self):
+		"""Name of the fastest send path currently in use."""
+		if self.gso:
+			return 'gso'
+		return 'sendmsg' if self.canSendmsg else 'sendto'
+
+	def sendPackets(self, packets, address):
+		"""Send a list of packets (each a sequence of buffers); return bytes sent."""
+		if self.gso:
+			return self._sendGso(packets, address)
+		return self._sendEach(packets, address)
+
+	def _sendEach(self, packets, address):
+		"""One syscall per packet."""
+		sent = 0
+		if self.canSendmsg:
+			for packet in packets:
+				sent += self.sock.sendmsg(packet, [], 0, address)
+		else:
+			for packet in packets:
+				data = b''.join(packet)
+				self.sock.sendto(data, address)
+				sent += len(data)
+		self.stats['packets'] += len(packets)
+		self.stats['syscalls'] += len(packets)
+		return sent
+
+	def _sendGso(self, packets, address):
+		"""Batch runs of equal-sized packets (the last may be shorter) into GSO sends."""
+		sent = 0
+		i = 0
+		count = len(packets)
+		while i < count:
+			segSize = sum(len(buf) for buf in packets[i])
+			maxSegments = max(1, min(GSO_MAX_SEGMENTS, GSO_MAX_BYTES // segSize))
+			iov = list(packets[i])
+			j = i + 1
+			while j < count and j - i < maxSegments:
+				size = sum(len(buf) for buf in packets[j])
+				if size > segSize:
+					break
+				iov.extend(packets[j])
+				j += 1
+				if size < segSize:
+					# A short segment must be the last one of the batch
+					break
+
+			if j - i == 1:
+				sent += self.sock.sendmsg(iov, [], 0, address)
+			else:
+				try:
+					sent += self.sock.sendmsg(iov, [(SOL_UDP, UDP_SEGMENT, struct.pack('=H', segSize))], 0, address)
+				except OSError as e:
+					if e.errno not in GSO_ERRORS:
+						raise
+					# Kernel or NIC without GSO, or segments above the device MTU
+					print(f"[SENDER] UDP GSO unavailable ({e}), falling back to sendmsg")
+					self.gso = False
+					return sent + self._sendEach(packets[i:], address)
+			self.stats['packets'] += j - i
+			self.stats['syscalls'] += 1
+			i = j
+		return sent
@@ -0,0 +1,253 @@
+import re
+
+RTSP_VERSION = 'RTSP/1.0'
+
+# Reason phrases of the status codes this server sends (RFC 2326, 7.1.1)
+REASONS = {
+	200: 'OK',
+	400: 'Bad Request',
+	404: 'Not Found',
+	454: 'Session Not Found',
+	455: 'Method Not Valid in This State',
+	500: 'Internal Server Error',
+	501: 'Not Implemented',
+}
+
+# Limits on what a peer may make the parser buffer
+MAX_HEADER_SIZE = 8192
+MAX_BODY_SIZE = 65536
+
+# Bytes asked of the control connection per read; the parser reassembles
+# messages that are split across reads or share one
+RECV_SIZE = 4096
+
+# Seconds a peer that has never ended a message with an empty line may go
+# quiet before its buffered header block is taken as a whole legacy message
+LEGACY_GRACE = 0.5
+
+# End of a header block: an empty line, with CRLF or bare LF line endings
+_HEADER_END = re.compile(rb'\r?\n\r?\n')
+
+class RtspError(ValueError):
+	"""A malformed or oversized RTSP message; the connection cannot be resynchronised."""
+
+class RtspMessage:
+	"""One RTSP request (method, uri) or response (code, reason), with its headers and body."""
+
+	def __init__(self, startLine, headers, body=b''):
+		self.method = self.uri = self.code = self.reason = None
+		parts = startLine.split(None, 2)
+		if parts and parts[0].startswith('RTSP/'):
+			if len(parts) < 2 or not (parts[1].isascii() and parts[1].isdigit()):
+				raise RtspError(f"bad status line {startLine!r}")
+			self.version = parts[0]
+			self.code = int(parts[1])
+			self.reason = parts[2] if len(parts) > 2 else ''
+		elif len(parts) == 3 and parts[2].startswith('RTSP/'):
+			self.method, self.uri, self.version = parts
+		else:
+			raise RtspError(f"bad request line {startLine!r}")
+		self.headers = headers
+		self.body = body
+		# Case-insensitive lookup; repeated headers are joined as a list (RFC 2616, 4.2)
+		self._index = {}
+		for name, value in headers:
+			key = name.lower()
+			self._index[key] = f"{self._index[key]}, {value}" if key in self._index else value
+
+	@property
+	def isRequest(self):
+		return self.method is not None
+
+	def header(self, name, default=None):
+		"""Value of the named header (any case), or default."""
+		return self._index.get(name.lower(), default)
+
+	@property
+	def cseq(self):
+		"""The CSeq header as a string, or None."""
+		return self.header('CSeq')
+
+	def __repr__(self):
+		first = f"{self.method} {self.uri}" if self.isRequest else f"{self.code} {self.reason}"
+		return f"<RtspMessage {first} CSeq={self.cseq}>"
+
+def splitParams(value):
+	"""Split 'first; key=value; flag' into ('first', {'key': 'value', 'flag': ''}), keys lowercased.
+
+	Used for the Transport header (first is the protocol) and the Session
+	header (first is the session id).
+	"""
+	first, *parts = value.split(';')
+	params = {}
+	for part in parts:
+		key, _, param = part.partition('=')
+		if key.strip():
+			params[key.strip().lower()] = param.strip()
+	return first.strip(), params
+
+def _headerLines(headers, body):
+	lines = [f"{name}: {value}" for name, value in headers]
+	if body:
+		lines.append(f"Content-Length: {len(body)}")
+	return lines
+
+def _build(startLine, lines, body):
+	return ('\r\n'.join([startLine] + lines) + '\r\n\r\n').encode('utf-8') + body
+
+def buildRequest(method, uri, cseq, headers=(), body=b''):
+	"""Encode a request; headers is a sequence of (name, value) after CSeq."""
+	return _build(f"{method} {uri} {RTSP_VERSION}", [f"CSeq: {cseq}"] + _headerLines(headers, body), body)
+
+def buildReply(code, cseq, headers=(), body=b''):
+	"""Encode a response with the status code's reason phrase; cseq None leaves CSeq out."""
+	lines = [f"CSeq: {cseq}"] if cseq is not None else []
+	return _build(f"{RTSP_VERSION} {code} {REASONS.get(code, 'Unknown')}", lines + _headerLines(headers, body), body)
+
+class RtspParser:
+	"""Incremental parser for one direction of an RTSP control connection.
+
+	feed() takes whatever a read returned and gives back the messages it
+	completed: a message may arrive over several reads and one read may hold
+	several (pipelined) messages. Lines end in CRLF or LF, headers come in
+	any order and a Content-Length body is read whole before its message is
+	returned. Bytes of an unfinished message stay buffered for the next feed.
+
+	Bytes that cannot be parsed raise RtspError. If the same read completed
+	messages before them, those are returned first and the error is kept in
+	error (and raised by the next feed), so every request before the fault
+	can still be answered.
+	"""
+
+	def __init__(self, maxHeaderSize=MAX_HEADER_SIZE, maxBodySize=MAX_BODY_SIZE):
+		self.maxHeaderSize = maxHeaderSize
+		self.maxBodySize = maxBodySize
+		self._buffer = bytearray()
+		# Where to resume looking for the end of the header block
+		self._scan = 0
+		# Message whose body is still arriving, and the body's length
+		self._head = None
+		# True once the peer has ended a message with an empty line
+		self.framed = False
+		self.error = None
+		self.stats = {'messages': 0, 'bytes': 0}
+
+	@property
+	def pending(self):
+		"""Bytes received but not yet part of a returned message."""
+		return len(self._buffer)
+
+	def feed(self, data):
+		"""Add bytes from the connection; return the list of messages they completed."""
+		if self.error is not None:
+			raise self.error
+		self._buffer += data
+		self.stats['bytes'] += len(data)
+		messages = []
+		while True:
+			try:
+				message = self._next()
+			except RtspError as e:
+				self.error = e
+				if messages:
+					return messages
+				raise
+			if message is None:
+				return messages
+			messages.append(message)
+
+	@property
+	def unterminated(self):
+		"""True if a header block is buffered and the peer has never sent an empty line.
+
+		The peer may be a legacy one that ends each message with the write;
+		a first message split across reads looks the same until its empty
+		line arrives, so flush() only once no bytes have followed for
+		LEGACY_GRACE.
+		"""
+		return not self.framed and self._head is None and bool(self._buffer.strip())
+
+	def flush(self):
+		"""Parse a buffered header block that has no empty line after it.
+
+		For peers that end a message with the write instead (this project's
+		clients before the codec); call only when unterminated and the peer
+		has gone quiet, so the block is known to be the whole message.
+		"""
+		if self._head is not None or not self._buffer.strip():
+			return []
+		block = bytes(self._buffer)
+		self._buffer.clear()
+		self._scan = 0
+		startLine, headers = self._parseHead(block.strip(b'\r\n'))
+		self.stats['messages'] += 1
+		return [RtspMessage(startLine, headers)]
+
+	def _next(self):
+		buffer = self._buffer
+		if self._head is None:
+			# Empty lines between messages are allowed (RFC 2326, 4)
+			skip = 0
+			while skip < len(buffer) and buffer[skip] in b'\r\n':
+				skip += 1
+			if skip:
+				del buffer[:skip]
+				self._scan = 0
+			match = _HEADER_END.search(buffer, self._scan)
+			if match is None:
+				if len(buffer) > self.maxHeaderSize:
+					raise RtspError(f"header block over {self.maxHeaderSize} bytes")
+				# The terminator may straddle this read and the next
+				self._scan = max(0, len(buffer) - 3)
+				return None
+			if match.start() > self.maxHeaderSize:
+				raise RtspError(f"header block over {self.maxHeaderSize} bytes")
+			startLine, headers = self._parseHead(bytes(buffer[:match.start()]))
+			del buffer[:match.end()]
+			self._scan = 0
+			self.framed = True
+			message = RtspMessage(startLine, headers)
+			self._head = (message, self._contentLength(message))
+
+		message, length = self._head
+		if len(buffer) < length:
+			return None
+		message.body = bytes(buffer[:length])
+		del buffer[:length]
+		self._head = None
+		self.stats['messages'] += 1
+		return message
+
+	def _parseHead(self, block):
+		try:
+			text = block.decode('utf-8')
+		except UnicodeDecodeError as e:
+			raise RtspError(f"header block is not UTF-8: {e}") from None
+		lines = text.replace('\r\n', '\n').split('\n')
+		startLine = lines[0]
+		headers = []
+		for line in lines[1:]:
+			if line[:1] in (' ', '\t'):
+				# Folded continuation of the previous header's value
+				if not headers:
+					raise RtspError(f"continuation line before any header: {line!r}")
+				name, value = headers[-1]
+				headers[-1] = (name, f"{value} {line.strip()}")
+				continue
+			name, sep, value = line.partition(':')
+			if not sep or not name.strip():
+				raise RtspError(f"bad header line {line!r}")
+			headers.append((name.strip(), value.strip()))
+		return startLine, headers
+
+	def _contentLength(self, message):
+		value = message.header('Content-Length')
+		if value is None:
+			return 0
+		# Repeated headers were joined, so conflicting lengths fail here too
+		if not (value.isascii() and value.isdigit()):
+			raise RtspError(f"bad Content-Length {value!r}")
+		length = int(value)
+		if length > self.maxBodySize:
+			raise RtspError(f"body of {length} bytes over {self.maxBodySize}")
+		return length
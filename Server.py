@@ -1,29 +1,215 @@
-import sys, socket
-from ServerWorker import ServerWorker
+import sys, socket, argparse, threading, time, os
+import multiprocessing, queue
+from ServerWorker import ServerWorker, FEC_AUTO
+from FrameCache import FrameCache
+from Sessions import SessionRegistry, REGISTRY_KEYS
+
+# Per-session counters summed into per-worker stats
+STAT_KEYS = ('frames_sent', 'frames_lost', 'frames_skipped', 'bytes_sent', 'fragments_sent',
+			 'nacks_received', 'fragments_retransmitted', 'fec_bytes', 'frames_shed', 'rendition_switches')
+
+class Server:
+	STATS_INTERVAL = 5.0
+
+	def __init__(self):
+		self.registry = SessionRegistry()
 
-class Server:	
 	def main(self):
-		try:
-			SERVER_PORT = int(sys.argv[1])
-		except:
-			print("[Usage: Server.py Server_port]\n")
+		args = self.parseArgs()
+		SERVER_PORT = args.port
+		applyOptions(args)
+
+		if args.workers > 1:
+			self.runWorkers(args)
+			return
+
+		self.runEngine(args.engine, self.listen(SERVER_PORT))
+
+	def listen(self, port, reusePort=False):
+		"""Create the RTSP listening socket (optionally shared between processes)."""
 		rtspSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-		rtspSocket.bind(('', SERVER_PORT))
-		rtspSocket.listen(5)        
+		if reusePort:
+			rtspSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+		rtspSocket.bind(('', port))
+		rtspSocket.listen(128 if reusePort else 5)
+		return rtspSocket
+
+	def runEngine(self, engine, rtspSocket):
+		"""Serve clients from rtspSocket with the selected engine (blocks)."""
+		if engine == 'asyncio':
+			from AsyncServer import AsyncServer
+			AsyncServer(sock=rtspSocket, registry=self.registry).run()
+			return
+
+		threading.Thread(target=self.registry.runReaper, daemon=True).start()
 
 		# Receive client info (address,port) through RTSP/TCP session
 		while True:
 			clientInfo = {}
-   
+
 			'''
 			{
 				'rtpSocket' : conn, addr
 			}
    			'''
 			clientInfo['rtspSocket'] = rtspSocket.accept() # conn, addr
-			ServerWorker(clientInfo).run()		
+			worker = ServerWorker(clientInfo, self.registry)
+			self.registry.add(worker)
+			worker.run()
+
+	def snapshot(self):
+		"""Sum session counters for this process."""
+		sessions = self.registry.sessions()
+		snap = {key: self.registry.retired.get(key, 0) for key in STAT_KEYS}
+		for session in sessions:
+			for key in STAT_KEYS:
+				snap[key] += session.stats.get(key, 0)
+		snap['sessions'] = len(sessions)
+		snap['playing'] = sum(1 for session in sessions if session.state == ServerWorker.PLAYING)
+		# Lifecycle: how sessions ended and what closing them reclaimed
+		snap.update(self.registry.snapshot())
+		# Worst receiver-reported quality among the live sessions
+		quality = [session.qualityStats() for session in sessions]
+		snap['rtt_ms_max'] = max((q.get('rtt_avg_ms', 0.0) for q in quality), default=0.0)
+		snap['loss_max'] = max((q.get('fraction_lost', 0.0) for q in quality), default=0.0)
+		# Lowest bandwidth estimate congestion control is working with
+		targets = [t for t in (session.congestionStats().get('target_kbps', 0.0) for session in sessions) if t > 0]
+		snap['cc_kbps_min'] = min(targets, default=0.0)
+		cache = FrameCache.shared().snapshot()
+		snap['cache_hits'] = cache['hits']
+		snap['cache_misses'] = cache['misses']
+		return snap
+
+	def reportStats(self, workerId, statsQueue):
+		"""Worker side: periodically push this process's counters to the parent."""
+		while True:
+			snap = self.snapshot()
+			snap['worker'] = workerId
+			snap['pid'] = os.getpid()
+			snap['time'] = time.time()
+			statsQueue.put(snap)
+			time.sleep(self.STATS_INTERVAL)
+
+	def runWorkers(self, args):
+		"""Fork args.workers processes that share the RTSP port and collect their stats."""
+		reusePort = hasattr(socket, 'SO_REUSEPORT')
+		# Without SO_REUSEPORT the children accept() on one inherited socket
+		shared = None if reusePort else self.listen(args.port)
+		statsQueue = multiprocessing.Queue()
+
+		procs = []
+		for workerId in range(args.workers):
+			proc = multiprocessing.Process(target=workerMain, daemon=True,
+				args=(workerId, args.workers, args, shared, statsQueue))
+			proc.start()
+			procs.append(proc)
+		print(f"[SERVER] Started {args.workers} workers on port {args.port} "
+			  f"({'SO_REUSEPORT' if reusePort else 'shared listening socket'})")
+
+		latest = {}
+		nextReport = time.time() + self.STATS_INTERVAL
+		try:
+			while True:
+				try:
+					snap = statsQueue.get(timeout=1.0)
+					latest[snap['worker']] = snap
+				except queue.Empty:
+					pass
+				for workerId, proc in enumerate(procs):
+					if not proc.is_alive():
+						print(f"[SERVER] Worker {workerId} (pid {proc.pid}) exited with code {proc.exitcode}")
+						latest.pop(workerId, None)
+						procs[workerId] = proc = multiprocessing.Process(target=workerMain, daemon=True,
+							args=(workerId, args.workers, args, shared, statsQueue))
+						proc.start()
+				if time.time() >= nextReport:
+					nextReport = time.time() + self.STATS_INTERVAL
+					self.printWorkerStats(latest)
+		except KeyboardInterrupt:
+			pass
+		finally:
+			for proc in procs:
+				proc.terminate()
+
+	def printWorkerStats(self, latest):
+		"""Print one line per worker and the aggregate."""
+		if not latest:
+			return
+		total = {key: 0 for key in STAT_KEYS + REGISTRY_KEYS + ('sessions', 'playing', 'cache_hits', 'cache_misses')}
+		for workerId in sorted(latest):
+			snap = latest[workerId]
+			for key in total:
+				total[key] += snap[key]
+			print(f"[WORKER {workerId}] pid {snap['pid']} | sessions {snap['sessions']} (playing {snap['playing']}) | "
+				  f"frames {snap['frames_sent']} | {snap['bytes_sent'] / 1048576:.1f} MB | "
+				  f"worst RTT {snap['rtt_ms_max']:.1f} ms loss {snap['loss_max'] * 100:.1f}% | "
+				  f"lowest estimate {snap['cc_kbps_min']:.0f} kbit/s")
+		print(f"[SERVER] {len(latest)} workers | sessions {total['sessions']} (playing {total['playing']}) | "
+			  f"frames {total['frames_sent']} lost {total['frames_lost']} skipped {total['frames_skipped']} shed {total['frames_shed']} | "
+			  f"NACKs {total['nacks_received']} resent {total['fragments_retransmitted']} FEC {total['fec_bytes'] / 1048576:.1f} MB | {total['bytes_sent'] / 1048576:.1f} MB | "
+			  f"cache hits {total['cache_hits']} misses {total['cache_misses']}")
+		print(f"[SERVER] closed sessions: teardown {total['closed_teardown']} eof {total['closed_eof']} "
+			  f"error {total['closed_error']} timeout {total['closed_timeout']} | reclaimed threads {total['reclaimed_threads']} "
+			  f"sockets {total['reclaimed_sockets']} files {total['reclaimed_files']} broadcasts {total['reclaimed_broadcasts']}")
+
+	def parseArgs(self):
+		parser = argparse.ArgumentParser(usage="Server.py Server_port [--engine threaded|asyncio] [--workers N] [--fec N|auto] [--cc on|off] [--broadcast [--multicast GROUP:PORT]]")
+		parser.add_argument('port', type=int, help="RTSP listening port")
+		parser.add_argument('--engine', choices=['threaded', 'asyncio'], default='threaded',
+							help="threaded: threads per client (default); asyncio: one event loop for all clients")
+		parser.add_argument('--workers', type=int, default=1,
+							help="number of worker processes sharing the RTSP port (default 1)")
+		parser.add_argument('--fec', default='0',
+							help="XOR parity FEC: fragments per parity packet, 'auto' to adapt to loss, or 0 for off (default)")
+		parser.add_argument('--cc', choices=['on', 'off'], default='on',
+							help="per-session congestion control from client delay/loss feedback (default on)")
+		parser.add_argument('--mtu', default='auto',
+							help="fragment payload bytes, or 'auto' to size fragments for each client's path MTU (default)")
+		parser.add_argument('--mtu-probe', action='store_true',
+							help="with --mtu auto, probe each client's path for the largest packet that gets through")
+		parser.add_argument('--session-timeout', type=float, default=ServerWorker.SESSION_TIMEOUT,
+							help=f"close sessions idle (no RTSP request or RTCP) this many seconds, 0 = never (default {ServerWorker.SESSION_TIMEOUT})")
+		parser.add_argument('--hints', choices=['on', 'off'], default='on',
+							help="send fragmented frames from hint track sidecars built with HintTrack.py, where present (default on)")
+		parser.add_argument('--broadcast', action='store_true',
+							help="lockstep broadcast: all viewers of a file share one reader and packetizer")
+		parser.add_argument('--multicast', default=None,
+							help="with --broadcast, send each packet once to this UDP multicast GROUP:PORT")
+		args = parser.parse_args()
+		if args.multicast is not None:
+			group, _, port = args.multicast.rpartition(':')
+			if not group or not port.isdigit() or not args.broadcast:
+				parser.error("--multicast needs --broadcast and a GROUP:PORT address")
+		if args.mtu != 'auto' and not (args.mtu.isdigit() and int(args.mtu) > 0):
+			parser.error("--mtu must be a payload size in bytes or 'auto'")
+		if args.fec != 'auto' and not args.fec.isdigit():
+			parser.error("--fec must be a group size or 'auto'")
+		return args
+
+def applyOptions(args):
+	"""Apply command-line session settings to ServerWorker (in every worker process)."""
+	ServerWorker.FEC_GROUP = FEC_AUTO if args.fec == 'auto' else int(args.fec)
+	ServerWorker.CONGESTION_CONTROL = args.cc == 'on'
+	ServerWorker.PATH_MTU = args.mtu == 'auto'
+	if not ServerWorker.PATH_MTU:
+		ServerWorker.MTU = int(args.mtu)
+	ServerWorker.MTU_PROBE = args.mtu_probe
+	ServerWorker.HINT_TRACKS = args.hints == 'on'
+	ServerWorker.SESSION_TIMEOUT = args.session_timeout
+	ServerWorker.BROADCAST = args.broadcast
+	if args.multicast is not None:
+		group, _, port = args.multicast.rpartition(':')
+		ServerWorker.MULTICAST = (group, int(port))
+
+def workerMain(workerId, workerCount, args, sharedSocket, statsQueue):
+	"""Entry point of one worker process."""
+	ServerWorker.configureWorker(workerId, workerCount)
+	applyOptions(args)
+	server = Server()
+	rtspSocket = sharedSocket if sharedSocket is not None else server.listen(args.port, reusePort=True)
+	threading.Thread(target=server.reportStats, args=(workerId, statsQueue), daemon=True).start()
+	server.runEngine(args.engine, rtspSocket)
 
 if __name__ == "__main__":
 	(Server()).main()
 
-
@@ -1,39 +1,149 @@
 from random import randint
-import sys, traceback, threading, socket
+import sys, traceback, threading, socket, select
+import itertools
 import time
 import struct
 import queue
 
 from VideoStream import VideoStream
-from RtpPacket import RtpPacket
+from FrameCache import FrameCache
+from RtpPacket import RtpPacket, HEADER_SIZE
+from RtpSender import RtpSender
+from Fragmentation import FRAG_HEADER_V2, packFragmentHeader, parityFlags, xorParity, MAX_PARITY_GROUP, FLAG_RETRANSMIT
+from Pacer import FramePacer, TokenBucket
+from Retransmission import RetransmitRing
+from Rtcp import (iterPackets, parseNack, PT_RTPFB, FMT_NACK, PT_RR, PT_APP, PT_PSFB, FMT_AFB, buildSenderReport,
+	parseReceiverReport, parseQosReport, parseRemb, parseMtuProbe, buildSkipNotice, ntpTime, ntpMiddle)
+from Congestion import SendRateController
+from Renditions import Ladder, RenditionStream, RenditionSelector
+from HintTrack import hintSize
+from Sessions import RESOURCES
+from Rtsp import RtspParser, RtspError, RECV_SIZE, LEGACY_GRACE, REASONS, buildReply, splitParams
+from PathMtu import MtuProbe, PROBE_TIMEOUT, MIN_MTU, canDiscover, chooseMtu, payloadSize, routeMtu
+from Packetizer import RTP_PT_MJPEG, RTP_CLOCK_RATE, buildFragments, makeRtpHeader, openRtpSocket
+
+
+# Adaptive FEC: pick the parity group size so that about FEC_TARGET
+# fragments are expected to be lost per group at the measured loss rate
+FEC_AUTO = -1
+FEC_MIN_GROUP = 4
+FEC_MAX_GROUP = 32
+FEC_TARGET = 0.1
+
+# RTCP: sender reports go out every REPORT_INTERVAL seconds; the receiver
+# quality they bring back is logged every QUALITY_LOG_INTERVAL seconds
+REPORT_INTERVAL = 1.0
+QUALITY_LOG_INTERVAL = 5.0
+
+# Congestion control: estimated bandwidth and chosen send rate are logged
+# this often while feedback keeps arriving
+CC_LOG_INTERVAL = 1.0
 
 class ServerWorker:
 	SETUP = 'SETUP'
 	PLAY = 'PLAY'
 	PAUSE = 'PAUSE'
 	TEARDOWN = 'TEARDOWN'
+	OPTIONS = 'OPTIONS'
+	GET_PARAMETER = 'GET_PARAMETER'
+	METHODS = (SETUP, PLAY, PAUSE, TEARDOWN, OPTIONS, GET_PARAMETER)
 	
 	INIT = 0
 	READY = 1
 	PLAYING = 2
 	state = INIT
 
-	OK_200 = 0
-	FILE_NOT_FOUND_404 = 1
-	CON_ERR_500 = 2
+	OK_200 = 200
+	BAD_REQUEST_400 = 400
+	FILE_NOT_FOUND_404 = 404
+	SESSION_NOT_FOUND_454 = 454
+	INVALID_STATE_455 = 455
+	CON_ERR_500 = 500
+	NOT_IMPLEMENTED_501 = 501
 	
-	# HD Configuration
-	MTU = 2000  # Increased to 16KB for better throughput and reduced fragmentation
+	# Fragment payload size. With PATH_MTU each session sizes its fragments so
+	# that a whole packet (IP + UDP + RTP + fragmentation headers) fits the
+	# path MTU to its client (see PathMtu); MTU is the fixed size otherwise
+	MTU = 2000
+	PATH_MTU = True
+	# With PATH_MTU, probe the path before the first frame for the largest
+	# packet that gets through (clients that advertise a limit echo probes)
+	MTU_PROBE = False
 	
 	# Frame rate control (change this to adjust playback speed)
 	# Set to None for natural video speed (from source file)
 	# Set to integer for fixed FPS (e.g., 30, 60, 120)
 	TARGET_FPS = 30  # None = natural speed, or set to 30, 60, 120, etc.
 	
+	# Fragmentation header version: 2 carries the full frame size and fragment
+	# offsets; 1 is the legacy 16-bit-size header for old clients
+	FRAG_VERSION = 2
+	
+	# Intra-frame smoothing: a fragmented frame goes out in bursts of
+	# PACING_BURST packets spread over this share of the frame interval
+	# (0 sends each frame as one burst)
+	PACING_SPREAD = 0.8
+	PACING_BURST = 8
+	
+	# Forward error correction: one XOR parity packet per FEC_GROUP fragments
+	# of a frame (0 = off, FEC_AUTO = adapt to the loss reported by the client).
+	# Needs FRAG_VERSION 2 and a client that understands parity packets.
+	FEC_GROUP = 0
+	
+	# Per-session congestion control: shed frames to stay under the bandwidth
+	# estimated from the client's delay (REMB) and loss feedback
+	CONGESTION_CONTROL = True
+	
+	# Broadcast mode: every session of a file watches one shared stream in
+	# lockstep (see Broadcast), sent per viewer or to MULTICAST = (group, port)
+	BROADCAST = False
+	MULTICAST = None
+	
+	# Send fragmented frames from their hint track (prebuilt fragment headers
+	# and payloads, see HintTrack) when the file has one for the session's
+	# payload size: only the RTP headers are written per frame
+	HINT_TRACKS = True
+	
+	# Seconds without an RTSP request (e.g. a GET_PARAMETER or OPTIONS
+	# keepalive) or RTCP packet before the session is closed (0 = never);
+	# announced to the client in the Session header
+	SESSION_TIMEOUT = 60
+	
 	clientInfo = {}
 	
-	def __init__(self, clientInfo):
+	# Session ids are handed out from a per-process counter and partitioned
+	# across worker processes (id % WORKER_COUNT == WORKER_ID)
+	WORKER_ID = 0
+	WORKER_COUNT = 1
+	_sessionIds = itertools.count(randint(100000, 999999))
+	_sessionLock = threading.Lock()
+	
+	@classmethod
+	def configureWorker(cls, workerId, workerCount):
+		"""Reserve this process's share of the session id space."""
+		ServerWorker.WORKER_ID = workerId
+		ServerWorker.WORKER_COUNT = workerCount
+		ServerWorker._sessionIds = itertools.count(randint(100000, 999999) // workerCount)
+	
+	@classmethod
+	def newSessionId(cls):
+		"""Return a session id unique across all worker processes."""
+		with ServerWorker._sessionLock:
+			return next(ServerWorker._sessionIds) * ServerWorker.WORKER_COUNT + ServerWorker.WORKER_ID
+	
+	def __init__(self, clientInfo, registry=None):
 		self.clientInfo = clientInfo
+		# Server's SessionRegistry, told when the session closes
+		self.registry = registry
+		self.closed = False
+		self._closeLock = threading.Lock()
+		self._tornDown = False
+		self._rtspThread = None
+		self._feedbackThread = None
+		# Last RTSP request or RTCP packet from the client
+		self.lastActivity = time.monotonic()
+		# Reassembles requests from the control connection's reads
+		self.rtspParser = RtspParser()
 		
 		# Statistics for network analysis
 		self.stats = {
@@ -41,6 +151,13 @@ class ServerWorker:
 			'frames_lost': 0,
 			'bytes_sent': 0,
 			'fragments_sent': 0,
+			'frames_skipped': 0,
+			'nacks_received': 0,
+			'fragments_retransmitted': 0,
+			'fec_packets': 0,
+			'fec_bytes': 0,
+			'frames_shed': 0,
+			'rendition_switches': 0,
 			'start_time': None
 		}
 
@@ -49,210 +166,939 @@ class ServerWorker:
 		self.frame_queue = queue.Queue(maxsize=50)
 		self._prefetch_thread = None
 		self._stop_prefetch = threading.Event()	
+		self._rtpSender = None
+		self.pacer = None
+		self._pacingReported = False
+		self._bucket = None
+		# Recently sent frames, for answering NACKs from the client
+		self.retransmitRing = RetransmitRing()
+		# Fragment loss rate estimated from NACKs, for adaptive FEC
+		self.lossRate = 0.0
+		self._nackedFragments = 0
+		# Random initial RTP timestamp (RFC 3550)
+		self.tsBase = randint(0, 0xFFFFFFFF)
+		# Latest receiver report and QoS report from the client
+		self.quality = {}
+		self._nextSenderReport = 0.0
+		self._nextQualityLog = 0.0
+		# Send budget from client feedback (None = send every frame)
+		self.congestion = SendRateController() if self.CONGESTION_CONTROL else None
+		self._nextCongestionLog = 0.0
+		# Last frame number sent, to tell the client about frames left out
+		self._lastSentFrame = None
+		# Zero-based frame after the last one the sender took from the prefetch
+		# queue: where playback resumes, as the prefetcher reads ahead of it
+		self.playhead = None
+		# Rendition choice when the file has a ladder (None = single encoding)
+		self.renditions = None
+		# Shared stream this session watches in broadcast mode
+		self.broadcast = None
+		# Path MTU the fragments are sized for (None = fixed MTU), the largest
+		# size worth probing, and the probe sent at the first PLAY
+		self.pathMtu = None
+		self.mtuLimit = None
+		self.mtuSource = None
+		self._mtuProbe = None
+		self._probeApplied = False
+		# RTP headers of hinted packets (marker 0, marker 1), rewritten every frame
+		self._hintHeaders = bytearray(2 * HEADER_SIZE)
 		
 	def run(self):
-		threading.Thread(target=self.recvRtspRequest).start()
+		self._rtspThread = threading.Thread(target=self.recvRtspRequest, daemon=True)
+		self._rtspThread.start()
 	
 	def recvRtspRequest(self):
-		"""Receive RTSP request from the client."""
+		"""Receive RTSP requests until the client disconnects, then release the session."""
 		connSocket = self.clientInfo['rtspSocket'][0]
-		while True:            
-			data = connSocket.recv(256)
-			if data:
-				print("Data received:\n" + data.decode("utf-8"))
-				self.processRtspRequest(data.decode("utf-8"))
-	
-	def processRtspRequest(self, data):
-		"""Process RTSP request sent from the client."""
-		request = data.split('\n')
-		line1 = request[0].split(' ')
-		requestType = line1[0]
+		reason = 'eof'
+		while not self.closed:
+			# A legacy client ends a request with its write: wait a moment for more before taking it as whole
+			connSocket.settimeout(LEGACY_GRACE if self.rtspParser.unterminated else None)
+			try:
+				data = connSocket.recv(RECV_SIZE)
+			except socket.timeout:
+				data = None
+			except OSError:
+				reason = 'error'
+				break
+			if data == b'':
+				# Connection closed by the client (or by close() on timeout)
+				break
+			try:
+				if data is None:
+					self.flushRtspData()
+				else:
+					self.handleRtspData(data)
+			except RtspError as e:
+				# Framing is lost: nothing after this point can be parsed
+				self.rejectRtspStream(e)
+				reason = 'error'
+				break
+		self.close(reason)
+	
+	def handleRtspData(self, data):
+		"""Process every request completed by bytes read from the control connection.
+		
+		A read may hold part of a request or several pipelined ones; requests
+		are answered in order. Raises RtspError if the stream cannot be parsed
+		(after answering the requests before the fault).
+		"""
+		for request in self.readRtspRequests(data):
+			self.answerRtspRequest(request)
+		if self.rtspParser.error is not None:
+			raise self.rtspParser.error
+	
+	def flushRtspData(self):
+		"""Answer the request of a legacy client that went quiet without ending it with an empty line."""
+		for request in self.rtspParser.flush():
+			self.answerRtspRequest(request)
+	
+	def readRtspRequests(self, data):
+		"""Feed bytes read from the control connection to the parser; return the requests they completed."""
+		print("Data received:\n" + data.decode("utf-8", "replace"))
+		return self.rtspParser.feed(data)
+	
+	def answerRtspRequest(self, request):
+		"""Process one request; a failure is answered (400 or 500) and does not end the session."""
+		try:
+			self.processRtspRequest(request)
+		except Exception as e:
+			# Unparseable header values are the client's fault, anything else ours
+			code = self.BAD_REQUEST_400 if isinstance(e, ValueError) else self.CON_ERR_500
+			print(f"[RTSP] {request.method} failed: {e!r}")
+			try:
+				self.replyRtsp(code, request.cseq)
+			except OSError:
+				pass
+	
+	def rejectRtspStream(self, error):
+		"""Answer a control stream that cannot be parsed (no CSeq to echo) before it is closed."""
+		print(f"[RTSP] Bad request: {error}")
+		try:
+			self.replyRtsp(self.BAD_REQUEST_400, None)
+		except OSError:
+			pass
+	
+	def checkSession(self, request):
+		"""Return True if the request's Session header, if any, names this session."""
+		value = request.header('Session')
+		if value is None:
+			# Clients from before the codec leave it out of some requests
+			return True
+		session, _ = splitParams(value)
+		return 'session' in self.clientInfo and session == str(self.clientInfo['session'])
+	
+	def processRtspRequest(self, request):
+		"""Process an RTSP request (an RtspMessage) sent from the client."""
+		self.lastActivity = time.monotonic()
+		if not request.isRequest:
+			print(f"[RTSP] Ignoring a response from the client: {request}")
+			return
+		requestType = request.method
+		filename = request.uri
+		seq = request.cseq
 		
-		filename = line1[1]
-		seq = request[1].split(' ')
+		if requestType not in self.METHODS:
+			self.replyRtsp(self.NOT_IMPLEMENTED_501, seq)
+			return
+		if requestType not in (self.SETUP, self.OPTIONS) and not self.checkSession(request):
+			self.replyRtsp(self.SESSION_NOT_FOUND_454, seq)
+			return
 		
 		# Process SETUP request
 		if requestType == self.SETUP:
-			if self.state == self.INIT:
+			if self.state != self.INIT:
+				self.replyRtsp(self.INVALID_STATE_455, seq)
+			else:
 				print("processing SETUP\n")
 				
+				# Nothing changes before the request is known to be usable
+				try:
+					rtpPort, clientLimit = self.parseTransport(request)
+				except ValueError as e:
+					print(f"[RTSP] Bad Transport header: {e}")
+					self.replyRtsp(self.BAD_REQUEST_400, seq)
+					return
 				try:
-					self.clientInfo['videoStream'] = VideoStream(filename)
-					self.state = self.READY
+					vs = self.openStream(filename, self.parseDisplaySize(request))
 				except IOError:
-					self.replyRtsp(self.FILE_NOT_FOUND_404, seq[1])
+					self.replyRtsp(self.FILE_NOT_FOUND_404, seq)
+					return
 				
-				self.clientInfo['session'] = randint(100000, 999999)
-				self.replyRtsp(self.OK_200, seq[1])
-				self.clientInfo['rtpPort'] = request[2].split(' ')[3]
+				self.clientInfo['videoStream'] = vs
+				self.clientInfo['session'] = self.newSessionId()
+				self.clientInfo['rtpPort'] = rtpPort
+				try:
+					self.choosePayloadSize(clientLimit)
+				except Exception:
+					# Stay in INIT so the client can retry the SETUP
+					del self.clientInfo['session']
+					self.clientInfo['videoStream'] = None
+					vs.close()
+					raise
+				self.state = self.READY
+				self.replyRtsp(self.OK_200, seq, self._setupHeaders())
+		
+		# Broadcast PLAY: join the shared stream at its next frame (no seeking)
+		elif requestType == self.PLAY and self.BROADCAST:
+			if self.state == self.READY:
+				print("processing PLAY (broadcast)\n")
+				try:
+					self.joinBroadcast(filename)
+				except ValueError as e:
+					print(f"[BROADCAST] Cannot join {filename}: {e}")
+					self.replyRtsp(self.CON_ERR_500, seq)
+					return
+				self.state = self.PLAYING
+				self.replyRtsp(self.OK_200, seq)
+				self.stats['start_time'] = time.time()
+			elif self.state == self.PLAYING:
+				self.replyRtsp(self.OK_200, seq)
+			else:
+				self.replyRtsp(self.INVALID_STATE_455, seq)
 		
 		# Process PLAY request 		
 		elif requestType == self.PLAY:
+			startTime = self.parseRange(request)
 			if self.state == self.READY:
 				print("processing PLAY\n")
 				self.state = self.PLAYING
 				
-				# Create a new socket for RTP/UDP
-				self.clientInfo["rtpSocket"] = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+				# Resume from an arbitrary position (e.g. after PAUSE)
+				if startTime is not None:
+					self.seekTo(startTime)
 				
-				# Increase buffer sizes for high-speed HD streaming
-				self.clientInfo["rtpSocket"].setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 16*1024*1024)  # 16MB send buffer for 360 FPS
-				# Enable QoS (Quality of Service) for prioritized video delivery
-				try:
-					self.clientInfo["rtpSocket"].setsockopt(socket.IPPROTO_IP, socket.IP_TOS, 0x88)
-				except:
-					pass
+				# Create a new socket for RTP/UDP
+				if self.clientInfo.get('rtpSocket') is None:
+					self.clientInfo['rtpSocket'] = self.openRtpSocket()
+					self._startFeedback(self.clientInfo['rtpSocket'])
 				
-				self.replyRtsp(self.OK_200, seq[1])
+				self.replyRtsp(self.OK_200, seq, self._rangeHeader())
 				
 				# Start statistics
 				self.stats['start_time'] = time.time()
 				
-				# Create control event for playback and start prefetch + sender threads
-				self.clientInfo['event'] = threading.Event()
-				# Recreate/clear prefetch queue and start prefetch thread to read frames in parallel
-				self.frame_queue = queue.Queue(maxsize=50)
-				self._stop_prefetch.clear()
-				self._prefetch_thread = threading.Thread(target=self._prefetch_frames, daemon=True)
-				self._prefetch_thread.start()
-				# Start RTP sender thread
-				self.clientInfo['worker']= threading.Thread(target=self.sendRtp)
-				self.clientInfo['worker'].start()
+				self._startStreaming()
+			
+			# PLAY with a Range while playing is a seek
+			elif self.state == self.PLAYING and startTime is not None:
+				print("processing PLAY (seek)\n")
+				self._stopStreaming()
+				self.seekTo(startTime)
+				self.replyRtsp(self.OK_200, seq, self._rangeHeader())
+				self._startStreaming()
+			
+			# PLAY while playing without a Range: carry on
+			elif self.state == self.PLAYING:
+				self.replyRtsp(self.OK_200, seq)
+			else:
+				self.replyRtsp(self.INVALID_STATE_455, seq)
 		
 		# Process PAUSE request
 		elif requestType == self.PAUSE:
 			if self.state == self.PLAYING:
 				print("processing PAUSE\n")
 				self.state = self.READY
-				# Signal threads to stop reading/sending
-				self.clientInfo['event'].set()
-				self._stop_prefetch.set()
-				self.replyRtsp(self.OK_200, seq[1])
+				# Stop reading/sending
+				self._stopStreaming()
+				self.leaveBroadcast()
+				self.replyRtsp(self.OK_200, seq)
+			else:
+				self.replyRtsp(self.INVALID_STATE_455, seq)
 		
 		# Process TEARDOWN request
 		elif requestType == self.TEARDOWN:
 			print("processing TEARDOWN\n")
-			# Signal threads to stop
-			self.clientInfo['event'].set()
-			self._stop_prefetch.set()
-			self.replyRtsp(self.OK_200, seq[1])
-			
+			self._tornDown = True
+			# Stop threads and release resources
+			self._stopStreaming()
+			self.leaveBroadcast()
+			self.replyRtsp(self.OK_200, seq)
 			
 			# Close the RTP socket
-			self.clientInfo['rtpSocket'].close()
-			# Join prefetch thread (short timeout) to release resources
+			if self.clientInfo.get('rtpSocket') is not None:
+				self.clientInfo['rtpSocket'].close()
+				self.clientInfo['rtpSocket'] = None
+			self.retransmitRing.clear()
+			print(FrameCache.shared().summary())
+			if self.quality:
+				print(self.qualitySummary())
+			if self.congestion is not None and self.congestion.target() is not None:
+				print(self.congestionSummary())
+			if self.stats['fec_packets']:
+				print(self.fecSummary())
+			if self.pathMtu is not None:
+				print(self.mtuSummary())
+		
+		# Keepalive: the request itself renewed the session
+		elif requestType in (self.OPTIONS, self.GET_PARAMETER):
+			headers = [('Public', ', '.join(self.METHODS))] if requestType == self.OPTIONS else None
+			self.replyRtsp(self.OK_200, seq, headers)
+	
+	def expired(self, now):
+		"""True once SESSION_TIMEOUT has passed without a request or RTCP from the client."""
+		return bool(self.SESSION_TIMEOUT) and not self.closed and now - self.lastActivity > self.SESSION_TIMEOUT
+	
+	def close(self, reason='eof'):
+		"""Release every thread, socket, file and broadcast subscription of the session (once)."""
+		with self._closeLock:
+			if self.closed:
+				return
+			self.closed = True
+		if reason == 'eof' and self._tornDown:
+			reason = 'teardown'
+		reclaimed = dict.fromkeys(RESOURCES, 0)
+		threads = [thread for thread in (self._prefetch_thread, self.clientInfo.get('worker'),
+			self._feedbackThread, self._rtspThread) if thread is not None and thread.is_alive()]
+		
+		self._stopStreaming()
+		if self.broadcast is not None:
+			self.leaveBroadcast()
+			reclaimed['broadcasts'] += 1
+		rtp = self.clientInfo.get('rtpSocket')
+		if rtp is not None:
+			# Also ends the feedback thread
+			self.clientInfo['rtpSocket'] = None
+			rtp.close()
+			reclaimed['sockets'] += 1
+		vs = self.clientInfo.get('videoStream')
+		if vs is not None:
+			self.clientInfo['videoStream'] = None
+			vs.close()
+			reclaimed['files'] += 1
+		if self.closeControl():
+			reclaimed['sockets'] += 1
+		self.retransmitRing.clear()
+		
+		current = threading.current_thread()
+		for thread in threads:
+			if thread is not current:
+				thread.join(timeout=1.0)
+			if thread is current or not thread.is_alive():
+				reclaimed['threads'] += 1
+		if self.registry is not None:
+			self.registry.remove(self, reason, reclaimed)
+	
+	def closeControl(self):
+		"""Close the RTSP connection (waking a blocked recv); True if there was one."""
+		connSocket = self.clientInfo.get('rtspSocket', (None,))[0]
+		if connSocket is None:
+			return False
+		try:
+			connSocket.shutdown(socket.SHUT_RDWR)
+		except OSError:
+			pass
+		connSocket.close()
+		return True
+	
+	def openStream(self, filename, displaySize=None):
+		"""Open filename, over all its renditions when it has a ladder."""
+		ladder = Ladder.load(filename)
+		if ladder is None:
+			return VideoStream(filename, self.TARGET_FPS)
+		stream = RenditionStream(ladder, self.TARGET_FPS)
+		cap = ladder.fitDisplay(*displaySize) if displaySize else None
+		self.renditions = RenditionSelector(ladder, cap)
+		stream.select(self.renditions.current)
+		entry = stream.current()
+		print(f"[LADDER] {len(ladder)} renditions, starting at {entry['width']}x{entry['height']}"
+			  + (f" for a {displaySize[0]}x{displaySize[1]} display" if displaySize else ""))
+		return stream
+	
+	def parseTransport(self, request):
+		"""Return the RTP port (a string) and the MTU (or None) of the 'Transport:' header.
+		
+		Raises ValueError if client_port is missing or either is not a valid number.
+		"""
+		params = splitParams(request.header('Transport', ''))[1]
+		port = params.get('client_port', '').split('-')[0].strip()
+		if not (port.isascii() and port.isdigit() and 0 < int(port) < 65536):
+			raise ValueError(f"bad client_port {params.get('client_port')!r}")
+		mtu = params.get('mtu')
+		if mtu is None:
+			return port, None
+		if not (mtu.isascii() and mtu.isdigit()):
+			raise ValueError(f"bad MTU {mtu!r}")
+		return port, int(mtu) or None
+	
+	def choosePayloadSize(self, clientLimit=None):
+		"""Size fragments for the path to the client, capped by the MTU it advertised (or None)."""
+		if not self.PATH_MTU:
+			# Fixed size (--mtu N), but never over what the client can receive:
+			# whole frames up to MTU bytes go out in one packet too
+			limit = payloadSize(max(clientLimit, MIN_MTU), self.FRAG_VERSION) if clientLimit else None
+			if limit is not None and limit < self.MTU:
+				self.MTU = limit
+				print(f"[MTU] session {self.clientInfo.get('session')}: client takes packets up to "
+					  f"{clientLimit} bytes -> {self.MTU}-byte fragments")
+			return
+		address = (self.clientInfo['rtspSocket'][1][0], int(self.clientInfo['rtpPort']))
+		route = routeMtu(address)
+		mtu, self.mtuLimit = chooseMtu(route, clientLimit)
+		self.setPathMtu(mtu, f"route {route or 'unknown'}, client {clientLimit or 'unadvertised'}")
+	
+	def setPathMtu(self, mtu, source):
+		"""Fragment frames for packets of at most mtu bytes from the next frame on."""
+		self.pathMtu = mtu
+		self.mtuSource = source
+		self.MTU = payloadSize(mtu, self.FRAG_VERSION)
+		print(f"[MTU] session {self.clientInfo.get('session')}: path MTU {mtu} ({source}) -> "
+			  f"{self.MTU}-byte fragments")
+	
+	def startMtuProbe(self):
+		"""Send the path MTU probes before the first frame; False if there is nothing to wait for."""
+		# Legacy (version 1) clients do not demultiplex RTCP from RTP
+		if (not self.MTU_PROBE or self.pathMtu is None or self._mtuProbe is not None
+				or self.FRAG_VERSION != 2 or not canDiscover()):
+			return False
+		self._mtuProbe = MtuProbe(self.mtuLimit)
+		address = (self.clientInfo['rtspSocket'][1][0], int(self.clientInfo['rtpPort']))
+		self._mtuProbe.send(self.clientInfo['rtpSocket'], address)
+		return self._mtuProbe.sent > 0
+	
+	def onMtuEcho(self, size):
+		"""The client echoed a path MTU probe."""
+		if self._mtuProbe is not None:
+			self._mtuProbe.onEcho(size)
+	
+	def finishMtuProbe(self):
+		"""Adopt the largest probe the client echoed (once, before the first frame is sent)."""
+		probe = self._mtuProbe
+		if probe is None or self._probeApplied:
+			return
+		self._probeApplied = True
+		if probe.largest is None:
+			print(f"[MTU] session {self.clientInfo.get('session')}: no probe echoed, "
+				  f"keeping path MTU {self.pathMtu}")
+			return
+		self.setPathMtu(probe.largest, f"probed {len(probe.sizes)} sizes up to {probe.sizes[0]}")
+	
+	def mtuSummary(self):
+		"""One-line report of the fragment size this session used and the loss it saw."""
+		frames = self.stats['frames_sent']
+		perFrame = self.stats['fragments_sent'] / frames if frames else 0.0
+		return (f"[MTU] session {self.clientInfo.get('session')} | path MTU {self.pathMtu} ({self.mtuSource}) | "
+				f"{self.MTU}-byte fragments, {perFrame:.1f} per frame | "
+				f"loss {self.quality.get('fraction_lost', 0) * 100:.2f}% (total {self.quality.get('cumulative_lost', 0)})")
+	
+	def parseDisplaySize(self, request):
+		"""Return (width, height) of an 'X-Display-Size: WxH' header, or None."""
+		value = request.header('X-Display-Size')
+		if value is None:
+			return None
+		width, _, height = value.partition('x')
+		try:
+			return int(width), int(height)
+		except ValueError:
+			return None
+	
+	def selectRendition(self):
+		"""Switch renditions for the next frame if the bandwidth estimate calls for it."""
+		if self.renditions is None:
+			return
+		vs = self.clientInfo['videoStream']
+		target = self.congestion.target() if self.congestion is not None else None
+		choice = self.renditions.choose(target, 1.0 / self.frameInterval(), time.monotonic())
+		if choice != vs.rendition:
+			old = vs.current()
+			vs.select(choice)
+			new = vs.current()
+			self.stats['rendition_switches'] += 1
+			print(f"[LADDER] session {self.clientInfo.get('session')}: {old['width']}x{old['height']} -> "
+				  f"{new['width']}x{new['height']} at frame {vs.frameNbr()} (estimate {(target or 0) / 1000:.0f} kbit/s)")
+	
+	def _setupHeaders(self):
+		"""Headers of the SETUP reply: the stream range, and the group in multicast broadcast mode."""
+		headers = self._rangeHeader() or []
+		if self.BROADCAST and self.MULTICAST is not None:
+			group, port = self.MULTICAST
+			headers.append(('Transport', f"RTP/AVP;multicast;destination={group};port={port}"))
+		return headers
+	
+	def joinBroadcast(self, filename):
+		"""Subscribe this session to the shared stream of filename."""
+		from Broadcast import Broadcast
+		address = (self.clientInfo['rtspSocket'][1][0], int(self.clientInfo['rtpPort']))
+		self.broadcast = Broadcast.join(self, filename, address, self.TARGET_FPS, self.MULTICAST)
+	
+	def leaveBroadcast(self):
+		"""Stop receiving the shared stream (the broadcast ends with its last viewer)."""
+		if self.broadcast is not None:
+			self.broadcast.leave(self)
+			self.broadcast = None
+	
+	def openRtpSocket(self):
+		"""Create the RTP/UDP socket used to send to the client."""
+		return openRtpSocket(self.PATH_MTU)
+	
+	def _startFeedback(self, rtpSocket):
+		"""Start the thread that reads RTCP feedback (NACKs) sent back to the RTP socket."""
+		self._feedbackThread = threading.Thread(target=self.recvFeedback, args=(rtpSocket,), daemon=True)
+		self._feedbackThread.start()
+	
+	def recvFeedback(self, rtpSocket):
+		"""Receive RTCP from the client until the RTP socket is closed."""
+		while self.clientInfo.get('rtpSocket') is rtpSocket:
 			try:
-				if self._prefetch_thread and self._prefetch_thread.is_alive():
-					self._prefetch_thread.join(timeout=0.2)
-			except:
-				pass
-			
-	def sendRtp(self):
-		"""Send RTP packets over UDP with HD support."""
-		# Calculate consumer pacing based on TARGET_FPS
-		if self.TARGET_FPS is None:
-			consumer_delay = 0.02 
+				readable, _, _ = select.select([rtpSocket], [], [], 0.5)
+				if readable:
+					data = rtpSocket.recv(2048)
+					self.handleFeedback(data)
+			except (OSError, ValueError):
+				break
+	
+	def handleFeedback(self, data):
+		"""Process one RTCP datagram from the client."""
+		self.lastActivity = time.monotonic()
+		for pt, fmt, body in iterPackets(data):
+			if pt == PT_RTPFB and fmt == FMT_NACK:
+				self.stats['nacks_received'] += 1
+				for frameNumber, fragments in parseNack(body):
+					self._nackedFragments += len(fragments) if fragments is not None else 1
+					self.retransmit(frameNumber, fragments)
+			elif pt == PT_RR:
+				for block in parseReceiverReport(body, fmt):
+					self.onReceiverReport(*block)
+			elif pt == PT_APP:
+				report = parseQosReport(body)
+				if report is not None:
+					self.onQosReport(*report)
+				size = parseMtuProbe(body)
+				if size is not None:
+					self.onMtuEcho(size)
+			elif pt == PT_PSFB and fmt == FMT_AFB:
+				bitrate = parseRemb(body)
+				if bitrate is not None and self.congestion is not None:
+					self.congestion.onRemb(bitrate)
+		
+		now = time.monotonic()
+		if self.quality and now >= self._nextQualityLog:
+			self._nextQualityLog = now + QUALITY_LOG_INTERVAL
+			print(self.qualitySummary())
+		if self.congestion is not None and self.congestion.target() is not None and now >= self._nextCongestionLog:
+			self._nextCongestionLog = now + CC_LOG_INTERVAL
+			print(self.congestionSummary())
+	
+	def onReceiverReport(self, fractionLost, cumulativeLost, highestSeq, jitter, lsr, dlsr):
+		"""Record loss, jitter and round-trip time from an RR report block."""
+		quality = self.quality
+		quality['fraction_lost'] = fractionLost
+		quality['cumulative_lost'] = cumulativeLost
+		quality['highest_seq'] = highestSeq
+		quality['jitter_ms'] = jitter * 1000.0 / RTP_CLOCK_RATE
+		if lsr:
+			# RTT = arrival - LSR - DLSR, all in 1/65536 s (RFC 3550 6.4.1)
+			rtt = ((ntpMiddle(*ntpTime()) - lsr - dlsr) & 0xFFFFFFFF) / 65536.0
+			if rtt < 60:
+				quality['rtt_ms'] = rtt * 1000
+				previous = quality.get('rtt_avg_ms')
+				quality['rtt_avg_ms'] = rtt * 1000 if previous is None else previous + (rtt * 1000 - previous) / 8.0
+		# Pre-repair loss drives adaptive FEC once the client reports it
+		if 'reports' in quality:
+			self.lossRate += (fractionLost - self.lossRate) / 4.0
 		else:
-			consumer_delay = 1.0 / self.TARGET_FPS
-
+			self.lossRate = fractionLost
+		quality['reports'] = quality.get('reports', 0) + 1
+		if self.congestion is not None:
+			self.congestion.onLoss(fractionLost)
+	
+	def onQosReport(self, bufferFrames, playoutDelayMs, octets):
+		"""Record the client's playout buffer and delivered throughput from an APP report."""
+		quality = self.quality
+		now = time.monotonic()
+		last = quality.get('_octets')
+		if last is not None and now > last[1]:
+			quality['goodput_kbps'] = ((octets - last[0]) & 0xFFFFFFFF) * 8 / (now - last[1]) / 1000
+			if self.congestion is not None:
+				self.congestion.onDelivered(quality['goodput_kbps'] * 1000)
+		quality['_octets'] = (octets, now)
+		quality['buffer_frames'] = bufferFrames
+		quality['playout_delay_ms'] = playoutDelayMs
+	
+	def qualityStats(self):
+		"""Receiver-reported quality of this session (without internal bookkeeping)."""
+		return {k: v for k, v in self.quality.items() if not k.startswith('_')}
+	
+	def qualitySummary(self):
+		"""One-line receiver quality report for this session."""
+		q = self.quality
+		return (f"[RTCP] session {self.clientInfo.get('session')} | "
+				f"RTT {q.get('rtt_ms', 0):.1f} ms (avg {q.get('rtt_avg_ms', 0):.1f}) | "
+				f"loss {q.get('fraction_lost', 0) * 100:.2f}% (total {q.get('cumulative_lost', 0)}) | "
+				f"jitter {q.get('jitter_ms', 0):.1f} ms | buffer {q.get('buffer_frames', 0)} frames, "
+				f"{q.get('playout_delay_ms', 0)} ms | goodput {q.get('goodput_kbps', 0):.0f} kbit/s")
+	
+	def congestionStats(self):
+		"""Estimated bandwidth and the send rate congestion control chose for this session."""
+		cc = self.congestion
+		if cc is None:
+			return {}
+		now = time.monotonic()
+		return {
+			'target_kbps': (cc.target() or 0) / 1000,
+			'remb_kbps': (cc.delayBased or 0) / 1000,
+			'loss_based_kbps': (cc.lossBased or 0) / 1000,
+			'send_kbps': cc.sendRate(now) / 1000,
+			'send_fps': cc.frameRate(now),
+			'frames_shed': cc.stats['frames_shed']
+		}
+	
+	def congestionSummary(self):
+		"""One-line congestion control report: estimate vs. chosen rate."""
+		cc = self.congestionStats()
+		return (f"[CC] session {self.clientInfo.get('session')} | estimate {cc['target_kbps']:.0f} kbit/s "
+				f"(delay {cc['remb_kbps']:.0f}, loss {cc['loss_based_kbps']:.0f}) | "
+				f"sending {cc['send_kbps']:.0f} kbit/s at {cc['send_fps']:.1f}/{1.0 / self.frameInterval():.0f} fps | "
+				f"shed {cc['frames_shed']} frames")
+	
+	def maybeSendReport(self, timestamp, address):
+		"""Send an RTCP sender report if REPORT_INTERVAL has passed since the last one."""
+		now = time.monotonic()
+		# Legacy (version 1) clients do not demultiplex RTCP from RTP
+		if self.FRAG_VERSION != 2 or now < self._nextSenderReport:
+			return
+		self._nextSenderReport = now + REPORT_INTERVAL
+		report = buildSenderReport(0, timestamp, self.rtpSender().stats['packets'], self.stats['bytes_sent'])
+		try:
+			self.clientInfo['rtpSocket'].sendto(report, address)
+		except OSError:
+			pass
+	
+	def fecSummary(self):
+		"""One-line FEC overhead and effectiveness report."""
+		overhead = self.stats['fec_bytes'] / self.stats['bytes_sent'] * 100 if self.stats['bytes_sent'] else 0.0
+		return (f"[FEC] group {self.fecGroupSize()} | {self.stats['fec_packets']} parity packets, "
+				f"{self.stats['fec_bytes']} bytes ({overhead:.1f}% overhead) | "
+				f"unrecoverable frames {self.retransmitRing.stats['fec_unrecoverable']} | loss {self.lossRate * 100:.2f}%")
+	
+	def retransmit(self, frameNumber, fragments):
+		"""Resend lost fragments (or a lost frame) from the retransmission ring."""
+		request = self.retransmitRing.request(frameNumber, fragments, self.MTU, time.monotonic())
+		if request is None:
+			return
+		data, timestamp, resend = request
+		try:
+			if len(data) > self.MTU:
+				packets = self.buildFragments(data, frameNumber, timestamp, resend, FLAG_RETRANSMIT)
+			else:
+				packets = [(self.makeRtpHeader(frameNumber, 1, timestamp), data)]
+			address = (self.clientInfo['rtspSocket'][1][0], int(self.clientInfo['rtpPort']))
+			self.stats['bytes_sent'] += self.rtpSender().sendPackets(packets, address)
+			self.stats['fragments_retransmitted'] += len(packets)
+		except Exception as e:
+			print(f"[NACK] Retransmission error: {e}")
+	
+	def _startStreaming(self):
+		"""Start the prefetch and RTP sender threads from the current stream position."""
+		# Fragment size settles before the first frame (retransmissions reuse it)
+		if self.startMtuProbe():
+			self._mtuProbe.done.wait(PROBE_TIMEOUT)
+		self.finishMtuProbe()
+		# Create control event for playback and start prefetch + sender threads
+		self.clientInfo['event'] = threading.Event()
+		# Recreate/clear prefetch queue and start prefetch thread to read frames in parallel
+		self.frame_queue = queue.Queue(maxsize=50)
+		self._stop_prefetch.clear()
+		self._prefetch_thread = threading.Thread(target=self._prefetch_frames, daemon=True)
+		self._prefetch_thread.start()
+		self.pacer = FramePacer(self.frameInterval())
+		self._pacingReported = False
+		# Start RTP sender thread
+		self.clientInfo['worker']= threading.Thread(target=self.sendRtp)
+		self.clientInfo['worker'].start()
+	
+	def _stopStreaming(self):
+		"""Stop the prefetch and sender threads and wait for them to exit."""
+		if self.clientInfo.get('event') is not None:
+			self.clientInfo['event'].set()
+		self._stop_prefetch.set()
+		for thread in (self._prefetch_thread, self.clientInfo.get('worker')):
+			if thread and thread.is_alive():
+				thread.join(timeout=1.0)
+		# Frames still queued were read but never sent: resume after the last sent one
+		if self.playhead is not None and self.clientInfo.get('videoStream') is not None:
+			self.clientInfo['videoStream'].seek(self.playhead)
+			self.playhead = None
+		self._reportPacing()
+	
+	def _reportPacing(self):
+		"""Print how well the last play period kept to its frame schedule."""
+		if self.pacer is not None and self.pacer.stats['frames'] and not self._pacingReported:
+			print(self.pacer.summary())
+			self._pacingReported = True
+	
+	def pacingStats(self):
+		"""Achieved frame rate and pacing error (ms) of the current play period."""
+		if self.pacer is None:
+			return {}
+		return {
+			'achieved_fps': self.pacer.achievedFps(),
+			'target_fps': 1.0 / self.pacer.interval,
+			'pacing_error_ms': self.pacer.meanError() * 1000,
+			'pacing_error_max_ms': self.pacer.stats['error_max'] * 1000,
+			'frames_skipped': self.pacer.stats['dropped']
+		}
+	
+	def parseRange(self, request):
+		"""Return the start time in seconds of an RTSP 'Range: npt=' header, or None."""
+		value = request.header('Range')
+		if value is None or not value.startswith('npt='):
+			return None
+		start = value[4:].split('-')[0].strip()
+		if not start or start == 'now':
+			return None
+		try:
+			# npt is either seconds ("75.5") or hh:mm:ss ("0:01:15.5")
+			seconds = 0.0
+			for part in start.split(':'):
+				seconds = seconds * 60 + float(part)
+			return seconds
+		except ValueError:
+			return None
+	
+	def seekTo(self, seconds):
+		"""Position the stream at the frame for the given time, using the frame index."""
+		vs = self.clientInfo['videoStream']
+		actual = vs.seekTime(seconds)
+		self.retransmitRing.clear()
+		self._lastSentFrame = None
+		self.playhead = None
+		print(f"[SEEK] npt={seconds:.3f}s -> frame {vs.frameNbr()} ({actual:.3f}s)")
+	
+	def _rangeHeader(self):
+		"""Range header describing the current position and stream duration."""
+		vs = self.clientInfo.get('videoStream')
+		if vs is None:
+			return None
+		return [('Range', f"npt={vs.currentTime():.3f}-{vs.duration():.3f}")]
+	
+	def frameInterval(self):
+		"""Seconds between frames, based on TARGET_FPS (or the source rate if None)."""
+		if self.TARGET_FPS is None:
+			vs = self.clientInfo.get('videoStream')
+			return 1.0 / vs.fps if vs is not None else 0.02
+		return 1.0 / self.TARGET_FPS
+	
+	def rtpTimestamp(self, frameNumber):
+		"""90 kHz media-clock timestamp of a frame, from its position in the stream."""
+		mediaTime = self.clientInfo['videoStream'].frameTime(frameNumber - 1)
+		return (self.tsBase + int(round(mediaTime * RTP_CLOCK_RATE))) & 0xFFFFFFFF
+	
+	def sendRtp(self):
+		"""Send RTP packets over UDP with HD support, one frame per pacer deadline."""
 		while True:
 			# Wait for control event to exist
-			if self.clientInfo.get('event') is None:
+			event = self.clientInfo.get('event')
+			if event is None:
 				time.sleep(0.001)
 				continue
 
+			# Sleep until the next frame is due (wakes early on PAUSE or TEARDOWN)
+			drop = self.pacer.wait(event)
+
 			# Stop sending if request is PAUSE or TEARDOWN
-			if self.clientInfo['event'].isSet():
+			if event.isSet():
 				break
 
-			# Prefer prefetched frames (producer-consumer)
-			data = None
-			try:
-				data = self.frame_queue.get(timeout=0.01)
-			except queue.Empty:
-				# Fallback: direct read (if prefetcher can't fill queue)
-				try:
-					data = self.clientInfo['videoStream'].nextFrame()
-				except:
-					data = None
+			# Too far behind to catch up: skip the frames whose time has passed
+			for _ in range(drop):
+				self.nextQueuedFrame()
+			self.stats['frames_skipped'] += drop
 
+			self.selectRendition()
+			frameNumber, data = self.nextQueuedFrame()
 			if data:
-				frameNumber = self.clientInfo['videoStream'].frameNbr()
-				try:
-					address = self.clientInfo['rtspSocket'][1][0]
-					port = int(self.clientInfo['rtpPort'])
+				self.sendFrame(data, frameNumber)
+
+	def nextQueuedFrame(self):
+		"""Return (frameNumber, data) of the next prefetched frame, or (None, None) if none is ready.
+		
+		The prefetch thread is the only reader of the stream position; the
+		sender never calls nextFrame() itself, so the two cannot skip or
+		repeat frames.
+		"""
+		try:
+			frameNumber, data, rendition = self.frame_queue.get(timeout=self.pacer.interval)
+		except queue.Empty:
+			# End of stream, or the prefetcher is behind: nothing to send this tick
+			return None, None
+		self.playhead = frameNumber
+		vs = self.clientInfo['videoStream']
+		if rendition is not None and rendition != vs.rendition:
+			# Prefetched before a rendition switch: same frame from the new one
+			data = vs.readFrame(frameNumber - 1)
+		return frameNumber, data
 
-					# Check if frame needs fragmentation (HD frames)
-					if len(data) > self.MTU:
-						self.sendFragmented(data, frameNumber, address, port)
-					else:
-						# Send regular frame
-						packet = self.makeRtp(data, frameNumber, marker=1)
-						self.clientInfo['rtpSocket'].sendto(packet, (address, port))
-						self.stats['frames_sent'] += 1
-						self.stats['bytes_sent'] += len(packet)
+	def sendFrame(self, data, frameNumber):
+		"""Send one frame to the client, fragmenting it if needed."""
+		try:
+			address = self.clientInfo['rtspSocket'][1][0]
+			port = int(self.clientInfo['rtpPort'])
 
-				except Exception:
-					print("Connection Error")
-					self.stats['frames_lost'] += 1
+			timestamp = self.rtpTimestamp(frameNumber)
+
+			# Over the session's bandwidth estimate: leave the frame out, keeping the media clock
+			if self.congestion is not None and not self.congestion.admit(len(data)):
+				self.stats['frames_shed'] += 1
+				return
+			self.noteSkippedFrames(frameNumber, (address, port))
+
+			# Check if frame needs fragmentation (HD frames)
+			fec = False
+			if len(data) > self.MTU:
+				fec = self.sendFragmented(data, frameNumber, address, port, timestamp)
+			else:
+				# Send regular frame (header and payload go out as separate buffers)
+				packet = (self.makeRtpHeader(frameNumber, 1, timestamp), data)
+				self.stats['bytes_sent'] += self.rtpSender().sendPackets([packet], (address, port))
+				self.stats['frames_sent'] += 1
+			self.retransmitRing.add(frameNumber, data, timestamp, time.monotonic(), fec)
+			self.maybeSendReport(timestamp, (address, port))
 
-			# Pace consumer if fixed TARGET_FPS is set
-			if consumer_delay > 0:
-				time.sleep(consumer_delay)
+		except Exception:
+			print("Connection Error")
+			self.stats['frames_lost'] += 1
 
-	def sendFragmented(self, data, frameNumber, address, port):
-		"""Fragment and send large frames exceeding MTU."""
+	def noteSkippedFrames(self, frameNumber, address):
+		"""Tell the client about frames left out before this one, so it does not NACK them."""
+		last = self._lastSentFrame
+		self._lastSentFrame = frameNumber
+		# Legacy (version 1) clients do not demultiplex RTCP from RTP
+		if last is None or self.FRAG_VERSION != 2 or not 0 < frameNumber - last - 1 < 0x8000:
+			return
 		try:
-			frameSize = len(data)
-			numFragments = (frameSize + self.MTU - 1) // self.MTU 
+			self.clientInfo['rtpSocket'].sendto(buildSkipNotice(0, last + 1, frameNumber - last - 1), address)
+		except OSError:
+			pass
+	
+	def sendFragmented(self, data, frameNumber, address, port, timestamp=None):
+		"""Fragment and send large frames exceeding MTU; return True if parity was added."""
+		try:
+			if timestamp is None:
+				timestamp = self.rtpTimestamp(frameNumber)
+			packets = self.hintedFragments(data, frameNumber, timestamp)
+			numFragments = len(packets)
 			
-			for fragNum in range(numFragments):
-				# Calculate fragment boundaries
-				offset = fragNum * self.MTU
-				fragmentSize = min(self.MTU, frameSize - offset)
-				fragmentData = data[offset:offset + fragmentSize]
-				
-				# Create fragmentation header (6 bytes)
-				# Format: fragment_num (2), total_fragments (2), frame_size (2)
-				fragHeader = struct.pack('!HHH', 
-					fragNum,
-					numFragments,
-					frameSize & 0xFFFF  # Use lower 16 bits
-				)
-				
-				# Combine header + data
-				payload = fragHeader + fragmentData
-				
-				# Marker bit = 1 only for last fragment
-				marker = 1 if (fragNum == numFragments - 1) else 0
-				
-				# Create and send RTP packet
-				packet = self.makeRtp(payload, frameNumber, marker)
-				self.clientInfo['rtpSocket'].sendto(packet, (address, port))
-				
-				self.stats['fragments_sent'] += 1
-				self.stats['bytes_sent'] += len(packet)
+			# Until receiver reports arrive, estimate loss from the NACKs
+			# since the previous frame, as a share of its fragments
+			if 'reports' not in self.quality:
+				self.lossRate += (min(1.0, self._nackedFragments / numFragments) - self.lossRate) / 16.0
+			self._nackedFragments = 0
+			group = self.fecGroupSize()
+			if group:
+				packets = self.addParity(packets, data, frameNumber, timestamp, group)
+			packetBytes = sum(len(buf) for packet in packets for buf in packet)
 			
+			# All fragments of the frame in as few syscalls as the platform allows
+			self.stats['bytes_sent'] += self.sendPaced(packets, (address, port), packetBytes)
+			self.stats['fragments_sent'] += numFragments
 			self.stats['frames_sent'] += 1
+			return group > 0
 			
 		except Exception as e:
 			print(f"Fragmentation error: {e}")
 			self.stats['frames_lost'] += 1
+			return False
 
-	def makeRtp(self, payload, frameNbr, marker=0):
-		"""RTP-packetize the video data."""
-		version = 2
-		padding = 0
-		extension = 0
-		cc = 0
-		pt = 26  # MJPEG type
-		seqnum = frameNbr
-		ssrc = 0 
-		
-		rtpPacket = RtpPacket()
-		rtpPacket.encode(version, padding, extension, cc, seqnum, marker, pt, ssrc, payload)
+	def fecGroupSize(self):
+		"""Fragments per parity packet for the next frame (0 = no FEC)."""
+		if self.FRAG_VERSION != 2 or not self.FEC_GROUP:
+			return 0
+		if self.FEC_GROUP == FEC_AUTO:
+			if self.lossRate <= 0:
+				return FEC_MAX_GROUP
+			return max(FEC_MIN_GROUP, min(FEC_MAX_GROUP, int(FEC_TARGET / self.lossRate)))
+		return min(self.FEC_GROUP, MAX_PARITY_GROUP)
+
+	def addParity(self, packets, data, frameNumber, timestamp, group):
+		"""Insert an XOR parity packet after every group of fragments."""
+		view = memoryview(data)
+		numFragments = len(packets)
+		stride = HEADER_SIZE + FRAG_HEADER_V2.size
+		headers = bytearray(stride * ((numFragments + group - 1) // group))
+		result = []
+		for i, first in enumerate(range(0, numFragments, group)):
+			count = min(group, numFragments - first)
+			result.extend(packets[first:first + count])
+			
+			pos = i * stride
+			RtpPacket.packHeader(headers, pos, frameNumber, 0, RTP_PT_MJPEG, 0, timestamp)
+			packFragmentHeader(headers, pos + HEADER_SIZE, first, numFragments, len(data), first * self.MTU, parityFlags(count))
+			# Same size as a full fragment, so GSO batches are not split
+			parity = xorParity(view, first, count, self.MTU)
+			result.append((memoryview(headers)[pos:pos + stride], parity))
+			self.stats['fec_packets'] += 1
+			self.stats['fec_bytes'] += stride + len(parity)
+		return result
+
+	def buildFragments(self, data, frameNumber, timestamp, fragments=None, flags=0):
+		"""Packetize a frame (or only the given fragment numbers) as (header, payload) buffer pairs."""
+		return buildFragments(data, frameNumber, timestamp, self.MTU, self.FRAG_VERSION, fragments, flags)
+	
+	def hintedFragments(self, data, frameNumber, timestamp):
+		"""Packetize frame frameNumber of the file from its hint track, or like buildFragments without one."""
+		vs = self.clientInfo.get('videoStream')
+		if not self.HINT_TRACKS or vs is None:
+			return self.buildFragments(data, frameNumber, timestamp)
+		track = vs.hintTrack(self.MTU, self.FRAG_VERSION)
+		if track is None or not 0 < frameNumber <= len(track.index):
+			return self.buildFragments(data, frameNumber, timestamp)
+		hint = track.frame(frameNumber - 1)
+		if len(hint) != hintSize(len(data), self.MTU, self.FRAG_VERSION):
+			# Not the frame the track has at that position
+			return self.buildFragments(data, frameNumber, timestamp)
 		
-		return rtpPacket.getPacket()
+		# Every fragment but the last has the same RTP header
+		headers = self._hintHeaders
+		RtpPacket.packHeader(headers, 0, frameNumber, 0, RTP_PT_MJPEG, 0, timestamp)
+		RtpPacket.packHeader(headers, HEADER_SIZE, frameNumber, 1, RTP_PT_MJPEG, 0, timestamp)
+		headerView = memoryview(headers)
+		middle = headerView[:HEADER_SIZE]
+		stride = track.stride
+		last = (len(data) - 1) // self.MTU * stride
+		packets = [(middle, hint[pos:pos + stride]) for pos in range(0, last, stride)]
+		packets.append((headerView[HEADER_SIZE:], hint[last:]))
+		return packets
+
+	def sendPaced(self, packets, address, frameBytes):
+		"""Send a frame's packets in bursts spread over PACING_SPREAD of the frame interval."""
+		sender = self.rtpSender()
+		burst = self.PACING_BURST
+		if self.PACING_SPREAD <= 0 or len(packets) <= burst:
+			return sender.sendPackets(packets, address)
+
+		# Refill just fast enough to finish the frame within the spread window
+		rate = frameBytes / (self.frameInterval() * self.PACING_SPREAD)
+		burstBytes = burst * frameBytes / len(packets)
+		if self._bucket is None:
+			self._bucket = TokenBucket(rate, burstBytes)
+		else:
+			self._bucket.rate = rate
+			self._bucket.burst = burstBytes
+
+		event = self.clientInfo.get('event')
+		sent = 0
+		for i in range(0, len(packets), burst):
+			chunk = packets[i:i + burst]
+			wait = self._bucket.delay(sum(len(buf) for packet in chunk for buf in packet))
+			if wait > 0 and event is not None:
+				# Returns at once after PAUSE/TEARDOWN: the frame is finished unpaced
+				event.wait(wait)
+			sent += sender.sendPackets(chunk, address)
+		return sent
+
+	def rtpSender(self):
+		"""Return the batched sender bound to the current RTP socket/transport."""
+		sock = self.clientInfo['rtpSocket']
+		if self._rtpSender is None or self._rtpSender.sock is not sock:
+			self._rtpSender = RtpSender(sock)
+		return self._rtpSender
+
+	def makeRtpHeader(self, frameNbr, marker=0, timestamp=None):
+		"""Build only the 12-byte RTP header for a packet of this frame."""
+		if timestamp is None:
+			timestamp = self.rtpTimestamp(frameNbr)
+		return makeRtpHeader(frameNbr, marker, timestamp)
 
 	def _prefetch_frames(self):
 		"""Background thread that reads frames from VideoStream into a bounded queue."""
@@ -275,19 +1121,23 @@ class ServerWorker:
 				continue
 			# Put frame into queue (skip if full)
 			try:
-				self.frame_queue.put(frame, timeout=0.01)
+				self.frame_queue.put((vs.frameNbr(), frame, getattr(vs, 'rendition', None)), timeout=0.01)
 			except queue.Full:
 				pass
 		
-	def replyRtsp(self, code, seq):
-		"""Send RTSP reply to the client."""
-		if code == self.OK_200:
-			reply = 'RTSP/1.0 200 OK\nCSeq: ' + seq + '\nSession: ' + str(self.clientInfo['session'])
-			connSocket = self.clientInfo['rtspSocket'][0]
-			connSocket.send(reply.encode())
-		
-		elif code == self.FILE_NOT_FOUND_404:
-			print("404 NOT FOUND")
-		elif code == self.CON_ERR_500:
-			print("500 CONNECTION ERROR")
-	
\ No newline at end of file
+	def replyRtsp(self, code, seq, headers=None):
+		"""Send RTSP reply to the client; headers is a list of (name, value) after CSeq and Session."""
+		if code != self.OK_200:
+			print(f"{code} {REASONS[code].upper()}")
+		replyHeaders = []
+		if 'session' in self.clientInfo and code != self.SESSION_NOT_FOUND_454:
+			session = str(self.clientInfo['session'])
+			if self.SESSION_TIMEOUT:
+				session += f';timeout={self.SESSION_TIMEOUT:g}'
+			replyHeaders.append(('Session', session))
+		self.sendRtspReply(buildReply(code, seq, replyHeaders + (headers or [])))
+	
+	def sendRtspReply(self, data):
+		"""Write an encoded RTSP reply to the control connection."""
+		connSocket = self.clientInfo['rtspSocket'][0]
+		connSocket.send(data)
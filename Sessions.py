@@ -0,0 +1,85 @@
+import threading, time
+
+REAP_INTERVAL = 5.0  # Seconds between sweeps for timed-out sessions
+
+# Why sessions ended, and what closing them released
+CLOSE_REASONS = ('teardown', 'eof', 'error', 'timeout')
+RESOURCES = ('threads', 'sockets', 'files', 'broadcasts')
+REGISTRY_KEYS = tuple(f'closed_{reason}' for reason in CLOSE_REASONS) + tuple(f'reclaimed_{kind}' for kind in RESOURCES)
+
+class SessionRegistry:
+	"""Live sessions of one server process, and the totals of closed ones.
+
+	Sessions are added when their control connection is accepted and
+	removed by ServerWorker.close(), whatever ended them: TEARDOWN, EOF or
+	an error on the control connection, or SESSION_TIMEOUT seconds without
+	an RTSP request or RTCP packet (reap()). Counters of closed sessions
+	are folded into retired so process totals survive them, and each close
+	records the threads, sockets, file handles and broadcast subscriptions
+	it released.
+	"""
+
+	def __init__(self):
+		self._sessions = set()
+		self._lock = threading.Lock()
+		# Summed counters of closed sessions
+		self.retired = {}
+		self.stats = {key: 0 for key in ('opened',) + REGISTRY_KEYS}
+
+	def add(self, session):
+		with self._lock:
+			self._sessions.add(session)
+			self.stats['opened'] += 1
+
+	def remove(self, session, reason, reclaimed):
+		"""Forget a closed session; reclaimed counts what closing it released, per RESOURCES kind."""
+		with self._lock:
+			if session not in self._sessions:
+				return
+			self._sessions.discard(session)
+			for key, value in session.stats.items():
+				if isinstance(value, int):
+					self.retired[key] = self.retired.get(key, 0) + value
+			self.stats[f'closed_{reason}'] += 1
+			for kind in RESOURCES:
+				self.stats[f'reclaimed_{kind}'] += reclaimed.get(kind, 0)
+			live = len(self._sessions)
+		released = ', '.join(f"{reclaimed[kind]} {kind}" for kind in RESOURCES if reclaimed.get(kind))
+		print(f"[SESSION] {session.clientInfo.get('session', '-')} closed ({reason})"
+			  f"{': released ' + released if released else ''} | {live} live")
+
+	def sessions(self):
+		"""Snapshot of the live sessions."""
+		with self._lock:
+			return list(self._sessions)
+
+	def __len__(self):
+		with self._lock:
+			return len(self._sessions)
+
+	def reap(self, now=None):
+		"""Close sessions idle for longer than their timeout; return how many."""
+		if now is None:
+			now = time.monotonic()
+		expired = [session for session in self.sessions() if session.expired(now)]
+		for session in expired:
+			session.close('timeout')
+		return len(expired)
+
+	def runReaper(self, interval=REAP_INTERVAL):
+		"""Sweep for timed-out sessions forever (threaded engine)."""
+		while True:
+			time.sleep(interval)
+			if self.reap():
+				print(self.summary())
+
+	def snapshot(self):
+		with self._lock:
+			return dict(self.stats)
+
+	def summary(self):
+		"""One-line lifecycle report."""
+		snap = self.snapshot()
+		closed = ' '.join(f"{reason} {snap[f'closed_{reason}']}" for reason in CLOSE_REASONS)
+		reclaimed = ' '.join(f"{kind} {snap[f'reclaimed_{kind}']}" for kind in RESOURCES)
+		return f"[SESSIONS] {len(self)} live, {snap['opened']} opened | closed: {closed} | reclaimed: {reclaimed}"
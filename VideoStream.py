@@ -1,135 +1,93 @@
+import mmap, bisect
+
+from FrameIndex import FrameIndex
+from FrameCache import FrameCache
+from HintTrack import HintTrack
+
+DEFAULT_FPS = 30
+
 class VideoStream:
-	def __init__(self, filename):
+	def __init__(self, filename, fps=None):
 		self.filename = filename
 		try:
 			self.file = open(filename, 'rb')
+			# Frame offsets come from the (persisted) index, so frames are
+			# read by position instead of re-parsing the file from byte 0
+			self.index = FrameIndex.load(filename)
 		except:
 			raise IOError
 		self.frameNum = 0
-		# Auto-detect format on first read
-		self.format_type = None  # 'header' (10-byte) or 'raw' (pure JPEG stream)
-		
+		self.fps = fps or DEFAULT_FPS
+		self.format_type = self.index.formatType  # 'header' (10-byte) or 'raw' (pure JPEG stream)
+		self.cache = FrameCache.shared()
+		self._mmap = None
+		if len(self.index) > 0:
+			self._mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
 	def nextFrame(self):
 		"""Get next frame (handles both header-based and raw JPEG formats)."""
-		import re
-		
-		# Auto-detect format on first frame
-		if self.format_type is None:
-			self.format_type = self._detectFormat()
-		
-		if self.format_type == 'header':
-			return self._readHeaderedFrame()
-		else:  # 'raw'
-			return self._readRawJpegFrame()
-	
-	def _detectFormat(self):
-		"""Detect if file uses 10-byte headers or raw JPEG stream."""
-		pos = self.file.tell()
-		test = self.file.read(20)
-		self.file.seek(pos)
-		
-		if not test:
-			return 'raw'
-		
-		# Check if starts with JPEG marker (FFD8)
-		if test.startswith(b'\xFF\xD8'):
-			print("[FORMAT] Detected raw JPEG stream format")
-			return 'raw'
-		
-		# Check if starts with ASCII digits (10-byte header)
-		if test[0:1].isdigit() or test[0:1] in b' ':
-			try:
-				int(test[:10].decode('utf-8').strip())
-				print("[FORMAT] Detected 10-byte header format")
-				return 'header'
-			except:
-				pass
-		
-		# Default to raw JPEG if unsure
-		print("[FORMAT] Defaulting to raw JPEG format")
-		return 'raw'
-	
-	def _readHeaderedFrame(self):
-		"""Read frame with 10-byte ASCII length header."""
-		import re
-		
-		# Read header: 10-byte ASCII decimal
-		header = b''
-		while len(header) < 10:
-			chunk = self.file.read(10 - len(header))
-			if not chunk:
-				break
-			header += chunk
-
-		if not header:
+		if self.frameNum >= len(self.index):
 			return None
 
-		# Parse frame length robustly (strip whitespace)
-		try:
-			framelength = int(header.decode('utf-8').strip())
-		except (ValueError, UnicodeDecodeError):
-			# Fallback: extract first contiguous digit sequence
-			m = re.search(rb"(\d+)", header)
-			if not m:
-				print(f"[ERROR] Cannot parse frame length from header: {header}")
-				return None
-			framelength = int(m.group(1))
-
-		# Read the full frame
-		remaining = framelength
-		chunks = []
-		while remaining > 0:
-			chunk = self.file.read(remaining)
-			if not chunk:
-				break
-			chunks.append(chunk)
-			remaining -= len(chunk)
-
-		frameData = b''.join(chunks)
-		if len(frameData) == framelength:
-			self.frameNum += 1
-			return frameData
+		data = self.readFrame(self.frameNum)
+		self.frameNum += 1
+		return data
+
+	def readFrame(self, n):
+		"""Read zero-based frame n through the process-wide frame cache."""
+		return self.cache.get((self.index.key, n), lambda: self._readFrame(n))
+
+	def _readFrame(self, n):
+		"""Read zero-based frame n from disk with one positioned read."""
+		offset, length, _ = self.index.frame(n)
+		return self._mmap[offset:offset + length]
+
+	def hintTrack(self, mtu, fragVersion):
+		"""Prebuilt fragments of this file for the given payload size and header version, or None."""
+		return HintTrack.load(self.index, mtu, fragVersion)
+
+	def seek(self, n):
+		"""Position the stream so the next frame read is zero-based frame n."""
+		self.frameNum = max(0, min(n, len(self.index)))
+
+	def seekTime(self, seconds):
+		"""Position the stream at the frame shown at the given time; return that frame's time."""
+		if self.index.timestamps is not None:
+			n = bisect.bisect_right(self.index.timestamps, seconds) - 1
 		else:
-			print(f"[ERROR] Expected {framelength} bytes, got {len(frameData)}")
-			return None
-	
-	def _readRawJpegFrame(self):
-		"""Read raw JPEG frame from stream (FFD8...FFD9)."""
-		import re
-		
-		# Look for JPEG start marker (FFD8)
-		while True:
-			byte = self.file.read(1)
-			if not byte:
-				return None
-			
-			if byte == b'\xFF':
-				next_byte = self.file.read(1)
-				if not next_byte:
-					return None
-				
-				if next_byte == b'\xD8':  # Found SOI (start of image)
-					frame_data = byte + next_byte
-					
-					# Read until end of image (FFD9)
-					while True:
-						byte = self.file.read(1)
-						if not byte:
-							break
-						frame_data += byte
-						
-						if byte == b'\xFF':
-							next_byte = self.file.read(1)
-							if not next_byte:
-								break
-							frame_data += next_byte
-							
-							if next_byte == b'\xD9':  # Found EOI (end of image)
-								self.frameNum += 1
-								return frame_data
-		
-		return None
-		
+			n = int(seconds * self.fps)
+		self.seek(n)
+		return self.currentTime()
+
+	def frameTime(self, n):
+		"""Get presentation time in seconds of zero-based frame n."""
+		if self.index.timestamps is not None and 0 <= n < len(self.index):
+			return self.index.timestamps[n]
+		return n / self.fps
+
+	def currentTime(self):
+		"""Get presentation time in seconds of the next frame to be read."""
+		if self.index.timestamps is not None and self.frameNum < len(self.index):
+			return self.index.timestamps[self.frameNum]
+		return self.frameNum / self.fps
+
+	def frameCount(self):
+		"""Get total number of frames in the file."""
+		return len(self.index)
+
+	def duration(self):
+		"""Get stream duration in seconds."""
+		if self.index.timestamps is not None and len(self.index) > 0:
+			return self.index.timestamps[-1] + 1.0 / self.fps
+		return len(self.index) / self.fps
+
+	def close(self):
+		"""Release the memory map and file handle."""
+		if self._mmap is not None:
+			self._mmap.close()
+			self._mmap = None
+		self.file.close()
+
 	def frameNbr(self):
 		"""Get frame number."""
-		return self.frameNum
\ No newline at end of file
+		return self.frameNum
@@ -0,0 +1,65 @@
+"""Compare per-session sending with broadcast fan-out for many viewers of one file.
+
+Usage: python benchmarks/bench_broadcast.py [viewers] [frame_kb] [frames]
+
+Every viewer is an unread UDP socket on localhost. "sessions" packetizes
+each frame once per viewer, as independent ServerWorker sessions do;
+"broadcast" packetizes it once and sends the same buffers to every viewer,
+as Broadcast does. CPU per viewer-frame is what each extra viewer costs.
+"""
+import os, sys, socket, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from RtpSender import RtpSender
+from ServerWorker import ServerWorker
+from Packetizer import buildFragments, openRtpSocket
+
+def run(name, sendFrame, frames, viewers):
+	cpu = time.process_time()
+	wall = time.perf_counter()
+	for n in range(frames):
+		sendFrame(n)
+	cpu = time.process_time() - cpu
+	wall = time.perf_counter() - wall
+	perViewer = cpu / (frames * viewers) * 1e6
+	print(f"{name:<10} {frames * viewers / wall:>10.0f} viewer-frames/s {perViewer:>10.1f} us CPU/viewer-frame")
+	return perViewer
+
+def main():
+	viewers = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+	frameKb = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+	frames = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+	data = os.urandom(frameKb * 1024)
+
+	sinks = []
+	for _ in range(viewers):
+		sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		sink.bind(('127.0.0.1', 0))
+		sinks.append(sink)
+	addresses = [sink.getsockname() for sink in sinks]
+
+	print(f"{viewers} viewers, frame {frameKb} KB, MTU {ServerWorker.MTU}, {frames} frames")
+
+	mtu = ServerWorker.MTU
+
+	# One packetizer and socket per viewer
+	senders = [RtpSender(openRtpSocket()) for _ in addresses]
+
+	def perSession(n):
+		for sender, address in zip(senders, addresses):
+			sender.sendPackets(buildFragments(data, n, n * 3000, mtu), address)
+	base = run('sessions', perSession, frames, viewers)
+
+	# One packetizer and socket for everyone
+	sender = RtpSender(openRtpSocket())
+
+	def fanOut(n):
+		packets = buildFragments(data, n, n * 3000, mtu)
+		for address in addresses:
+			sender.sendPackets(packets, address)
+	cost = run('broadcast', fanOut, frames, viewers)
+	print(f"{'':<10} {base / cost:.2f}x less CPU per viewer ({sender.mode()})")
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,110 @@
+"""Run congestion control against an emulated bottleneck and print how it converges.
+
+Usage: python benchmarks/bench_congestion.py [capacity_kbps] [seconds] [frame_kb]
+
+Simulated in virtual time: a 30 fps stream of frame_kb frames is sent
+through a drop-tail FIFO link of capacity_kbps (halved halfway through)
+with 20 ms of propagation delay. The receiver runs the client's
+DelayBasedEstimator, the sender the server's SendRateController, and
+feedback (RR loss, delivered rate, REMB) travels back once a second, or
+at once when the estimate falls, as it does between Client and
+ServerWorker.
+"""
+import os, sys, heapq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Congestion import DelayBasedEstimator, SendRateController
+from ServerWorker import ServerWorker, RTP_CLOCK_RATE
+from PathMtu import ETHERNET_MTU, payloadSize
+
+FPS = 30
+PROPAGATION = 0.020
+QUEUE_LIMIT = 64 * 1024  # Bottleneck buffer in bytes
+REPORT_INTERVAL = 1.0
+REMB_MIN_INTERVAL = 0.1
+PACKET_OVERHEAD = 12 + 14  # RTP + fragmentation headers
+
+def main():
+	capacity = float(sys.argv[1]) * 1000 if len(sys.argv) > 1 else 4000e3
+	seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 60
+	frameBytes = int(sys.argv[3]) * 1024 if len(sys.argv) > 3 else 40 * 1024
+	# Fragments as sized for an Ethernet path
+	mtu = payloadSize(ETHERNET_MTU, ServerWorker.FRAG_VERSION)
+
+	estimator = DelayBasedEstimator()
+	controller = SendRateController(clock=lambda: 0.0)
+	events = []
+	order = 0
+
+	def schedule(when, kind, *args):
+		nonlocal order
+		heapq.heappush(events, (when, order, kind, args))
+		order += 1
+
+	linkFree = 0.0
+	expected = received = receivedBytes = 0
+	lastRemb = -1.0
+	queueDelay = 0.0
+	print(f"Source {frameBytes * 8 * FPS / 1000:.0f} kbit/s at {FPS} fps, bottleneck {capacity / 1000:.0f} kbit/s "
+		  f"(halved at {seconds / 2:.0f}s), MTU {mtu}")
+	print(f"{'time':>5} {'link':>8} {'estimate':>9} {'remb':>8} {'sending':>8} {'fps':>5} {'queue ms':>9} {'loss':>6}")
+
+	schedule(0.0, 'frame', 0)
+	schedule(REPORT_INTERVAL, 'report')
+	while events:
+		now, _, kind, args = heapq.heappop(events)
+		if now > seconds:
+			break
+		link = capacity if now < seconds / 2 else capacity / 2
+
+		if kind == 'frame':
+			n = args[0]
+			schedule(now + 1.0 / FPS, 'frame', n + 1)
+			if not controller.admit(frameBytes, now):
+				continue
+			timestamp = int(n * RTP_CLOCK_RATE / FPS)
+			# Standing queue the frame finds, not the wait its own burst adds
+			queueDelay = max(0.0, linkFree - now)
+			for offset in range(0, frameBytes, mtu):
+				size = min(mtu, frameBytes - offset) + PACKET_OVERHEAD
+				expected += 1
+				backlog = (linkFree - now) * link / 8 if linkFree > now else 0
+				if backlog + size > QUEUE_LIMIT:
+					continue  # Drop-tail
+				linkFree = max(linkFree, now) + size * 8 / link
+				received += 1
+				schedule(linkFree + PROPAGATION, 'arrival', timestamp, size)
+
+		elif kind == 'arrival':
+			receivedBytes += args[1]
+			estimator.onPacket(args[0], args[1], now)
+			if estimator.urgent() and now - lastRemb >= REMB_MIN_INTERVAL:
+				lastRemb = now
+				estimator.markReported()
+				schedule(now + PROPAGATION, 'remb', estimator.estimate)
+
+		elif kind == 'remb':
+			controller.onRemb(args[0], now)
+
+		elif kind == 'report':
+			schedule(now + REPORT_INTERVAL, 'report')
+			loss = 1 - received / expected if expected else 0.0
+			controller.onDelivered(receivedBytes * 8 / REPORT_INTERVAL)
+			expected = received = receivedBytes = 0
+			controller.onLoss(loss, now + PROPAGATION)
+			if estimator.estimate is not None:
+				lastRemb = now
+				estimator.markReported()
+				controller.onRemb(estimator.estimate, now + PROPAGATION)
+			target = controller.target() or 0
+			print(f"{now:>5.0f} {link / 1000:>8.0f} {target / 1000:>9.0f} {(estimator.estimate or 0) / 1000:>8.0f} "
+				  f"{controller.sendRate(now) / 1000:>8.0f} {controller.frameRate(now):>5.1f} "
+				  f"{queueDelay * 1000:>9.1f} {loss * 100:>5.1f}%")
+
+	print(f"Shed {controller.stats['frames_shed']} of "
+		  f"{controller.stats['frames_shed'] + controller.stats['frames_admitted']} frames, "
+		  f"{controller.stats['decreases']} decreases")
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,68 @@
+"""Compare frame loss with the fixed fragment size and with path-MTU sizing.
+
+Usage: python benchmarks/bench_mtu.py [frame_kb] [frames] [link_mtu]
+
+Simulates a link of link_mtu bytes (default Ethernet) that drops each IP
+packet independently. A fragment packet larger than the link MTU is split
+into IP fragments, and losing any one of them loses the whole datagram, so
+the fixed MTU = 2000 payload loses more fragments than a payload sized with
+PathMtu.payloadSize. No retransmission or FEC: this is the raw loss the
+receiver would have to repair. Also prints the route MTU of this host.
+"""
+import os, sys, random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ServerWorker import ServerWorker
+from PathMtu import IP_HEADER, UDP_HEADER, ETHERNET_MTU, payloadSize, routeMtu
+from RtpPacket import HEADER_SIZE
+from Fragmentation import fragHeaderSize
+
+LOSS_RATES = (0.001, 0.005, 0.01, 0.02, 0.05)
+
+def ipPackets(payload, linkMtu, fragVersion):
+	"""IP packets carrying one fragment datagram over a link of linkMtu bytes."""
+	udp = payload + HEADER_SIZE + fragHeaderSize(fragVersion) + UDP_HEADER
+	perFragment = (linkMtu - IP_HEADER) // 8 * 8
+	return (udp + perFragment - 1) // perFragment
+
+def simulate(frameBytes, payload, linkMtu, loss, frames, fragVersion, rng):
+	"""Return (fragment loss, frame loss, IP packets per frame) over frames frames."""
+	fragments = (frameBytes + payload - 1) // payload
+	last = frameBytes - (fragments - 1) * payload
+	full = ipPackets(payload, linkMtu, fragVersion)
+	tail = ipPackets(last, linkMtu, fragVersion)
+	lostFragments = lostFrames = 0
+	for _ in range(frames):
+		lost = 0
+		for n in range(fragments):
+			packets = full if n < fragments - 1 else tail
+			if any(rng.random() < loss for _ in range(packets)):
+				lost += 1
+		lostFragments += lost
+		lostFrames += lost > 0
+	return lostFragments / (fragments * frames), lostFrames / frames, full * (fragments - 1) + tail
+
+def main():
+	frameBytes = int(sys.argv[1]) * 1024 if len(sys.argv) > 1 else 100 * 1024
+	frames = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+	linkMtu = int(sys.argv[3]) if len(sys.argv) > 3 else ETHERNET_MTU
+	fragVersion = ServerWorker.FRAG_VERSION
+	fixed = ServerWorker.MTU
+	sized = payloadSize(linkMtu, fragVersion)
+	rng = random.Random(1)
+
+	print(f"Route MTU to 127.0.0.1: {routeMtu(('127.0.0.1', 9))}, to 192.0.2.1: {routeMtu(('192.0.2.1', 9))}")
+	print(f"Frame {frameBytes // 1024} KB over a {linkMtu}-byte link, {frames} frames per loss rate")
+	print(f"fixed: {fixed}-byte payload, {ipPackets(fixed, linkMtu, fragVersion)} IP packets per fragment | "
+		  f"path: {sized}-byte payload, {ipPackets(sized, linkMtu, fragVersion)} IP packet per fragment")
+	print(f"{'IP loss':>8} | {'fixed frag loss':>15} {'frame loss':>10} | {'path frag loss':>14} {'frame loss':>10} | "
+		  f"{'IP pkts/frame':>15}")
+	for loss in LOSS_RATES:
+		fixedFrag, fixedFrame, fixedPackets = simulate(frameBytes, fixed, linkMtu, loss, frames, fragVersion, rng)
+		sizedFrag, sizedFrame, sizedPackets = simulate(frameBytes, sized, linkMtu, loss, frames, fragVersion, rng)
+		print(f"{loss * 100:>7.1f}% | {fixedFrag * 100:>14.2f}% {fixedFrame * 100:>9.1f}% | "
+			  f"{sizedFrag * 100:>13.2f}% {sizedFrame * 100:>9.1f}% | {fixedPackets:>6} vs {sizedPackets:<6}")
+
+if __name__ == '__main__':
+	main()
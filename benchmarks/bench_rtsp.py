@@ -0,0 +1,119 @@
+"""Fuzz the incremental RTSP parser and measure its throughput.
+
+Usage: python benchmarks/bench_rtsp.py [rounds] [messages]
+
+Fuzz: each round writes a random batch of requests (CRLF or LF line
+endings, shuffled and extra headers, optional bodies, blank lines between
+messages), cuts the byte stream at random points and feeds the pieces to
+one parser. Every message must come back whole and in order. Then random
+byte mutations of the stream must either parse or raise RtspError, never
+anything else.
+
+Throughput: messages per second for the whole stream in one read, one
+message per read, and 16-byte reads. Also prints the old split-and-index
+parse of one message per read for comparison; that parse could not handle
+the other two cases.
+"""
+import os, sys, random, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Rtsp import RtspParser, RtspError, buildRequest
+
+METHODS = ('SETUP', 'PLAY', 'PAUSE', 'TEARDOWN', 'OPTIONS', 'GET_PARAMETER')
+
+def randomRequest(rng, cseq):
+	"""Return (encoded request, method, headers, body)."""
+	method = rng.choice(METHODS)
+	headers = [('Session', str(rng.randint(100000, 999999))),
+			   ('Transport', f"RTP/UDP; client_port= {rng.randint(1024, 65535)}; mtu=1500")]
+	if rng.random() < 0.5:
+		headers.append(('Range', f"npt={rng.uniform(0, 100):.3f}-"))
+	if rng.random() < 0.3:
+		headers.append(('User-Agent', 'bench' + 'x' * rng.randint(0, 200)))
+	rng.shuffle(headers)
+	body = bytes(rng.randrange(256) for _ in range(rng.randint(1, 64))) if rng.random() < 0.2 else b''
+	data = buildRequest(method, f"media/{cseq}.mjpeg", cseq, headers, body)
+	if rng.random() < 0.5:
+		data = data[:len(data) - len(body)].replace(b'\r\n', b'\n') + body
+	if rng.random() < 0.2:
+		data = b'\r\n' + data
+	return data, method, headers, body
+
+def cuts(rng, data):
+	"""Split data into random-length pieces."""
+	pieces, pos = [], 0
+	while pos < len(data):
+		size = rng.choice((1, 2, 3, 7, 64, 256, 4096))
+		pieces.append(data[pos:pos + size])
+		pos += size
+	return pieces
+
+def fuzz(rounds, rng):
+	checked = mutated = rejected = 0
+	for _ in range(rounds):
+		batch = [randomRequest(rng, cseq) for cseq in range(1, rng.randint(1, 20) + 1)]
+		stream = b''.join(data for data, _, _, _ in batch)
+		parser = RtspParser()
+		messages = []
+		for piece in cuts(rng, stream):
+			messages += parser.feed(piece)
+		assert len(messages) == len(batch) and parser.pending == 0, (len(messages), len(batch), parser.pending)
+		for cseq, (message, (_, method, headers, body)) in enumerate(zip(messages, batch), 1):
+			assert message.method == method and message.cseq == str(cseq) and message.body == body
+			for name, value in headers:
+				assert message.header(name.upper()) == value, (name, message.header(name), value)
+			checked += 1
+
+		broken = bytearray(stream)
+		for _ in range(rng.randint(1, 8)):
+			broken[rng.randrange(len(broken))] = rng.randrange(256)
+		parser = RtspParser()
+		try:
+			for piece in cuts(rng, bytes(broken)):
+				parser.feed(piece)
+		except RtspError:
+			rejected += 1
+		mutated += 1
+	return checked, mutated, rejected
+
+def legacyParse(data):
+	"""The parse this project did before the codec: split one read and index fixed lines."""
+	request = data.decode('utf-8').split('\n')
+	line1 = request[0].split(' ')
+	return line1[0], line1[1], request[1].split(' ')[1]
+
+def rate(count, run):
+	start = time.perf_counter()
+	run()
+	return count / (time.perf_counter() - start)
+
+def main():
+	rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+	count = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+	rng = random.Random(1)
+
+	checked, mutated, rejected = fuzz(rounds, rng)
+	print(f"Fuzz: {checked} messages over {rounds} randomly cut streams parsed intact; "
+		  f"{mutated} mutated streams, {rejected} rejected with RtspError, none crashed")
+
+	requests = [randomRequest(rng, cseq)[0] for cseq in range(1, count + 1)]
+	stream = b''.join(requests)
+	small = [stream[pos:pos + 16] for pos in range(0, len(stream), 16)]
+	plain = [buildRequest('PLAY', 'media.mjpeg', cseq, [('Session', '123456')]).replace(b'\r\n', b'\n').rstrip(b'\n')
+			 for cseq in range(1, count + 1)]
+
+	def feedAll(pieces):
+		parser = RtspParser()
+		for piece in pieces:
+			parser.feed(piece)
+		assert parser.stats['messages'] == count
+
+	print(f"Throughput, {count} requests ({len(stream) / count:.0f} bytes each on average):")
+	print(f"  pipelined, one read          {rate(count, lambda: feedAll([stream])):>10,.0f} msg/s")
+	print(f"  one message per read         {rate(count, lambda: feedAll(requests)):>10,.0f} msg/s")
+	print(f"  16-byte reads                {rate(count, lambda: feedAll(small)):>10,.0f} msg/s")
+	print(f"  old split/index, one per read {rate(count, lambda: [legacyParse(p) for p in plain]):>9,.0f} msg/s")
+
+if __name__ == '__main__':
+	main()
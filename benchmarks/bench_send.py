@@ -0,0 +1,117 @@
+"""Compare the legacy per-fragment send path with the zero-copy and hinted RtpSender paths.
+
+Usage: python benchmarks/bench_send.py [frame_kb] [frames]
+
+Frames are sent to an unread UDP socket on localhost, so the numbers
+measure server-side packetization and syscall cost only. "hinted" sends
+from a prebuilt hint (HintTrack), writing only two RTP headers per frame.
+"""
+import os, sys, socket, struct, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from RtpPacket import RtpPacket, HEADER_SIZE
+from RtpSender import RtpSender
+from ServerWorker import ServerWorker
+from Fragmentation import FRAG_HEADER_V2, packFragmentHeader
+from HintTrack import buildHint
+
+MTU = ServerWorker.MTU
+
+def makeRtp(payload, frameNbr, marker):
+	rtpPacket = RtpPacket()
+	rtpPacket.encode(2, 0, 0, 0, frameNbr, marker, 26, 0, payload)
+	return rtpPacket.getPacket()
+
+def legacySend(sock, address, data, frameNumber):
+	"""The original sendFragmented: slice copy, header concat, packet concat, sendto."""
+	frameSize = len(data)
+	numFragments = (frameSize + MTU - 1) // MTU
+	for fragNum in range(numFragments):
+		offset = fragNum * MTU
+		fragmentData = data[offset:offset + min(MTU, frameSize - offset)]
+		payload = struct.pack('!HHH', fragNum, numFragments, frameSize & 0xFFFF) + fragmentData
+		packet = makeRtp(payload, frameNumber, 1 if fragNum == numFragments - 1 else 0)
+		sock.sendto(packet, address)
+	return numFragments
+
+def zeroCopySend(sender, address, data, frameNumber):
+	"""The new path: shared header buffer, memoryview fragments gathered by sendmsg/GSO."""
+	frameSize = len(data)
+	numFragments = (frameSize + MTU - 1) // MTU
+	view = memoryview(data)
+	stride = HEADER_SIZE + FRAG_HEADER_V2.size
+	headers = bytearray(stride * numFragments)
+	headerView = memoryview(headers)
+	timestamp = int(time.time())
+	packets = []
+	for fragNum in range(numFragments):
+		offset = fragNum * MTU
+		pos = fragNum * stride
+		RtpPacket.packHeader(headers, pos, frameNumber, 1 if fragNum == numFragments - 1 else 0, 26, 0, timestamp)
+		packFragmentHeader(headers, pos + HEADER_SIZE, fragNum, numFragments, frameSize, offset)
+		packets.append((headerView[pos:pos + stride], view[offset:offset + min(MTU, frameSize - offset)]))
+	sender.sendPackets(packets, address)
+	return numFragments
+
+def hintedSend(sender, address, data, hint, headers, frameNumber):
+	"""The hint track path: fragments are slices of the prebuilt hint, two RTP headers per frame."""
+	numFragments = (len(data) + MTU - 1) // MTU
+	timestamp = int(time.time())
+	RtpPacket.packHeader(headers, 0, frameNumber, 0, 26, 0, timestamp)
+	RtpPacket.packHeader(headers, HEADER_SIZE, frameNumber, 1, 26, 0, timestamp)
+	headerView = memoryview(headers)
+	middle = headerView[:HEADER_SIZE]
+	stride = FRAG_HEADER_V2.size + MTU
+	last = (numFragments - 1) * stride
+	packets = [(middle, hint[pos:pos + stride]) for pos in range(0, last, stride)]
+	packets.append((headerView[HEADER_SIZE:], hint[last:]))
+	sender.sendPackets(packets, address)
+	return numFragments
+
+def run(name, sendFrame, data, frames):
+	packets = 0
+	wall = time.perf_counter()
+	cpu = time.process_time()
+	for n in range(frames):
+		packets += sendFrame(data, n)
+	cpu = time.process_time() - cpu
+	wall = time.perf_counter() - wall
+	print(f"{name:<10} {frames / wall:>10.0f} frames/s {packets / wall:>12.0f} pkts/s "
+		  f"{cpu / frames * 1e6:>10.1f} us CPU/frame")
+	return cpu / frames
+
+def main():
+	frameKb = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+	frames = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+	data = os.urandom(frameKb * 1024)
+
+	sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	sink.bind(('127.0.0.1', 0))
+	address = sink.getsockname()
+
+	sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 16*1024*1024)
+
+	print(f"Frame {frameKb} KB, MTU {MTU}, {(len(data) + MTU - 1) // MTU} fragments/frame, {frames} frames")
+	base = run('legacy', lambda d, n: legacySend(sock, address, d, n), data, frames)
+
+	sender = RtpSender(sock, useGso=False)
+	if sender.canSendmsg:
+		cost = run('sendmsg', lambda d, n: zeroCopySend(sender, address, d, n), data, frames)
+		print(f"{'':<10} {base / cost:.2f}x less CPU per frame than legacy")
+
+	sender = RtpSender(sock)
+	if sender.gso:
+		cost = run('gso', lambda d, n: zeroCopySend(sender, address, d, n), data, frames)
+		print(f"{'':<10} {base / cost:.2f}x less CPU per frame than legacy, "
+			  f"{sender.stats['packets'] / max(1, sender.stats['syscalls']):.1f} packets/syscall ({sender.mode()})")
+
+	if sender.canSendmsg:
+		hint = memoryview(buildHint(data, MTU))
+		headers = bytearray(2 * HEADER_SIZE)
+		hinted = run('hinted', lambda d, n: hintedSend(sender, address, d, hint, headers, n), data, frames)
+		print(f"{'':<10} {cost / hinted:.2f}x less CPU per frame than {sender.mode()} without hints")
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,67 @@
+import pytest
+
+from Broadcast import Broadcast
+from ServerWorker import ServerWorker
+
+JPEG = b'\xFF\xD8' + b'\xFF\xE0\x00\x04\x00\x00' + b'\xFF\xD9'
+
+class Viewer:
+	def __init__(self):
+		self.stats = {'bytes_sent': 0, 'fragments_sent': 0, 'frames_sent': 0}
+
+@pytest.fixture
+def movie(tmp_path):
+	path = tmp_path / 'movie.mjpeg'
+	path.write_bytes(JPEG * 10)
+	return str(path)
+
+def join(movie, fps=None, multicast=None):
+	viewer = Viewer()
+	return viewer, Broadcast.join(viewer, movie, ('127.0.0.1', 9), fps, multicast)
+
+def test_viewers_with_the_same_settings_share_a_broadcast(movie):
+	first, broadcast = join(movie, 30)
+	second, shared = join(movie)  # No rate is the default rate
+	try:
+		assert shared is broadcast
+		assert broadcast.viewers() == 2
+	finally:
+		broadcast.leave(first)
+		broadcast.leave(second)
+	assert broadcast.key not in Broadcast._active
+
+def test_other_frame_rate_gets_its_own_broadcast(movie):
+	first, slow = join(movie, 10)
+	second, fast = join(movie, 60)
+	try:
+		assert slow is not fast
+		assert slow.stream.fps == 10 and fast.stream.fps == 60
+	finally:
+		slow.leave(first)
+		fast.leave(second)
+
+def test_multicast_group_is_not_shared_by_two_streams(movie):
+	group = ('239.255.0.1', 5004)
+	first, multicast = join(movie, 30, group)
+	try:
+		second, unicast = join(movie, 30)
+		assert unicast is not multicast
+		unicast.leave(second)
+		with pytest.raises(ValueError):
+			join(movie, 60, group)
+	finally:
+		multicast.leave(first)
+
+def test_frames_are_packetized_like_a_session_does(movie):
+	viewer, broadcast = join(movie)
+	try:
+		worker = ServerWorker({})
+		worker.MTU = broadcast.mtu
+		data = bytes(range(256)) * 40
+		built = [bytes(h) + bytes(p) for h, p in broadcast.packetize(data, 7, 900)]
+		assert built == [bytes(h) + bytes(p) for h, p in worker.buildFragments(data, 7, 900)]
+		# A frame that fits is one RTP packet with the marker set
+		(header, payload), = broadcast.packetize(JPEG, 8, 900)
+		assert bytes(payload) == JPEG and header[1] & 0x80
+	finally:
+		broadcast.leave(viewer)
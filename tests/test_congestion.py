@@ -0,0 +1,106 @@
+import random
+
+from Congestion import DelayBasedEstimator, SendRateController, RTP_CLOCK_RATE, MIN_BITRATE
+
+FPS = 30
+PACKET_SIZE = 1200
+PROPAGATION = 0.020
+QUEUE_LIMIT = 64 * 1024
+
+def simulate(capacity, seconds, frameBytes=40 * 1024, jitter=0.0, change=None, seed=1):
+	"""Run estimator and controller over a drop-tail bottleneck in virtual time.
+
+	A 30 fps source of frameBytes frames goes through SendRateController,
+	whose shed frames never reach the link; the receiver's estimate travels
+	back at once, with loss and delivered rate once a second, as between
+	Client and ServerWorker. change is an optional (time, capacity) step in
+	the link rate. Returns (time, estimate) once per frame.
+	"""
+	rng = random.Random(seed)
+	estimator = DelayBasedEstimator()
+	controller = SendRateController()
+	linkFree = 0.0
+	arrivals = []
+	samples = []
+	expected = received = receivedBytes = 0
+	for n in range(int(seconds * FPS)):
+		now = n / FPS
+		if change is not None and now >= change[0]:
+			capacity = change[1]
+		if n and n % FPS == 0:
+			controller.onDelivered(receivedBytes * 8)
+			controller.onLoss(1 - received / expected if expected else 0.0, now)
+			expected = received = receivedBytes = 0
+		if estimator.estimate is not None:
+			controller.onRemb(estimator.estimate, now)
+
+		if controller.admit(frameBytes, now):
+			timestamp = n * RTP_CLOCK_RATE // FPS
+			for offset in range(0, frameBytes, PACKET_SIZE):
+				size = min(PACKET_SIZE, frameBytes - offset)
+				expected += 1
+				backlog = (linkFree - now) * capacity / 8 if linkFree > now else 0
+				if backlog + size > QUEUE_LIMIT:
+					continue
+				linkFree = max(linkFree, now) + size * 8 / capacity
+				received += 1
+				receivedBytes += size
+				arrivals.append((linkFree + PROPAGATION + rng.uniform(0, jitter), timestamp, size))
+
+		# Deliver everything that arrives before the next frame is due
+		arrivals.sort()
+		horizon = (n + 1) / FPS
+		while arrivals and arrivals[0][0] < horizon:
+			arrival, ts, size = arrivals.pop(0)
+			estimator.onPacket(ts, size, arrival)
+		samples.append((now, estimator.estimate))
+	return samples
+
+def mean(samples, start, end):
+	values = [estimate for t, estimate in samples if start <= t < end]
+	return sum(values) / len(values)
+
+def test_estimate_settles_near_bottleneck():
+	samples = simulate(4e6, 40)
+	assert 0.75 * 4e6 <= mean(samples, 30, 40) <= 1.1 * 4e6
+
+def test_estimate_follows_capacity_drop():
+	samples = simulate(4e6, 60, change=(30, 2e6))
+	assert 0.75 * 4e6 <= mean(samples, 20, 30) <= 1.1 * 4e6
+	# Overuse is caught within a couple of seconds of the drop
+	assert max(estimate for t, estimate in samples if 32 <= t < 60) <= 1.1 * 2e6
+	assert mean(samples, 45, 60) >= 0.75 * 2e6
+
+def test_jitter_alone_is_not_overuse():
+	# 2.4 Mbit/s with up to 5 ms of random delay per packet, on a link with plenty of headroom
+	samples = simulate(20e6, 30, frameBytes=10000, jitter=0.005)
+	assert min(estimate for t, estimate in samples if t >= 5) >= 0.9 * 2.4e6
+
+def test_estimate_bounded_by_received_rate():
+	estimator = DelayBasedEstimator()
+	now = 0.0
+	# A sender limited to 1 Mbit/s on an empty path: probing may not run away
+	for n in range(30 * 20):
+		now = n / FPS
+		estimator.onPacket(n * RTP_CLOCK_RATE // FPS, int(1e6 / 8 / FPS), now)
+	assert estimator.estimate <= 1.3 * estimator.receivedRate()
+
+def test_controller_sheds_frames_to_target():
+	controller = SendRateController()
+	controller.onRemb(1e6, now=0.0)
+	frameBytes = 10000  # 2.4 Mbit/s at 30 fps
+	for n in range(30 * 10):
+		controller.admit(frameBytes, now=n / FPS)
+	admitted = controller.stats['frames_admitted'] * frameBytes * 8 / 10
+	assert 0.9e6 <= admitted <= 1.1e6
+	assert controller.stats['frames_shed'] > 0
+
+def test_controller_loss_backoff_and_floor():
+	controller = SendRateController()
+	for n in range(30):
+		controller.admit(20000, now=n / FPS)
+	controller.onLoss(0.5, now=1.0)
+	assert controller.target() < controller.sendRate(1.0)
+	for _ in range(50):
+		controller.onLoss(1.0, now=1.0)
+	assert controller.target() == MIN_BITRATE
@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from Fragmentation import FrameAssembler, FLAG_PARITY, fragmentInfo, xorParity
+from RtpPacket import HEADER_SIZE
+from ServerWorker import ServerWorker
+
+MTU = 1000
+
+def packets(data, group, frameNumber=1):
+	"""Fragment and parity payloads in send order, as the server builds them with FEC."""
+	worker = ServerWorker({})
+	worker.MTU = MTU
+	worker.FRAG_VERSION = 2
+	built = worker.buildFragments(data, frameNumber, 0)
+	built = worker.addParity(built, data, frameNumber, 0, group)
+	return [bytes(header[HEADER_SIZE:]) + bytes(payload) for header, payload in built]
+
+def isParity(payload):
+	return bool(fragmentInfo(payload)[0] & FLAG_PARITY)
+
+@pytest.fixture
+def frame():
+	rng = random.Random(1)
+	# Not a multiple of MTU, so the last fragment is short and zero-padded in parity
+	return bytes(rng.randrange(256) for _ in range(7321))
+
+def test_parity_is_xor_of_padded_fragments():
+	data = bytes([1, 2, 3, 4, 5])
+	assert xorParity(memoryview(data), 0, 2, 2) == bytes([1 ^ 3, 2 ^ 4])
+	# The short last fragment counts as zero-padded
+	assert xorParity(memoryview(data), 1, 2, 2) == bytes([3 ^ 5, 4])
+	# Fragments past the end contribute nothing
+	assert xorParity(memoryview(data), 2, 4, 2) == bytes([5, 0])
+
+def test_one_parity_packet_per_group(frame):
+	payloads = packets(frame, 3)
+	assert [isParity(p) for p in payloads] == [False] * 3 + [True] + [False] * 3 + [True] + [False] * 2 + [True]
+
+@pytest.mark.parametrize('lost', range(8))
+def test_any_single_lost_fragment_is_recovered(frame, lost):
+	assembler = FrameAssembler()
+	data = [p for p in packets(frame, 4) if not isParity(p)]
+	results = [assembler.addFragment(1, p, 0.0) for p in packets(frame, 4) if p != data[lost]]
+	complete = [r for r in results if r is not None]
+	assert len(complete) == 1 and bytes(complete[0]) == frame
+	assert assembler.stats['fec_recovered'] == 1
+
+def test_parity_before_the_data(frame):
+	assembler = FrameAssembler()
+	payloads = packets(frame, 8)
+	parity = [p for p in payloads if isParity(p)]
+	data = [p for p in payloads if not isParity(p)]
+	for p in parity:
+		assert assembler.addFragment(1, p, 0.0) is None
+	results = [assembler.addFragment(1, p, 0.0) for p in data[1:]]
+	assert bytes(results[-1]) == frame
+
+def test_two_losses_in_a_group_are_not_recovered(frame):
+	assembler = FrameAssembler()
+	payloads = packets(frame, 4)
+	data = [p for p in payloads if not isParity(p)]
+	results = [assembler.addFragment(1, p, 0.0) for p in payloads if p not in (data[0], data[1])]
+	assert all(r is None for r in results)
+	assert assembler.pending[1].missing() == [0, 1]
+	assert assembler.stats['fec_recovered'] == 0
+	# Retransmission of one of them completes the frame through the kept parity
+	assert bytes(assembler.addFragment(1, data[0], 0.0)) == frame
+
+def test_parity_after_completion_is_ignored(frame):
+	assembler = FrameAssembler()
+	payloads = packets(frame, 4)
+	for p in payloads[:-1]:
+		assembler.addFragment(1, p, 0.0)
+	assert assembler.stats['frames_completed'] == 1
+	assert assembler.addFragment(1, payloads[-1], 0.0) is None
+	assert not assembler.pending
@@ -0,0 +1,99 @@
+import random
+
+import pytest
+
+from Fragmentation import FrameAssembler, FRAG_HEADER_V2, fragmentInfo, isWholeFrame, packFragmentHeader
+from RtpPacket import HEADER_SIZE
+from ServerWorker import ServerWorker
+
+MTU = 1000
+
+def fragments(data, fragVersion=2, frameNumber=1):
+	"""Fragment payloads (fragmentation header + data) as the server sends them."""
+	worker = ServerWorker({})
+	worker.MTU = MTU
+	worker.FRAG_VERSION = fragVersion
+	return [bytes(header[HEADER_SIZE:]) + bytes(payload) for header, payload in worker.buildFragments(data, frameNumber, 0)]
+
+@pytest.fixture
+def frame():
+	rng = random.Random(1)
+	return bytes(rng.randrange(256) for _ in range(4500))
+
+@pytest.mark.parametrize('fragVersion', [1, 2])
+def test_reassembles_in_order(frame, fragVersion):
+	assembler = FrameAssembler()
+	payloads = fragments(frame, fragVersion)
+	assert len(payloads) == 5
+	results = [assembler.addFragment(1, payload, 0.0) for payload in payloads]
+	assert results[:-1] == [None] * 4
+	assert bytes(results[-1]) == frame
+	assert assembler.stats['frames_completed'] == 1 and not assembler.pending
+
+def test_reassembles_out_of_order(frame):
+	assembler = FrameAssembler()
+	payloads = fragments(frame)
+	random.Random(2).shuffle(payloads)
+	complete = [assembler.addFragment(1, payload, 0.0) for payload in payloads]
+	assert bytes(complete[-1]) == frame
+	assert complete[:-1] == [None] * 4
+
+def test_interleaved_frames(frame):
+	assembler = FrameAssembler()
+	other = frame[::-1][:2500]
+	done = {}
+	for a, b in zip(fragments(frame, frameNumber=1), fragments(other, frameNumber=2) + [None] * 2):
+		for frameNumber, payload in ((1, a), (2, b)):
+			if payload is not None:
+				result = assembler.addFragment(frameNumber, payload, 0.0)
+				if result is not None:
+					done[frameNumber] = bytes(result)
+	assert done == {1: frame, 2: other}
+
+def test_duplicates_and_late_fragments_are_ignored(frame):
+	assembler = FrameAssembler()
+	payloads = fragments(frame)
+	assembler.addFragment(1, payloads[0], 0.0)
+	assert assembler.addFragment(1, payloads[0], 0.0) is None
+	for payload in payloads[1:]:
+		result = assembler.addFragment(1, payload, 0.0)
+	assert bytes(result) == frame
+	# A retransmission arriving after completion must not start a new copy
+	assert assembler.addFragment(1, payloads[2], 0.0) is None
+	assert not assembler.pending
+	assert assembler.stats['duplicates'] == 2
+
+def test_fragment_past_the_frame_end_is_corrupt():
+	assembler = FrameAssembler()
+	payload = bytearray(FRAG_HEADER_V2.size + 100)
+	packFragmentHeader(payload, 0, 0, 2, 150, 100)
+	assert assembler.addFragment(1, bytes(payload), 0.0) is None
+	assert assembler.stats['frames_corrupt'] == 1 and not assembler.pending
+
+def test_fragment_number_beyond_total_is_corrupt():
+	assembler = FrameAssembler()
+	payload = bytearray(FRAG_HEADER_V2.size + 10)
+	packFragmentHeader(payload, 0, 3, 3, 10, 0)
+	assert assembler.addFragment(1, bytes(payload), 0.0) is None
+	assert assembler.stats['frames_corrupt'] == 1
+
+def test_incomplete_frames_expire(frame):
+	assembler = FrameAssembler(timeout=1.0)
+	assembler.addFragment(1, fragments(frame)[0], 0.0)
+	assert assembler.expire(0.5) == 0
+	assert assembler.expire(1.5) == 1
+	assert not assembler.pending and assembler.stats['frames_expired'] == 1
+
+def test_missing_fragments_are_listed(frame):
+	assembler = FrameAssembler()
+	payloads = fragments(frame)
+	for n in (0, 2, 4):
+		assembler.addFragment(1, payloads[n], 0.0)
+	assert assembler.pending[1].missing() == [1, 3]
+
+def test_fragment_info_and_whole_frames(frame):
+	payload = fragments(frame)[0]
+	assert fragmentInfo(payload) == (0, 5)
+	assert fragmentInfo(fragments(frame, 1)[0]) == (0, 5)
+	assert isWholeFrame(b'\xFF\xD8\xFF\xE0')
+	assert not isWholeFrame(payload)
@@ -0,0 +1,94 @@
+import threading, time
+
+from FrameCache import FrameCache
+
+def waitForHits(cache, hits):
+	"""Wait until the given number of lookups have found the frame or its pending read."""
+	deadline = time.monotonic() + 5.0
+	while cache.snapshot()['hits'] < hits:
+		assert time.monotonic() < deadline
+		time.sleep(0.001)
+
+def test_concurrent_misses_load_once():
+	cache = FrameCache()
+	started, release = threading.Event(), threading.Event()
+	calls = []
+
+	def loader():
+		calls.append(threading.current_thread().name)
+		started.set()
+		assert release.wait(5.0)
+		return b'frame'
+
+	results = []
+	owner = threading.Thread(target=lambda: results.append(cache.get('k', loader)))
+	owner.start()
+	assert started.wait(5.0)
+	waiters = [threading.Thread(target=lambda: results.append(cache.get('k', loader))) for _ in range(3)]
+	for thread in waiters:
+		thread.start()
+	# Waiters are parked on the owner's read, not loading themselves
+	waitForHits(cache, 3)
+	release.set()
+	for thread in [owner] + waiters:
+		thread.join(5.0)
+	assert len(calls) == 1
+	assert results == [b'frame'] * 4
+	# One miss for the owner; a waiter served by its read counts as a hit
+	snap = cache.snapshot()
+	assert (snap['misses'], snap['hits'], snap['frames']) == (1, 3, 1)
+
+def test_waiters_load_themselves_when_the_owner_gets_nothing():
+	cache = FrameCache()
+	started, release = threading.Event(), threading.Event()
+	answers = iter([None, b'retry'])
+
+	def loader():
+		started.set()
+		assert release.wait(5.0)
+		return next(answers)
+
+	results = []
+	owner = threading.Thread(target=lambda: results.append(('owner', cache.get('k', loader))))
+	owner.start()
+	assert started.wait(5.0)
+	waiter = threading.Thread(target=lambda: results.append(('waiter', cache.get('k', loader))))
+	waiter.start()
+	waitForHits(cache, 1)
+	release.set()
+	owner.join(5.0)
+	waiter.join(5.0)
+	assert sorted(results) == [('owner', None), ('waiter', b'retry')]
+	# Nothing was cached: the next lookup is a miss again
+	assert cache.get('k', lambda: b'again') == b'again'
+
+def test_least_recently_used_frames_are_evicted_first():
+	cache = FrameCache(budget=30)
+	for key in 'abc':
+		cache.put(key, bytes(10))
+	# Reading a refreshes it: b is now the oldest
+	cache.get('a', lambda: None)
+	cache.put('d', bytes(10))
+	assert list(cache._frames) == ['c', 'a', 'd']
+	cache.put('e', bytes(20))
+	assert list(cache._frames) == ['d', 'e']
+	snap = cache.snapshot()
+	assert (snap['evictions'], snap['evicted_bytes'], snap['bytes']) == (3, 30, 30)
+
+def test_replacing_a_frame_keeps_the_byte_count():
+	cache = FrameCache(budget=100)
+	cache.put('a', bytes(40))
+	cache.put('a', bytes(10))
+	assert cache.bytes == 10 and list(cache._frames) == ['a']
+
+def test_frame_over_the_budget_is_not_cached():
+	cache = FrameCache(budget=10)
+	assert cache.get('big', lambda: bytes(11)) == bytes(11)
+	assert cache.snapshot()['frames'] == 0
+
+def test_shrinking_the_budget_evicts_oldest():
+	cache = FrameCache(budget=100)
+	for key in 'abcd':
+		cache.put(key, bytes(20))
+	cache.resize(45)
+	assert list(cache._frames) == ['c', 'd'] and cache.bytes == 40
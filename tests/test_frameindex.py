@@ -0,0 +1,158 @@
+import os, threading
+from array import array
+
+import pytest
+
+from FrameIndex import FrameIndex, findJpegFrame, FORMAT_HEADER, FORMAT_RAW, INDEX_HEADER
+from VideoStream import VideoStream
+
+def jpeg(tag):
+	"""A small JPEG whose segments and scan data hold bytes a naive scanner would stop at."""
+	# APP1 payload with an embedded EOI, as an EXIF thumbnail has
+	app = b'Exif\x00\x00\xFF\xD8thumb\xFF\xD9' + bytes([tag])
+	segment = b'\xFF\xE1' + (len(app) + 2).to_bytes(2, 'big') + app
+	sos = b'\xFF\xDA\x00\x08\x01\x01\x00\x00\x3F\x00'
+	# Entropy-coded data: stuffed FF00, restart markers and a fill byte
+	scan = bytes([tag, 0x12]) + b'\xFF\x00\xD9' + b'\xFF\xD0' + b'\x34\xFF\x00' + b'\xFF\xD7\x56'
+	return b'\xFF\xD8' + segment + sos + scan + b'\xFF\xFF\xD9'
+
+FRAMES = [jpeg(n) for n in range(4)]
+
+@pytest.fixture(autouse=True)
+def fresh(monkeypatch):
+	# Every test starts without indexes loaded by earlier ones
+	monkeypatch.setattr(FrameIndex, '_loaded', {})
+	monkeypatch.setattr(FrameIndex, '_pathLocks', {})
+
+@pytest.fixture
+def movie(tmp_path):
+	path = tmp_path / 'movie.mjpeg'
+	path.write_bytes(b''.join(FRAMES))
+	return str(path)
+
+def test_frame_ends_at_the_real_eoi():
+	assert findJpegFrame(FRAMES[0]) == (0, len(FRAMES[0]))
+
+def test_frames_are_found_back_to_back():
+	data = b'junk' + FRAMES[0] + FRAMES[1]
+	first = findJpegFrame(data)
+	assert first == (4, 4 + len(FRAMES[0]))
+	assert findJpegFrame(data, first[1]) == (first[1], len(data))
+
+def test_truncated_frame_restarts_at_the_next_soi():
+	cut = FRAMES[0][:-8]
+	assert findJpegFrame(cut + FRAMES[1]) == (len(cut), len(cut) + len(FRAMES[1]))
+
+@pytest.mark.parametrize('cut', [1, 3, 8, len(FRAMES[3]) - 4])
+def test_truncated_last_frame_is_not_indexed(tmp_path, cut):
+	path = tmp_path / 'cut.mjpeg'
+	path.write_bytes(b''.join(FRAMES[:3]) + FRAMES[3][:-cut])
+	index = FrameIndex.build(str(path))
+	assert index.formatType == FORMAT_RAW
+	assert list(index.lengths) == [len(frame) for frame in FRAMES[:3]]
+
+def test_headered_format(tmp_path):
+	path = tmp_path / 'movie.mjpeg'
+	path.write_bytes(b''.join(b'%10d' % len(frame) + frame for frame in FRAMES) + b'%10d' % 999 + b'short')
+	index = FrameIndex.build(str(path))
+	assert index.formatType == FORMAT_HEADER
+	assert [index.frame(n)[:2] for n in range(len(index))] == [
+		(10 * (n + 1) + sum(map(len, FRAMES[:n])), len(FRAMES[n])) for n in range(4)]
+
+def test_sidecar_is_written_and_reused(movie, monkeypatch):
+	index = FrameIndex.load(movie)
+	assert os.path.exists(FrameIndex.sidecarPath(index.filename))
+	monkeypatch.setattr(FrameIndex, '_loaded', {})
+	monkeypatch.setattr(FrameIndex, 'build', classmethod(lambda cls, *args: pytest.fail('rescanned')))
+	reloaded = FrameIndex.load(movie)
+	assert reloaded is not index and reloaded.key == index.key
+	assert list(reloaded.offsets) == list(index.offsets) and list(reloaded.lengths) == list(index.lengths)
+
+@pytest.mark.parametrize('change', ['append', 'mtime'])
+def test_stale_sidecar_is_rejected(movie, change):
+	index = FrameIndex.load(movie)
+	st = os.stat(movie)
+	if change == 'append':
+		with open(movie, 'ab') as f:
+			f.write(FRAMES[0])
+	else:
+		os.utime(movie, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+	assert FrameIndex.readSidecar(index.filename, os.stat(movie)) is None
+	# In memory as well: the next load rescans
+	reloaded = FrameIndex.load(movie)
+	assert reloaded is not index
+	assert len(reloaded) == (5 if change == 'append' else 4)
+
+@pytest.mark.parametrize('damage', ['magic', 'truncated'])
+def test_corrupt_sidecar_is_rejected(movie, damage):
+	index = FrameIndex.load(movie)
+	sidecar = FrameIndex.sidecarPath(index.filename)
+	with open(sidecar, 'rb') as f:
+		data = f.read()
+	data = b'XXXX' + data[4:] if damage == 'magic' else data[:INDEX_HEADER.size + 8]
+	with open(sidecar, 'wb') as f:
+		f.write(data)
+	assert FrameIndex.readSidecar(index.filename, os.stat(movie)) is None
+
+def test_concurrent_loads_scan_once_per_path(movie, tmp_path, monkeypatch):
+	other = tmp_path / 'other.mjpeg'
+	other.write_bytes(FRAMES[0])
+	build = FrameIndex.build.__func__
+	scans = []
+	building, release = threading.Event(), threading.Event()
+
+	def slowBuild(cls, filename, st=None):
+		scans.append(os.path.basename(filename))
+		if filename.endswith('movie.mjpeg'):
+			# Stuck on a slow disk until the other file is loaded
+			building.set()
+			assert release.wait(5.0)
+		return build(cls, filename, st)
+	monkeypatch.setattr(FrameIndex, 'build', classmethod(slowBuild))
+
+	results = []
+	threads = [threading.Thread(target=lambda: results.append(FrameIndex.load(movie))) for _ in range(4)]
+	for thread in threads:
+		thread.start()
+	assert building.wait(5.0)
+	# Another file is not held up behind the slow one
+	assert len(FrameIndex.load(str(other))) == 1
+	release.set()
+	for thread in threads:
+		thread.join(5.0)
+	assert len(results) == 4 and all(index is results[0] for index in results)
+	assert sorted(scans) == ['movie.mjpeg', 'other.mjpeg']
+
+def test_stream_reads_and_seeks_by_index(movie):
+	stream = VideoStream(movie, fps=10)
+	try:
+		assert stream.frameCount() == 4
+		assert stream.nextFrame() == FRAMES[0]
+		stream.seek(2)
+		assert stream.nextFrame() == FRAMES[2] and stream.frameNbr() == 3
+		assert stream.readFrame(1) == FRAMES[1]
+		stream.seek(99)
+		assert stream.nextFrame() is None
+		stream.seek(-1)
+		assert stream.frameNbr() == 0
+		assert stream.frameTime(3) == pytest.approx(0.3)
+		assert stream.seekTime(0.25) == pytest.approx(0.2)
+		assert stream.duration() == pytest.approx(0.4)
+	finally:
+		stream.close()
+
+def test_stream_follows_frame_timestamps(movie):
+	index = FrameIndex.load(movie)
+	index.timestamps = array('d', [0.0, 0.5, 0.6, 2.0])
+	# Timestamps survive the sidecar
+	index.writeSidecar()
+	FrameIndex._loaded.clear()
+	stream = VideoStream(movie, fps=10)
+	try:
+		assert list(stream.index.timestamps) == [0.0, 0.5, 0.6, 2.0]
+		assert stream.frameTime(1) == 0.5
+		assert stream.seekTime(1.0) == 0.6 and stream.frameNbr() == 2
+		assert stream.seekTime(5.0) == 2.0
+		assert stream.duration() == pytest.approx(2.1)
+	finally:
+		stream.close()
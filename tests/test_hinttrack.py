@@ -0,0 +1,83 @@
+import os, random
+
+import pytest
+
+import HintTrack as hints
+from HintTrack import HintTrack
+from FrameIndex import FrameIndex
+from ServerWorker import ServerWorker
+from VideoStream import VideoStream
+
+MTU = 1400
+
+def jpeg(size, rng):
+	"""A minimal JPEG whose APP0 segment pads it to about size bytes."""
+	body = bytes(rng.randrange(256) for _ in range(size))
+	return b'\xFF\xD8\xFF\xE0' + (len(body) + 2).to_bytes(2, 'big') + body + b'\xFF\xD9'
+
+@pytest.fixture
+def movie(tmp_path):
+	rng = random.Random(1)
+	path = tmp_path / 'movie.mjpeg'
+	path.write_bytes(b''.join(jpeg(rng.randint(500, 6000), rng) for _ in range(8)))
+	HintTrack._loaded.clear()
+	yield str(path)
+	HintTrack._loaded.clear()
+
+def test_no_sidecar_means_no_track(movie):
+	assert HintTrack.load(FrameIndex.load(movie), MTU, 2) is None
+
+def test_sidecar_is_named_for_mtu_and_version(movie):
+	index = FrameIndex.load(movie)
+	path = HintTrack.write(movie, MTU, 1)
+	assert path == f"{index.filename}.{MTU}.v1.hint"
+	assert HintTrack.load(index, MTU, 2) is None
+	assert HintTrack.load(index, MTU + 1, 1) is None
+	assert HintTrack.load(index, MTU, 1) is not None
+
+def test_missing_sidecar_is_rechecked(movie, monkeypatch):
+	index = FrameIndex.load(movie)
+	assert HintTrack.load(index, MTU, 2) is None
+	HintTrack.write(movie, MTU, 2)
+	assert HintTrack.load(index, MTU, 2) is None  # Remembered as missing
+	monkeypatch.setattr(hints, 'RECHECK_INTERVAL', 0.0)
+	assert HintTrack.load(index, MTU, 2) is not None
+
+def test_changed_file_drops_old_tracks(movie):
+	HintTrack.write(movie, MTU, 2)
+	old = FrameIndex.load(movie)
+	assert HintTrack.load(old, MTU, 2) is not None
+	with open(movie, 'ab') as f:
+		f.write(jpeg(100, random.Random(2)))
+	new = FrameIndex.load(movie)
+	assert HintTrack.load(new, MTU, 2) is None  # The sidecar is stale
+	assert [key for key in HintTrack._loaded if key[0] == old.key] == []
+
+def test_truncated_sidecar_is_ignored(movie):
+	path = HintTrack.write(movie, MTU, 2)
+	os.truncate(path, os.path.getsize(path) - 1)
+	assert HintTrack.load(FrameIndex.load(movie), MTU, 2) is None
+
+def test_loaded_tracks_are_bounded(movie, monkeypatch):
+	monkeypatch.setattr(hints, 'MAX_LOADED', 3)
+	index = FrameIndex.load(movie)
+	for mtu in range(1000, 1010):
+		HintTrack.load(index, mtu, 2)
+	assert len(HintTrack._loaded) == 3
+
+@pytest.mark.parametrize('fragVersion', [1, 2])
+def test_hinted_packets_match_built_fragments(movie, fragVersion):
+	HintTrack.write(movie, MTU, fragVersion)
+	stream = VideoStream(movie)
+	worker = ServerWorker({'videoStream': stream})
+	worker.MTU = MTU
+	worker.FRAG_VERSION = fragVersion
+	try:
+		assert stream.hintTrack(MTU, fragVersion) is not None
+		for n in range(1, stream.frameCount() + 1):
+			data = stream.readFrame(n - 1)
+			hinted = worker.hintedFragments(data, n, 1234)
+			built = worker.buildFragments(data, n, 1234)
+			assert [bytes(h) + bytes(p) for h, p in hinted] == [bytes(h) + bytes(p) for h, p in built]
+	finally:
+		stream.close()
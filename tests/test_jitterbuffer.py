@@ -0,0 +1,79 @@
+import pytest
+
+from JitterBuffer import JitterBuffer, RTP_CLOCK_RATE
+
+FPS = 30
+TICKS = RTP_CLOCK_RATE // FPS
+
+def test_frames_play_in_media_order():
+	buffer = JitterBuffer()
+	for n in (2, 0, 3, 1):
+		assert buffer.push(n, n * TICKS, 1.0) is None
+	assert buffer.popAll(10.0) == [0, 1, 2, 3]
+	assert len(buffer) == 0
+
+def test_frame_waits_for_its_playout_time():
+	buffer = JitterBuffer(minDelay=0.02)
+	buffer.push('a', 0, 1.0)
+	buffer.push('b', TICKS, 1.0 + 1.0 / FPS)
+	# Due at arrival of the fastest frame plus the target delay
+	assert buffer.nextDue(1.0) == pytest.approx(0.02)
+	assert buffer.pop(1.019) is None
+	assert buffer.pop(1.021) == 'a'
+	assert buffer.nextDue(1.03) == pytest.approx(1.0 / FPS - 0.01)
+	assert buffer.pop(1.03) is None
+	assert buffer.pop(1.0 + 1.0 / FPS + 0.021) == 'b'
+	assert buffer.nextDue(2.0) is None
+
+def test_frame_completed_after_a_newer_one_played_is_late():
+	buffer = JitterBuffer()
+	buffer.push(0, 0, 1.0)
+	buffer.push(2, 2 * TICKS, 1.0)
+	assert buffer.popAll(5.0) == [0, 2]
+	buffer.push(1, TICKS, 1.1)
+	assert buffer.pop(5.0) is None
+	assert buffer.stats['late'] == 1 and len(buffer) == 0
+
+def test_overflow_returns_the_dropped_frame():
+	buffer = JitterBuffer(capacity=3)
+	for n in (1, 0, 2):
+		assert buffer.push(n, n * TICKS, 1.0) is None
+	# The oldest frame makes room and is handed back for accounting
+	assert buffer.push(3, 3 * TICKS, 1.0) == 0
+	assert buffer.stats['overflow'] == 1
+	assert buffer.popAll(10.0) == [1, 2, 3]
+
+def test_target_delay_follows_jitter():
+	buffer = JitterBuffer(minDelay=0.01, maxDelay=0.2)
+	for n in range(100):
+		buffer.push(n, n * TICKS, n / FPS)
+	assert buffer.targetDelay == pytest.approx(0.01)
+	# Arrivals alternate 40 ms early and late
+	for n in range(100, 200):
+		buffer.push(n, n * TICKS, n / FPS + (0.04 if n % 2 else -0.04))
+	assert buffer.jitter > 0.05
+	assert buffer.targetDelay == pytest.approx(0.2)
+
+def test_timestamp_wrap_keeps_order():
+	buffer = JitterBuffer()
+	base = 0x100000000 - TICKS
+	for n in (1, 0, 2):
+		buffer.push(n, (base + n * TICKS) & 0xFFFFFFFF, 1.0)
+	assert buffer.popAll(10.0) == [0, 1, 2]
+
+def test_jump_in_media_time_resyncs():
+	buffer = JitterBuffer()
+	buffer.push(0, 0, 1.0)
+	buffer.push(1, TICKS, 1.0 + 1.0 / FPS)
+	# A seek 10 s ahead: frames queued before it are dropped and the clock re-anchored
+	buffer.push('seek', 10 * RTP_CLOCK_RATE, 1.1)
+	assert buffer.stats['resyncs'] == 1
+	assert buffer.popAll(1.2) == ['seek']
+
+def test_clear_reanchors():
+	buffer = JitterBuffer(minDelay=0.02)
+	buffer.push(0, 0, 1.0)
+	buffer.clear()
+	assert len(buffer) == 0 and buffer.nextDue(1.0) is None
+	buffer.push(5, 5 * RTP_CLOCK_RATE, 3.0)
+	assert buffer.nextDue(3.0) == pytest.approx(0.02)
@@ -0,0 +1,76 @@
+import threading
+
+import pytest
+
+from Pacer import FramePacer, TokenBucket
+
+class Clock:
+	def __init__(self, now=100.0):
+		self.now = now
+
+	def __call__(self):
+		return self.now
+
+def test_deadlines_do_not_drift():
+	clock = Clock()
+	pacer = FramePacer(0.04, clock=clock)
+	for n in range(100):
+		# Each frame goes out a little late; the next deadline stays on the grid
+		clock.now = 100.0 + n * 0.04 + 0.01
+		assert pacer.next() == 0
+	assert pacer.deadline == pytest.approx(100.0 + 100 * 0.04)
+	assert pacer.meanError() == pytest.approx(0.01)
+	assert pacer.stats['catchups'] == 0
+
+def test_catches_up_when_a_few_frames_behind():
+	clock = Clock()
+	pacer = FramePacer(0.04, clock=clock)
+	clock.now += 0.1
+	assert pacer.next() == 0
+	assert pacer.stats['catchups'] == 1
+	# The next deadline is already due: sent back-to-back
+	assert pacer.deadline == pytest.approx(100.04)
+
+def test_drops_frames_when_too_far_behind():
+	clock = Clock()
+	pacer = FramePacer(0.04, maxCatchup=3, clock=clock)
+	clock.now += 0.21
+	assert pacer.next() == 5
+	assert pacer.stats['dropped'] == 5
+	assert pacer.deadline == pytest.approx(100.24)
+	clock.now = 100.24
+	assert pacer.next() == 0
+
+def test_set_interval_applies_from_the_next_deadline():
+	pacer = FramePacer(0.04, clock=Clock())
+	pacer.next()
+	pacer.setInterval(0.1)
+	pacer.next(100.04)
+	assert pacer.deadline == pytest.approx(100.14)
+
+def test_achieved_fps():
+	clock = Clock()
+	pacer = FramePacer(0.05, clock=clock)
+	for n in range(20):
+		pacer.next(100.0 + n * 0.05)
+	assert pacer.achievedFps(101.0) == pytest.approx(20.0)
+	pacer.start(200.0)
+	assert pacer.achievedFps(200.0) == 0.0 and pacer.meanError() == 0.0
+
+def test_wait_returns_early_when_the_event_is_set():
+	pacer = FramePacer(10.0)
+	pacer.next()
+	event = threading.Event()
+	event.set()
+	assert pacer.wait(event) == 0
+	assert pacer.stats['frames'] == 1
+
+def test_token_bucket_allows_a_burst_then_paces():
+	clock = Clock()
+	bucket = TokenBucket(1000, 1500, clock=clock)
+	assert bucket.delay(1500) == 0.0
+	assert bucket.delay(500) == pytest.approx(0.5)
+	# Refilled at the rate, but never past the burst
+	clock.now += 10.0
+	assert bucket.delay(1500) == 0.0
+	assert bucket.delay(1) == pytest.approx(0.001)
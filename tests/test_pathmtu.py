@@ -0,0 +1,66 @@
+import errno
+
+import pytest
+
+from PathMtu import MtuProbe, chooseMtu, payloadSize, IP_HEADER, UDP_HEADER, ETHERNET_MTU, MAX_MTU, MIN_MTU
+from Rtcp import iterPackets, parseMtuProbe
+
+def test_payload_size_leaves_room_for_every_header():
+	# IP 20 + UDP 8 + RTP 12 + fragmentation header 14 (v2) or 6 (v1)
+	assert payloadSize(1500, 2) == 1446
+	assert payloadSize(1500, 1) == 1454
+	assert payloadSize(MIN_MTU, 2) == 522
+
+@pytest.mark.parametrize('route, clientLimit, chosen', [
+	(None, None, (1500, 1500)),
+	(1500, None, (1500, 1500)),
+	(1400, None, (1400, 1400)),
+	(9000, None, (1500, 1500)),       # Beyond the first hop only Ethernet is assumed
+	(9000, 9000, (1500, 9000)),       # Larger only after a probe gets through
+	(65536, 65535, (1500, MAX_MTU)),  # Loopback
+	(1500, 1200, (1200, 1200)),
+	(300, None, (MIN_MTU, MIN_MTU)),
+])
+def test_choose_mtu(route, clientLimit, chosen):
+	assert chooseMtu(route, clientLimit) == chosen
+
+def test_probe_sizes_are_the_candidates_under_the_limit():
+	assert MtuProbe(MAX_MTU).sizes == [9000, 1500, 1492, 1420, 1400, 1280]
+	assert MtuProbe(1450).sizes == [1450, 1420, 1400, 1280]
+	assert MtuProbe(ETHERNET_MTU).sizes == [1500, 1492, 1420, 1400, 1280]
+
+class ProbeSocket:
+	"""Records probes and fails those over the route MTU, as a DF socket does."""
+
+	def __init__(self, routeMtu):
+		self.routeMtu = routeMtu
+		self.sent = []
+
+	def sendto(self, data, address):
+		if len(data) + IP_HEADER + UDP_HEADER > self.routeMtu:
+			raise OSError(errno.EMSGSIZE, 'Message too long')
+		self.sent.append(data)
+		return len(data)
+
+def test_probes_fill_their_packet_size():
+	probe = MtuProbe(MAX_MTU)
+	sock = ProbeSocket(1500)
+	probe.send(sock, ('127.0.0.1', 9))
+	assert probe.sent == 5
+	for data, size in zip(sock.sent, probe.sizes[1:]):
+		assert len(data) + IP_HEADER + UDP_HEADER == size
+		(_, _, body), = iterPackets(data)
+		assert parseMtuProbe(body) == size
+
+def test_largest_echo_wins():
+	probe = MtuProbe(MAX_MTU)
+	probe.onEcho(1400)
+	probe.onEcho(1492)
+	probe.onEcho(1420)
+	probe.onEcho(1234)  # Not a size that was probed
+	assert probe.largest == 1492 and not probe.done.is_set()
+	# The largest candidate getting through ends the probe
+	probe.onEcho(9000)
+	assert probe.largest == 9000 and probe.done.is_set()
+	probe.onEcho(1500)
+	assert probe.largest == 9000
@@ -0,0 +1,89 @@
+from Rtcp import buildNack, parseNack, iterPackets, isRtcp, PT_RTPFB, FMT_NACK
+from Retransmission import RetransmitRing
+
+FRAGMENT = 1000
+
+def roundTrip(losses):
+	(pt, fmt, body), = iterPackets(buildNack(1, 2, losses))
+	assert (pt, fmt) == (PT_RTPFB, FMT_NACK)
+	return parseNack(body)
+
+def test_nack_round_trip():
+	assert roundTrip([(7, [0, 3, 16])]) == [(7, [0, 3, 16])]
+	assert roundTrip([(9, None)]) == [(9, None)]
+
+def test_nack_splits_fragments_beyond_the_mask():
+	# 17 past the base does not fit the 16-bit mask: a second entry starts there
+	losses = roundTrip([(5, [20, 2, 19])])
+	assert losses == [(5, [2]), (5, [19, 20])]
+	assert roundTrip([(5, list(range(40)))]) == [(5, list(range(17))), (5, list(range(17, 34))), (5, list(range(34, 40)))]
+
+def test_nack_frame_numbers_wrap_to_16_bits():
+	assert roundTrip([(0x10003, [1])]) == [(3, [1])]
+
+def test_nack_is_rtcp():
+	assert isRtcp(buildNack(1, 2, [(1, [0])]))
+	assert not isRtcp(b'\x80\x1a\x00\x01' + bytes(8))  # RTP, payload type 26
+
+def ring(**kwargs):
+	ring = RetransmitRing(**kwargs)
+	ring.add(1, bytes(5 * FRAGMENT), 90, 0.0)
+	return ring
+
+def test_resends_requested_fragments():
+	data, timestamp, resend = ring().request(1, [0, 4], FRAGMENT, 0.1)
+	assert (len(data), timestamp, resend) == (5 * FRAGMENT, 90, [0, 4])
+
+def test_whole_frame_and_out_of_range_fragments():
+	assert ring().request(1, None, FRAGMENT, 0.1)[2] == [0, 1, 2, 3, 4]
+	assert ring().request(1, [3, 9], FRAGMENT, 0.1)[2] == [3]
+
+def test_refuses_after_the_deadline_or_eviction():
+	r = ring(deadline=0.5)
+	assert r.request(1, [0], FRAGMENT, 0.6) is None
+	assert r.request(2, [0], FRAGMENT, 0.1) is None
+	assert r.stats['expired'] == 2
+
+def test_retries_are_capped():
+	r = ring(maxRetries=2)
+	assert r.request(1, [0], FRAGMENT, 0.1)[2] == [0]
+	assert r.request(1, [0, 1], FRAGMENT, 0.1)[2] == [0, 1]
+	assert r.request(1, [0, 1], FRAGMENT, 0.1)[2] == [1]
+	assert r.request(1, [0, 1], FRAGMENT, 0.1) is None
+	assert r.stats['limited'] == 3
+
+def test_budget_is_a_share_of_bytes_sent():
+	r = RetransmitRing(share=0.2, burst=2 * FRAGMENT)
+	r.credit = 0
+	r.add(1, bytes(10 * FRAGMENT), 0, 0.0)
+	# 20% of 10 fragments: two may be resent
+	assert r.request(1, None, FRAGMENT, 0.1)[2] == [0, 1]
+	assert r.request(1, [5], FRAGMENT, 0.1) is None
+	r.add(2, bytes(5 * FRAGMENT), 0, 0.1)
+	assert r.request(1, [5, 6], FRAGMENT, 0.2)[2] == [5]
+
+def test_burst_caps_the_saved_budget():
+	r = RetransmitRing(share=1.0, burst=3 * FRAGMENT)
+	for n in range(10):
+		r.add(n, bytes(FRAGMENT), 0, 0.0)
+	assert r.credit == 3 * FRAGMENT
+
+def test_ring_is_bounded_by_frames_and_bytes():
+	r = RetransmitRing(capacity=3)
+	for n in range(5):
+		r.add(n, bytes(10), 0, 0.0)
+	assert list(r.frames) == [2, 3, 4] and r.bytes == 30
+	r = RetransmitRing(maxBytes=25)
+	for n in range(5):
+		r.add(n, bytes(10), 0, 0.0)
+	assert list(r.frames) == [3, 4] and r.bytes == 20
+	# A frame over the whole limit is still kept on its own
+	r.add(9, bytes(100), 0, 0.0)
+	assert list(r.frames) == [9]
+
+def test_nack_of_a_frame_sent_with_parity_is_counted_once():
+	r = RetransmitRing()
+	r.add(1, bytes(3 * FRAGMENT), 0, 0.0, fec=True)
+	r.request(1, [0], FRAGMENT, 0.1)
+	r.request(1, [1], FRAGMENT, 0.1)
+	assert r.stats['fec_unrecoverable'] == 1
@@ -0,0 +1,105 @@
+import pytest
+
+from Rtcp import (buildSenderReport, parseSenderReport, buildReceiverReport, parseReceiverReport, buildQosReport,
+	parseQosReport, buildSkipNotice, parseSkipNotice, buildMtuProbe, parseMtuProbe, buildRemb, parseRemb, buildNack,
+	iterPackets, isRtcp, ntpTime, ntpMiddle, ReceptionStats, PT_SR, PT_RR, PT_APP, PT_PSFB, PT_RTPFB, FMT_AFB)
+
+def only(data):
+	packets = list(iterPackets(data))
+	assert len(packets) == 1
+	return packets[0]
+
+def test_sender_report():
+	now = 1700000000.25
+	pt, count, body = only(buildSenderReport(0x1234, 0x100000005, 10, 20000, now))
+	assert (pt, count) == (PT_SR, 0)
+	ssrc, middle, rtpTimestamp, packets, octets = parseSenderReport(body)
+	assert (ssrc, rtpTimestamp, packets, octets) == (0x1234, 5, 10, 20000)
+	assert middle == ntpMiddle(*ntpTime(now))
+	assert middle & 0xFFFF == 0x4000  # A quarter second
+
+def test_receiver_report():
+	pt, count, body = only(buildReceiverReport(1, 2, 64, 1234, 0x10005, 90, 0xAABBCCDD, 6553))
+	assert (pt, count) == (PT_RR, 1)
+	assert parseReceiverReport(body, count) == [(0.25, 1234, 0x10005, 90, 0xAABBCCDD, 6553)]
+
+def test_receiver_report_negative_cumulative_loss():
+	_, count, body = only(buildReceiverReport(1, 2, 0, -3, 0, 0, 0, 0))
+	assert parseReceiverReport(body, count)[0][1] == -3
+
+def test_receiver_report_block_count_past_the_body():
+	_, _, body = only(buildReceiverReport(1, 2, 0, 0, 0, 0, 0, 0))
+	assert len(parseReceiverReport(body, 3)) == 1
+
+def test_app_packets_are_told_apart():
+	qos = only(buildQosReport(1, 12, 150.7, 0x100000010))
+	skip = only(buildSkipNotice(1, 0x10002, 5))
+	probe = only(buildMtuProbe(1, 1400))
+	assert [pt for pt, _, _ in (qos, skip, probe)] == [PT_APP] * 3
+	assert parseQosReport(qos[2]) == (12, 150, 0x10)
+	assert parseSkipNotice(skip[2]) == (2, 5)
+	assert parseMtuProbe(probe[2]) == 1400
+	assert parseQosReport(skip[2]) is None and parseSkipNotice(probe[2]) is None and parseMtuProbe(qos[2]) is None
+
+def test_mtu_probe_is_padded_to_its_size():
+	data = buildMtuProbe(1, 1400, 1400)
+	assert len(data) == 1400
+	assert parseMtuProbe(only(data)[2]) == 1400
+
+@pytest.mark.parametrize('bitrate', [0, 1, 250000, 4000000, 123456789])
+def test_remb_round_trip(bitrate):
+	pt, fmt, body = only(buildRemb(1, bitrate))
+	assert (pt, fmt) == (PT_PSFB, FMT_AFB)
+	decoded = parseRemb(body)
+	# 18-bit mantissa: rounded down by less than one part in 2^17
+	assert decoded <= bitrate and bitrate - decoded <= bitrate / 2 ** 17
+
+def test_compound_packet():
+	data = buildReceiverReport(1, 2, 0, 0, 0, 0, 0, 0) + buildQosReport(1, 3, 100, 0) + buildNack(1, 2, [(4, [1])])
+	assert isRtcp(data)
+	assert [pt for pt, _, _ in iterPackets(data)] == [PT_RR, PT_APP, PT_RTPFB]
+	# A truncated last packet ends the walk
+	assert [pt for pt, _, _ in iterPackets(data[:-1])] == [PT_RR, PT_APP]
+
+class TestReceptionStats:
+	def test_counts_lost_fragments(self):
+		stats = ReceptionStats()
+		for seq, received in ((1, 4), (2, 3), (3, 4), (4, 4)):
+			for _ in range(received):
+				stats.onPacket(seq, 4)
+		# Frames two behind the newest are accounted
+		assert (stats.expected, stats.received, stats.cumulativeLost()) == (8, 7, 1)
+
+	def test_whole_missing_frame_counts_as_the_last_size(self):
+		stats = ReceptionStats()
+		for seq in (1, 2, 4, 5, 6):
+			for _ in range(5):
+				stats.onPacket(seq, 5)
+		assert stats.cumulativeLost() == 5
+
+	def test_retransmissions_do_not_hide_loss(self):
+		stats = ReceptionStats()
+		for seq in (1, 2, 3):
+			for fragment in range(4):
+				if (seq, fragment) != (1, 2):
+					stats.onPacket(seq, 4)
+		stats.onPacket(1, 4, original=False)
+		assert stats.cumulativeLost() == 1
+
+	def test_skipped_frames_are_not_loss(self):
+		stats = ReceptionStats()
+		for seq in (1, 2):
+			stats.onPacket(seq, 2)
+			stats.onPacket(seq, 2)
+		stats.onSkipped(3, 4)
+		for seq in (7, 8, 9):
+			stats.onPacket(seq, 2)
+			stats.onPacket(seq, 2)
+		assert stats.cumulativeLost() == 0
+
+	def test_sequence_wrap(self):
+		stats = ReceptionStats()
+		for seq in (0xFFFE, 0xFFFF, 0, 1, 2):
+			stats.onPacket(seq, 1)
+		assert stats.extendedHighest() == 0x10002
+		assert stats.cumulativeLost() == 0
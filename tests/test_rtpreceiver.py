@@ -0,0 +1,71 @@
+import socket, threading
+from types import SimpleNamespace
+
+import pytest
+
+import Client
+from PathMtu import IP_HEADER, UDP_HEADER
+from RtpReceiver import RtpReceiver, MAX_UDP_PAYLOAD, CAN_RECVMSG, TRUNC_FLAGS
+
+pytestmark = pytest.mark.skipif(not CAN_RECVMSG, reason="truncation is reported by recvmsg")
+
+END = b'end'
+
+def receive(bufferSize, sizes):
+	"""Send datagrams of the given sizes over loopback; return (lengths handled, receiver)."""
+	sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	sock.bind(('127.0.0.1', 0))
+	sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	received = []
+	done = threading.Event()
+
+	def handler(view):
+		if bytes(view) == END:
+			done.set()
+		else:
+			received.append(len(view))
+	receiver = RtpReceiver(sock, handler, bufferSize, poolSize=4)
+	thread = threading.Thread(target=receiver.run)
+	thread.start()
+	try:
+		for size in sizes:
+			sender.sendto(bytes(size), sock.getsockname())
+		sender.sendto(END, sock.getsockname())
+		assert done.wait(5.0)
+	finally:
+		receiver.stop()
+		thread.join(5.0)
+		sender.close()
+		sock.close()
+	return received, receiver
+
+def test_datagram_filling_the_buffer_is_whole():
+	received, receiver = receive(1000, [999, 1000])
+	assert received == [999, 1000]
+	assert receiver.stats['truncated'] == 0
+
+def test_larger_datagrams_are_counted_and_dropped(capsys):
+	received, receiver = receive(1000, [1001, 1000, 4000])
+	assert received == [1000]
+	assert receiver.stats['truncated'] == 2
+	assert receiver.stats['datagrams'] == 2  # Including the end marker
+	if TRUNC_FLAGS:
+		# The real length of the first one is reported
+		assert '1001-byte datagram' in capsys.readouterr().out
+
+def test_more_datagrams_than_the_pool_holds():
+	received, receiver = receive(100, [100] * 10)
+	assert received == [100] * 10
+
+@pytest.mark.parametrize('route, limit', [(1500, 1500), (None, MAX_UDP_PAYLOAD + IP_HEADER + UDP_HEADER),
+										  (70000, MAX_UDP_PAYLOAD + IP_HEADER + UDP_HEADER)])
+def test_advertised_packet_size(monkeypatch, route, limit):
+	monkeypatch.setattr(Client, 'routeMtu', lambda address: route)
+	client = SimpleNamespace(serverAddr='127.0.0.1', serverPort=8554)
+	assert Client.Client.maxPacketSize(client) == limit == client.packetLimit
+
+def test_buffers_take_the_largest_advertised_packet():
+	# As the client sizes them at PLAY for a 1500-byte route
+	bufferSize = 1500 - IP_HEADER - UDP_HEADER
+	received, receiver = receive(bufferSize, [bufferSize, bufferSize + 1])
+	assert received == [bufferSize] and receiver.stats['truncated'] == 1
@@ -0,0 +1,219 @@
+import socket
+
+import pytest
+
+from Rtsp import RtspParser, RtspError, RtspMessage, buildRequest, buildReply, splitParams
+from ServerWorker import ServerWorker
+
+JPEG = b'\xFF\xD8\xFF\xE0\x00\x04\x00\x00\xFF\xD9'
+
+def request(method, cseq, headers=(), body=b''):
+	return buildRequest(method, 'movie.mjpeg', cseq, headers, body)
+
+def feedAll(parser, pieces):
+	messages = []
+	for piece in pieces:
+		messages += parser.feed(piece)
+	return messages
+
+class TestParser:
+	def test_message_split_across_reads(self):
+		data = request('SETUP', 1, [('Transport', 'RTP/UDP; client_port= 25000')])
+		parser = RtspParser()
+		messages = feedAll(parser, [data[i:i + 1] for i in range(len(data))])
+		assert len(messages) == 1
+		assert messages[0].method == 'SETUP' and messages[0].cseq == '1'
+		assert messages[0].header('transport') == 'RTP/UDP; client_port= 25000'
+		assert parser.pending == 0
+
+	def test_pipelined_messages_in_one_read(self):
+		data = request('PLAY', 2) + b'\r\n' + request('PAUSE', 3) + request('TEARDOWN', 4)
+		messages = RtspParser().feed(data)
+		assert [(m.method, m.cseq) for m in messages] == [('PLAY', '2'), ('PAUSE', '3'), ('TEARDOWN', '4')]
+
+	def test_lf_only_line_endings(self):
+		data = b'OPTIONS * RTSP/1.0\nCSeq: 7\nUser-Agent: test\n\n'
+		parser = RtspParser()
+		message, = feedAll(parser, [data[:20], data[20:]])
+		assert message.uri == '*' and message.cseq == '7' and message.header('User-Agent') == 'test'
+		assert parser.framed
+
+	def test_body_is_read_by_content_length(self):
+		body = b'\r\n\r\nnot a header\r\n'
+		data = request('GET_PARAMETER', 5, body=body) + request('PLAY', 6)
+		parser = RtspParser()
+		messages = feedAll(parser, [data[:len(data) - len(body) - 30], data[len(data) - len(body) - 30:]])
+		assert [m.body for m in messages] == [body, b'']
+		assert messages[1].cseq == '6'
+
+	def test_body_waits_for_its_last_byte(self):
+		data = request('GET_PARAMETER', 5, body=b'position')
+		parser = RtspParser()
+		assert parser.feed(data[:-1]) == []
+		assert parser.feed(data[-1:])[0].body == b'position'
+
+	def test_folded_and_repeated_headers(self):
+		data = b'PLAY m RTSP/1.0\r\nCSeq: 1\r\nX-Note: one\r\n  two\r\nVia: a\r\nvia: b\r\n\r\n'
+		message, = RtspParser().feed(data)
+		assert message.header('X-Note') == 'one two'
+		assert message.header('VIA') == 'a, b'
+
+	def test_response(self):
+		message, = RtspParser().feed(buildReply(454, 9))
+		assert not message.isRequest
+		assert (message.code, message.reason, message.cseq) == (454, 'Session Not Found', '9')
+
+	def test_oversize_header_block(self):
+		parser = RtspParser(maxHeaderSize=256)
+		with pytest.raises(RtspError):
+			parser.feed(b'PLAY m RTSP/1.0\r\nX-Pad: ' + b'x' * 300)
+
+	def test_oversize_body(self):
+		parser = RtspParser(maxBodySize=10)
+		with pytest.raises(RtspError):
+			parser.feed(b'PLAY m RTSP/1.0\r\nCSeq: 1\r\nContent-Length: 11\r\n\r\n')
+
+	@pytest.mark.parametrize('data', [
+		b'PLAY\r\n\r\n',
+		b'PLAY m HTTP/1.1\r\nCSeq: 1\r\n\r\n',
+		b'PLAY m RTSP/1.0\r\nno colon here\r\n\r\n',
+		b'PLAY m RTSP/1.0\r\n folded first\r\n\r\n',
+		b'PLAY m RTSP/1.0\r\nContent-Length: -1\r\n\r\n',
+		b'PLAY m RTSP/1.0\r\nContent-Length: 1\r\nContent-Length: 2\r\n\r\n',
+		b'RTSP/1.0 OK\r\n\r\n',
+		b'PLAY m RTSP/1.0\r\nCSeq: \xff\r\n\r\n',
+	])
+	def test_malformed(self, data):
+		with pytest.raises(RtspError):
+			RtspParser().feed(data)
+
+	def test_messages_before_a_fault_are_returned(self):
+		parser = RtspParser()
+		messages = parser.feed(request('PLAY', 1) + request('PAUSE', 2) + b'JUNK\r\n\r\n')
+		assert [m.cseq for m in messages] == ['1', '2']
+		assert isinstance(parser.error, RtspError)
+		with pytest.raises(RtspError):
+			parser.feed(request('TEARDOWN', 3))
+
+	def test_flush_unterminated_legacy_request(self):
+		parser = RtspParser()
+		assert parser.feed(b'SETUP movie.mjpeg RTSP/1.0\nCSeq: 1\nTransport: RTP/UDP; client_port= 25000') == []
+		assert parser.unterminated
+		message, = parser.flush()
+		assert message.method == 'SETUP' and message.header('Transport') == 'RTP/UDP; client_port= 25000'
+		assert parser.pending == 0
+
+def test_build_reply():
+	assert buildReply(200, 3, [('Session', '123')]) == b'RTSP/1.0 200 OK\r\nCSeq: 3\r\nSession: 123\r\n\r\n'
+	assert buildReply(400, None) == b'RTSP/1.0 400 Bad Request\r\n\r\n'
+	assert buildReply(200, 1, body=b'abc').endswith(b'Content-Length: 3\r\n\r\nabc')
+
+def test_split_params():
+	assert splitParams('RTP/UDP; client_port= 25000; MTU=1500;unicast') == (
+		'RTP/UDP', {'client_port': '25000', 'mtu': '1500', 'unicast': ''})
+	assert splitParams('123456;timeout=60') == ('123456', {'timeout': '60'})
+
+def test_message_rejects_bad_status_code():
+	with pytest.raises(RtspError):
+		RtspMessage('RTSP/1.0 2OO OK', [])
+
+class ControlSocket:
+	def __init__(self):
+		self.sent = b''
+
+	def send(self, data):
+		self.sent += data
+		return len(data)
+
+	def shutdown(self, how):
+		pass
+
+	def close(self):
+		pass
+
+@pytest.fixture
+def worker(tmp_path):
+	(tmp_path / 'movie.mjpeg').write_bytes(JPEG * 3)
+	conn = ControlSocket()
+	worker = ServerWorker({'rtspSocket': (conn, ('127.0.0.1', 40000))})
+	worker.movie = str(tmp_path / 'movie.mjpeg')
+	worker.replies = lambda: [(m.cseq, m.code) for m in RtspParser().feed(conn.sent)]
+	yield worker
+	worker.close()
+
+def setup(worker, cseq=1, uri=None):
+	return buildRequest('SETUP', uri or worker.movie, cseq, [('Transport', 'RTP/UDP; client_port= 25000')])
+
+def test_setup_of_missing_file_is_404_only(worker):
+	worker.handleRtspData(setup(worker, uri='missing.mjpeg'))
+	assert worker.replies() == [('1', 404)]
+	assert worker.state == worker.INIT and 'session' not in worker.clientInfo
+
+def test_every_pipelined_request_is_answered_in_order(worker):
+	session = lambda: [('Session', str(worker.clientInfo.get('session')))]
+	worker.handleRtspData(buildRequest('PLAY', worker.movie, 1) + buildRequest('DESCRIBE', worker.movie, 2)
+						  + setup(worker, 3))
+	worker.handleRtspData(setup(worker, 4) + buildRequest('PAUSE', worker.movie, 5, session())
+						  + buildRequest('PAUSE', worker.movie, 6, [('Session', '1')])
+						  + buildRequest('GET_PARAMETER', worker.movie, 7, session())
+						  + buildRequest('OPTIONS', '*', 8))
+	assert worker.replies() == [('1', 455), ('2', 501), ('3', 200), ('4', 455), ('5', 455), ('6', 454),
+								('7', 200), ('8', 200)]
+
+def test_failed_request_is_answered(worker, monkeypatch):
+	def fail(request):
+		raise ValueError('bad header') if request.cseq == '1' else RuntimeError('bug')
+	monkeypatch.setattr(worker, 'processRtspRequest', fail)
+	worker.handleRtspData(buildRequest('PLAY', 'm', 1) + buildRequest('PLAY', 'm', 2))
+	assert worker.replies() == [('1', 400), ('2', 500)]
+
+def test_requests_before_a_fault_are_answered(worker):
+	with pytest.raises(RtspError) as error:
+		worker.handleRtspData(buildRequest('OPTIONS', '*', 1) + b'GARBAGE\r\n\r\n' + buildRequest('OPTIONS', '*', 2))
+	worker.rejectRtspStream(error.value)
+	assert worker.replies() == [('1', 200), (None, 400)]
+
+@pytest.mark.parametrize('cut', [b'Trans', b'Transport: RTP/UDP; client_port= 25000\r\n'])
+def test_first_request_split_across_reads(worker, cut):
+	data = setup(worker)
+	head = data.index(cut) + len(cut)
+	worker.handleRtspData(data[:head])
+	# Not yet known to be a legacy client: nothing is answered until the rest arrives
+	assert worker.replies() == [] and worker.rtspParser.unterminated
+	worker.handleRtspData(data[head:])
+	assert worker.replies() == [('1', 200)]
+	assert worker.state == worker.READY and worker.clientInfo['rtpPort'] == '25000'
+
+def test_legacy_request_is_answered_once_the_client_goes_quiet(tmp_path):
+	(tmp_path / 'movie.mjpeg').write_bytes(JPEG * 3)
+	server, client = socket.socketpair()
+	worker = ServerWorker({'rtspSocket': (server, ('127.0.0.1', 40000))})
+	try:
+		worker.run()
+		client.settimeout(5.0)
+		client.sendall(f'SETUP {tmp_path / "movie.mjpeg"} RTSP/1.0\nCSeq: 1\nTransport: RTP/UDP; client_port= 25000'.encode())
+		reply, = RtspParser().feed(client.recv(4096))
+		assert (reply.cseq, reply.code) == ('1', 200)
+	finally:
+		client.close()
+		worker.close()
+
+@pytest.mark.parametrize('transport', ['RTP/UDP', 'RTP/UDP; client_port=rtp', 'RTP/UDP; client_port= 70000',
+									   'RTP/UDP; client_port= 25000; mtu=big'])
+def test_setup_with_a_bad_transport_is_400_and_can_be_retried(worker, transport):
+	worker.handleRtspData(buildRequest('SETUP', worker.movie, 1, [('Transport', transport)]))
+	assert worker.state == worker.INIT and 'session' not in worker.clientInfo
+	assert worker.clientInfo.get('videoStream') is None
+	worker.handleRtspData(setup(worker, 2))
+	assert worker.replies() == [('1', 400), ('2', 200)]
+	assert worker.state == worker.READY
+
+def test_setup_failing_after_the_open_closes_the_stream(worker, monkeypatch):
+	opened = []
+	openStream = worker.openStream
+	monkeypatch.setattr(worker, 'openStream', lambda *args: opened.append(openStream(*args)) or opened[-1])
+	monkeypatch.setattr(worker, 'choosePayloadSize', lambda clientLimit: 1 / 0)
+	worker.handleRtspData(setup(worker))
+	assert worker.replies() == [('1', 500)]
+	assert worker.state == worker.INIT and 'session' not in worker.clientInfo
+	assert worker.clientInfo['videoStream'] is None and opened[0].file.closed
@@ -0,0 +1,89 @@
+import pytest
+
+from Rtsp import buildRequest
+from ServerWorker import ServerWorker
+from Sessions import SessionRegistry, CLOSE_REASONS, RESOURCES
+
+JPEG = b'\xFF\xD8\xFF\xE0\x00\x04\x00\x00\xFF\xD9'
+
+class ControlSocket:
+	def __init__(self):
+		self.sent = b''
+
+	def send(self, data):
+		self.sent += data
+		return len(data)
+
+	def shutdown(self, how):
+		pass
+
+	def close(self):
+		pass
+
+@pytest.fixture
+def registry():
+	return SessionRegistry()
+
+@pytest.fixture
+def movie(tmp_path):
+	path = tmp_path / 'movie.mjpeg'
+	path.write_bytes(JPEG * 3)
+	return str(path)
+
+def session(registry, movie=None):
+	worker = ServerWorker({'rtspSocket': (ControlSocket(), ('127.0.0.1', 40000))}, registry)
+	registry.add(worker)
+	if movie is not None:
+		worker.handleRtspData(buildRequest('SETUP', movie, 1, [('Transport', 'RTP/UDP; client_port= 25000')]))
+		assert worker.state == worker.READY
+	return worker
+
+def test_close_releases_resources_once(registry, movie):
+	worker = session(registry, movie)
+	assert len(registry) == 1
+	worker.close()
+	worker.close('error')
+	snap = registry.snapshot()
+	assert len(registry) == 0 and snap['opened'] == 1
+	assert snap['closed_eof'] == 1 and snap['closed_error'] == 0
+	# The control connection and the movie file; the RTP socket only opens on PLAY
+	assert (snap['reclaimed_sockets'], snap['reclaimed_files']) == (1, 1)
+	assert worker.clientInfo['videoStream'] is None and worker.closed
+
+def test_eof_after_teardown_counts_as_teardown(registry, movie):
+	worker = session(registry, movie)
+	worker.handleRtspData(buildRequest('TEARDOWN', movie, 2, [('Session', str(worker.clientInfo['session']))]))
+	worker.close()
+	assert registry.snapshot()['closed_teardown'] == 1
+
+def test_reap_closes_only_idle_sessions(registry):
+	idle, busy = session(registry), session(registry)
+	now = busy.lastActivity + 1.0
+	idle.lastActivity = now - ServerWorker.SESSION_TIMEOUT - 1.0
+	assert registry.reap(now) == 1
+	assert idle.closed and not busy.closed
+	assert registry.sessions() == [busy]
+	assert registry.snapshot()['closed_timeout'] == 1
+	# A later sweep takes the other session, never the closed one again
+	assert registry.reap(now + 2 * ServerWorker.SESSION_TIMEOUT) == 1
+	assert registry.snapshot()['closed_timeout'] == 2
+
+def test_timeout_zero_disables_reaping(registry, monkeypatch):
+	monkeypatch.setattr(ServerWorker, 'SESSION_TIMEOUT', 0)
+	worker = session(registry)
+	assert registry.reap(worker.lastActivity + 1e6) == 0
+	worker.close()
+
+def test_closed_session_counters_are_retired(registry):
+	worker = session(registry)
+	worker.stats['bytes_sent'] = 7
+	worker.close('error')
+	assert registry.retired['bytes_sent'] == 7
+	# Removing an unknown session changes nothing
+	registry.remove(worker, 'error', {})
+	assert registry.snapshot()['closed_error'] == 1
+
+def test_summary_lists_every_reason_and_resource(registry):
+	summary = registry.summary()
+	assert summary.startswith('[SESSIONS] 0 live, 0 opened')
+	assert all(reason in summary for reason in CLOSE_REASONS) and all(kind in summary for kind in RESOURCES)